@@ -0,0 +1,49 @@
+# Script para gerar o inventário completo do GCP em uma única varredura
+# Os projetos são listados uma única vez e enviados a todos os coletores
+#
+# autor: Marcos Cardoso
+#
+# Uso:
+# python3 inventory.py --collect vm,network,k8s,sql
+
+import argparse
+import os
+import list_project
+import list_vm
+import list_network
+import list_k8s
+import list_cloud_sql
+from src.org.common.logger_config import setup_logging
+from src.org.common.cli import build_parser
+from src.org.common.runner import run_inventory
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+logger = setup_logging(dir_path,'inventory.log')
+
+# Coletores disponíveis, na ordem do resumo
+COLLECTORS = {
+    module.collector.name: module.collector
+    for module in (list_project, list_vm, list_network, list_k8s, list_cloud_sql)
+}
+
+def collectors_type(value):
+    """
+    Valida a lista de coletores informada em --collect (argparse).
+    """
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in COLLECTORS]
+    if not names or unknown:
+        raise argparse.ArgumentTypeError(f"coletores válidos: {', '.join(COLLECTORS)}")
+    return names
+
+def main():
+    parser = build_parser('Gera o inventário do GCP listando os projetos uma única vez.',
+                          COLLECTORS.values())
+    parser.add_argument('--collect', type=collectors_type, default=list(COLLECTORS),
+                        help=f"Coletores separados por vírgula (padrão: {','.join(COLLECTORS)}).")
+    args = parser.parse_args()
+    # Mantém a ordem de COLLECTORS, sem repetições
+    run_inventory([collector for name, collector in COLLECTORS.items() if name in args.collect], args, logger)
+
+if __name__ == '__main__':
+    main()
@@ -8,13 +8,14 @@
 # https://developers.google.com/resources/api-libraries/documentation/sqladmin/v1beta4/python/latest/sqladmin_v1beta4.instances.html#list
 #
 
-import datetime
 import os
-import csv
-import sys
-from googleapiclient import discovery
 from src.org.common.logger_config import setup_logging
-from src.org.common.credentials import get_user_credentials
+from src.org.common.clients import get_service
+from src.org.common import rate_limit
+from src.org.common.batch import execute_batch
+from src.org.common.cli import build_parser
+from src.org.common.records import SqlInstanceRecord
+from src.org.common.runner import Collector, run_inventory
 
 # Define o caminho completo para o arquivo CSV de saída
 dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -22,91 +23,115 @@ os.makedirs(os.path.join(dir_path, 'csv'), exist_ok=True)
 filename = os.path.join(dir_path, 'csv', 'lista_GCP_cloud_sql.csv')
 logger = setup_logging(dir_path,'cloud_sql.log')
 
-header_format = '{:>2} {:<4} {:<25} {:<30} {:<30} {:<6} {:<15} {:<15} {:<23} {:<10} {:<8} {:<10}'
-header_list = 'ENV', 'PROJECT_ID', 'INSTANCIA', 'TIPO', 'BACKUP', 'IP PUBLIC', 'IP PRIVATE', 'TIER', 'DISK TYPE', 'SIZE Gb', 'REGION'
-
-def time_now(message):
-    now = datetime.datetime.now()
-    date_format = now.strftime("%d-%m-%Y %H:%M:%S")
-    print(f"{date_format} - {message}")
-    logger.info(f"{message} {date_format}")
-
-credentials = get_user_credentials()
-if not credentials:
-    logger.error("ERRO: Não foi possível obter as credenciais do usuário. Saindo do script.")
-    sys.exit(1)
-
-# Constrói os serviços da API do Google Cloud:
-# - cloudresourcemanager para listar projetos.
-# - sqladmin para listar cloud SQL
-service = discovery.build('cloudresourcemanager', 'v1', credentials=credentials)
-service_sql = discovery.build('sqladmin', 'v1beta4')
-
-time_now('Script iniciado: ')
-
-try:
-    # Abrir arquivo CSV para escrita
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        file_writer = csv.writer(csvfile, delimiter=';')
-        file_writer.writerow(header_list)
-
-        print(header_format.
-              format(' ', *header_list))
-
-        count = 1
-        # Recuperar lista de projetos
-        request = service.projects().list()
-
-        while request is not None:
-            response = request.execute()
-
-            # Iterar sobre cada projeto
-            for project in response.get('projects', []):
-                project_id = project['projectId']
-                resources = service_sql.instances()
-                request_sql = resources.list(project=project_id)
-                response_sql = request_sql.execute()
-
-                # Mapeamento de substrings para ambientes correspondentes
-                env_mapping = {'dev': 'DEV', 'prd': 'PRD', 'hml': 'HML'}
-                # Validação de ambiente pela descrição
-                env = ''
-                for substring, environment in env_mapping.items():
-                    if substring in project_id:
-                        env = environment
-                        break
-                    
-                # Iterar sobre cada instância do SQL
-                for instance in response_sql.get('items', []):
-                    tier = instance['settings']['tier']
-                    diskType = instance['settings']['dataDiskType']
-                    diskSizeGb = instance['settings']['dataDiskSizeGb']
-                    location = instance['settings']['locationPreference']['zone']
-                    if instance['settings']['backupConfiguration']['enabled']:
-                        backup = "True"
-                    elif instance['instanceType'] == 'READ_REPLICA_INSTANCE':
-                        backup = "REPLICA"
-                    else:
-                        backup = "False"
-
-                    ip_publico = next((ipaddress['ipAddress'] for ipaddress in instance.get('ipAddresses', []) if ipaddress['type'] == 'PRIMARY'), '')
-                    ip_privado = next((ipaddress['ipAddress'] for ipaddress in instance.get('ipAddresses', []) if ipaddress['type'] == 'PRIVATE'), '')
-
-                    # Imprimir detalhes da instância e escrever no arquivo CSV
-                    print(header_format.
-                        format(count, env, project_id, instance['name'], instance['databaseInstalledVersion'], backup, ip_publico, ip_privado, tier, diskType, diskSizeGb, location))
-
-                    logger.info([env, project_id, instance['name'], instance['databaseInstalledVersion'], backup, ip_publico, ip_privado, tier, diskType, diskSizeGb, location])
-
-                    file_writer.writerow([env, project_id, instance['name'], instance['databaseInstalledVersion'], backup, ip_publico, ip_privado, tier, diskType, diskSizeGb, location])
-                    count += 1
-            # Obter próxima página de projetos
-            request = service.projects().list_next(previous_request=request, previous_response=response)
-
-    time_now("Varredura de projetos concluída.")
-
-except Exception as e:
-    logger.error(f"\nERRO FATAL DURANTE A EXECUÇÃO DO SCRIPT: {e}")
-    sys.exit(1)
-
-time_now('Script finalizado.')
+# Campos usados das instâncias (máscara de resposta parcial, parâmetro 'fields')
+SQL_INSTANCES_FIELDS = ('nextPageToken,items(name,selfLink,createTime,databaseInstalledVersion,instanceType,ipAddresses(type,ipAddress),'
+                        'settings(tier,dataDiskType,dataDiskSizeGb,locationPreference/zone,backupConfiguration/enabled))')
+
+# Ambiente do projeto a partir do ID
+def project_env(project_id):
+    # Mapeamento de substrings para ambientes correspondentes
+    env_mapping = {'dev': 'DEV', 'prd': 'PRD', 'hml': 'HML'}
+    # Validação de ambiente pela descrição
+    for substring, environment in env_mapping.items():
+        if substring in project_id:
+            return environment
+    return ''
+
+# Junta as instâncias de uma página de instances.list com as das páginas
+# seguintes, buscadas individualmente até o fim da paginação
+def follow_sql_pages(resources, request, response):
+    instances = list(response.get('items', []))
+    while True:
+        request = resources.list_next(previous_request=request, previous_response=response)
+        if request is None:
+            return instances
+        response = rate_limit.execute(request)
+        instances.extend(response.get('items', []))
+
+# Gera as linhas das instâncias Cloud SQL de um projeto
+def build_sql_rows(project_id, instances):
+    env = project_env(project_id)
+    # Iterar sobre cada instância do SQL
+    for instance in instances:
+        yield build_sql_row(env, project_id, instance)
+
+# Monta a linha de saída de uma instância Cloud SQL
+def build_sql_row(env, project_id, instance):
+    tier = instance['settings']['tier']
+    diskType = instance['settings']['dataDiskType']
+    diskSizeGb = instance['settings']['dataDiskSizeGb']
+    location = instance['settings']['locationPreference']['zone']
+    if instance['settings']['backupConfiguration']['enabled']:
+        backup = "True"
+    elif instance['instanceType'] == 'READ_REPLICA_INSTANCE':
+        backup = "REPLICA"
+    else:
+        backup = "False"
+
+    ip_publico = next((ipaddress['ipAddress'] for ipaddress in instance.get('ipAddresses', []) if ipaddress['type'] == 'PRIMARY'), '')
+    ip_privado = next((ipaddress['ipAddress'] for ipaddress in instance.get('ipAddresses', []) if ipaddress['type'] == 'PRIVATE'), '')
+
+    return SqlInstanceRecord(env, project_id, instance['name'], instance['databaseInstalledVersion'], backup, ip_publico, ip_privado, tier, diskType, diskSizeGb, location,
+                             instance.get('createTime', ''), instance.get('selfLink', ''))
+
+class SqlCollector(Collector):
+    """
+    Coletor das instâncias Cloud SQL de todos os projetos.
+    """
+
+    name = 'sql'
+    record = SqlInstanceRecord
+    asset_type = 'sqladmin.googleapis.com/Instance'
+    api = 'sqladmin.googleapis.com'
+
+    def collect(self, projects, runner):
+        return self.fetch_sql_instances([project['projectId'] for project in projects], runner.credentials)
+
+    def asset_rows(self, project, instance):
+        project_id = project['projectId']
+        yield build_sql_row(project_env(project_id), project_id, instance)
+
+    # Gera as instâncias Cloud SQL de um grupo de projetos, com a primeira página
+    # de instances.list de cada projeto em um único lote (batch HTTP) e as páginas
+    # seguintes buscadas depois do lote. O erro de um projeto é registrado no log
+    # sem interromper os demais.
+    def fetch_sql_instances(self, project_ids, credentials):
+        service_sql = get_service('sqladmin', 'v1beta4', credentials)
+        resources = service_sql.instances()
+        responses = {}
+
+        def on_response(project_id, response_sql, exception):
+            if exception is not None:
+                self.log_fetch_error(f"listar instâncias Cloud SQL do projeto '{project_id}'", exception)
+                return
+            responses[project_id] = response_sql
+
+        requests = [(project_id, resources.list(project=project_id, fields=SQL_INSTANCES_FIELDS))
+                    for project_id in project_ids]
+        first_requests = dict(requests)
+        try:
+            execute_batch(service_sql, requests, on_response)
+        except Exception as e:
+            self.log_fetch_error(f"listar instâncias Cloud SQL dos projetos {project_ids}", e)
+        for project_id in project_ids:
+            if project_id not in responses:
+                continue
+            try:
+                instances = follow_sql_pages(resources, first_requests[project_id], responses.pop(project_id))
+            except Exception as e:
+                self.log_fetch_error(f"listar instâncias Cloud SQL do projeto '{project_id}'", e)
+                continue
+            try:
+                # As linhas do projeto saem juntas: um erro no meio não deixa instâncias pela metade
+                yield from list(build_sql_rows(project_id, instances))
+            except Exception as e:
+                self.log_fetch_error(f"processar instâncias Cloud SQL do projeto '{project_id}'", e)
+
+collector = SqlCollector(logger, filename)
+
+def main():
+    args = build_parser('Lista as instâncias Cloud SQL de todos os projetos do GCP.', [collector]).parse_args()
+    run_inventory([collector], args, logger)
+
+if __name__ == '__main__':
+    main()
@@ -10,13 +10,14 @@
 # Library Installation
 # pip install -U google-api-python-client
 
-import datetime
 import os
-import csv
-import sys
-from googleapiclient import discovery
+from googleapiclient import errors
 from src.org.common.logger_config import setup_logging
-from src.org.common.credentials import get_user_credentials
+from src.org.common.clients import get_service
+from src.org.common.batch import execute_batch
+from src.org.common.cli import build_parser
+from src.org.common.records import NodePoolRecord
+from src.org.common.runner import Collector, run_inventory
 
 # Define o caminho completo para o arquivo CSV de saída
 dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -24,90 +25,114 @@ os.makedirs(os.path.join(dir_path, 'csv'), exist_ok=True)
 filename = os.path.join(dir_path, 'csv', 'lista_GCP_k8s.csv')
 logger = setup_logging(dir_path,'k8s.log')
 
-header_format = '{:<3} {:<28} {:<40} {:<20} {:<35} {:<4} {:<18} {:<20} {:<5}'
-header_list = 'PROJECT_ID', 'CLUSTER', 'CLUSTER_VERSION', 'POOL', 'NOS', 'TYPE', 'AUTOSCALING', 'ZONAS'
-
-def time_now(message):
-    now = datetime.datetime.now()
-    date_format = now.strftime("%d-%m-%Y %H:%M:%S")
-    print(f"{date_format} - {message}")
-    logger.info(f"{message} {date_format}")
-
-credentials = get_user_credentials()
-if not credentials:
-    logger.error("ERRO: Não foi possível obter as credenciais do usuário. Saindo do script.")
-    sys.exit(1)
-
-# Constrói os serviços da API do Google Cloud:
-# - cloudresourcemanager para listar projetos.
-# - container para listar Kubernets
-service = discovery.build('cloudresourcemanager', 'v1', credentials=credentials)
-service_container = discovery.build('container', 'v1')
-
-time_now('Script iniciado: ')
-
-try:
-    # Abrir arquivo CSV para escrita
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        file_writer = csv.writer(csvfile, delimiter=';')
-        file_writer.writerow(header_list)
-
-        print(header_format.
-            format('', *header_list))
-
-        count = 1
-
-        # Recuperar lista de projetos
-        request = service.projects().list()
-
-        while request is not None:
-            response = request.execute()
-
-            # Iterar sobre cada projeto
-            for project in response.get('projects', []):
-                project_id = project['projectId']
-                resources = service_container.projects().locations().clusters()
-                request_gke = resources.list(parent='projects/'+project_id+'/locations/-', projectId=project_id)
-                try:
-                    response_gke = request_gke.execute()
-
-                    # Iterar sobre cada instância do cluster
-                    for clusters in response_gke.get('clusters', []):                    
-                        cluster_name = clusters['name']    
-                        cluster_version = clusters['currentMasterVersion']
-                        zone = clusters['zone']
-                        diskSizeGb = clusters['nodeConfig']['diskSizeGb']
-                        node_qt = clusters.get('currentNodeCount', 0)
-                        autoscaling = clusters['autoscaling']['autoscalingProfile']
-
-                        # Conta quantidades de zonas
-                        qt_locations = len(clusters['locations'])
-
-                        for pools in clusters['nodePools']:
-                            node_type = pools['config']['machineType']
-                            node_name = pools['name']
-                            node_version = pools['version']
-
-                            # Imprimir detalhes da instância e escrever no arquivo CSV
-                            print(header_format.
-                                format(count, project_id, cluster_name, cluster_version, node_name, node_qt, node_type, autoscaling, qt_locations))
-
-                            logger.info([project_id, cluster_name, cluster_version, node_name, node_qt, node_type, autoscaling, qt_locations])
-
-                            file_writer.writerow([project_id, cluster_name, cluster_version, node_name, node_qt, node_type, autoscaling, qt_locations])
-                            count += 1
-                except:
-                    logger.info([project_id, 'SEM API GKE', '', '', '', '', ''])
-                    file_writer.writerow([project_id, 'SEM API GKE', '', '', '', '', ''])
-                    count += 1
-
-            # Obter próxima página de projetos
-            request = service.projects().list_next(previous_request=request, previous_response=response)
-
-    time_now("Varredura de projetos concluída.")
-
-except Exception as e:
-    logger.error(f"\nERRO FATAL DURANTE A EXECUÇÃO DO SCRIPT: {e}")
-    sys.exit(1)
-
-time_now('Script finalizado.')
\ No newline at end of file
+# Campos usados dos clusters (máscara de resposta parcial, parâmetro 'fields')
+CLUSTERS_FIELDS = ('clusters(name,selfLink,createTime,currentMasterVersion,zone,nodeConfig/diskSizeGb,currentNodeCount,'
+                   'autoscaling/autoscalingProfile,locations,nodePools(name,version,config/machineType,selfLink))')
+
+# Gera as linhas dos node pools a partir da resposta de clusters.list
+def build_cluster_rows(project_id, response_gke):
+    # Iterar sobre cada instância do cluster
+    for clusters in response_gke.get('clusters', []):
+        yield from build_node_pool_rows(project_id, clusters)
+
+# Gera as linhas dos node pools de um cluster
+def build_node_pool_rows(project_id, clusters):
+    cluster_name = clusters['name']
+    cluster_version = clusters['currentMasterVersion']
+    zone = clusters['zone']
+    diskSizeGb = clusters['nodeConfig']['diskSizeGb']
+    node_qt = clusters.get('currentNodeCount', 0)
+    autoscaling = clusters['autoscaling']['autoscalingProfile']
+
+    # Conta quantidades de zonas
+    qt_locations = len(clusters['locations'])
+
+    for pools in clusters['nodePools']:
+        node_type = pools['config']['machineType']
+        node_name = pools['name']
+        node_version = pools['version']
+        # Nem toda resposta traz o selfLink do node pool; o do cluster identifica o pool pelo nome
+        self_link = pools.get('selfLink') or f"{clusters.get('selfLink', '')}/nodePools/{node_name}"
+
+        yield NodePoolRecord(project_id, cluster_name, cluster_version, node_name, node_qt, node_type, autoscaling, qt_locations,
+                             clusters.get('createTime', ''), self_link)
+
+# Linha de um projeto em que a API do GKE está desabilitada ou sem acesso
+def no_api_row(project_id):
+    return NodePoolRecord(project_id, 'SEM API GKE', '', '', '', '', '', '', '',
+                          f'//container.googleapis.com/projects/{project_id}')
+
+class K8sCollector(Collector):
+    """
+    Coletor dos node pools dos clusters GKE de todos os projetos. Projetos em
+    que a API do GKE está desabilitada ficam no CSV com a marca 'SEM API GKE'
+    (exceto com --engine assets, em que nenhuma API é chamada por projeto).
+    """
+
+    name = 'k8s'
+    record = NodePoolRecord
+    asset_type = 'container.googleapis.com/Cluster'
+    api = 'container.googleapis.com'
+
+    def print_row(self, count, row):
+        # As linhas 'SEM API GKE' vão apenas para o CSV e o log
+        if row.cluster != 'SEM API GKE':
+            super().print_row(count, row)
+
+    def asset_rows(self, project, cluster):
+        return build_node_pool_rows(project['projectId'], cluster)
+
+    def collect(self, projects, runner):
+        for project_id, project_rows in self.fetch_clusters([project['projectId'] for project in projects],
+                                                            runner.credentials):
+            if project_rows is None:
+                yield no_api_row(project_id)
+            else:
+                yield from project_rows
+
+    def skipped_rows(self, project):
+        # Projeto com a API do GKE desabilitada (ver service_usage.py)
+        return [no_api_row(project['projectId'])]
+
+    # Busca os node pools dos clusters GKE de um grupo de projetos, com as
+    # chamadas clusters.list agrupadas em um único lote (batch HTTP).
+    # Gera (projeto, linhas), com None no lugar das linhas quando a API do
+    # GKE está desabilitada ou sem acesso no projeto (403/404). Os projetos
+    # com outras falhas não são gerados: elas ficam em failed_calls.
+    def fetch_clusters(self, project_ids, credentials):
+        service_container = get_service('container', 'v1', credentials)
+        resources = service_container.projects().locations().clusters()
+        results = {}
+
+        def on_response(project_id, response_gke, exception):
+            if exception is not None:
+                # 403/404 indicam API desabilitada; os demais erros não podem passar despercebidos
+                if isinstance(exception, errors.HttpError) and exception.resp.status in (403, 404):
+                    results[project_id] = None
+                else:
+                    self.log_fetch_error(f"listar clusters GKE do projeto '{project_id}'", exception)
+                return
+            try:
+                results[project_id] = list(build_cluster_rows(project_id, response_gke))
+            except Exception as e:
+                self.log_fetch_error(f"processar clusters GKE do projeto '{project_id}'", e)
+
+        requests = [(project_id, resources.list(parent='projects/'+project_id+'/locations/-', projectId=project_id,
+                                                 fields=CLUSTERS_FIELDS))
+                    for project_id in project_ids]
+        try:
+            execute_batch(service_container, requests, on_response)
+        except Exception as e:
+            self.log_fetch_error(f"listar clusters GKE dos projetos {project_ids}", e)
+        for project_id in project_ids:
+            if project_id in results:
+                yield project_id, results.pop(project_id)
+
+collector = K8sCollector(logger, filename)
+
+def main():
+    args = build_parser('Lista os clusters GKE de todos os projetos do GCP.', [collector]).parse_args()
+    run_inventory([collector], args, logger)
+
+if __name__ == '__main__':
+    main()
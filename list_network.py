@@ -5,133 +5,182 @@
 # data: 03/04/2024
 # 
 
-import datetime
 import os
-import csv
-import sys
-from googleapiclient import discovery
 from src.org.common.logger_config import setup_logging
-from src.org.common.credentials import get_user_credentials
+from src.org.common.clients import get_service
+from src.org.common import rate_limit
+from src.org.common.batch import execute_batch
+from src.org.common.cli import build_parser
+from src.org.common.records import SubnetRecord
+from src.org.common.runner import Collector, run_inventory
 
 # Define o caminho completo para o arquivo CSV de saída
 dir_path = os.path.dirname(os.path.realpath(__file__))
 os.makedirs(os.path.join(dir_path, 'csv'), exist_ok=True)
 filename = os.path.join(dir_path, 'csv', 'lista_GCP_network.csv')
 logger = setup_logging(dir_path,'network.log')
-# header_format = '{:>2} {:<35} {:<45} {:<25} {:<20} {:<40} {:<16}'
-header_format = '{:>2} {:<35} {:<45} {:<25} {:<20}'
-header_list = 'PROJECT_ID', 'VPC', 'NAME', 'REGION', 'RANGE', 'SECONDARY', 'GATEWAY'
-
-def header():
-    print(header_format.
-        format('', 'PROJECT_ID', 'VPC', 'REGION', 'RANGE'))
-    print('---' * 50)
-
-def time_now(message):
-    now = datetime.datetime.now()
-    date_format = now.strftime("%d-%m-%Y %H:%M:%S")
-    print(f"{date_format} - {message}")
-    logger.info(f"{message}")
-
-def list_vpcs_and_subnets_all_projects(credentials):
+
+# Campos usados das VPCs e sub-redes (máscaras de resposta parcial, parâmetro 'fields')
+NETWORKS_FIELDS = 'nextPageToken,items(name,selfLink)'
+SUBNETWORKS_FIELDS = ('nextPageToken,items/*/subnetworks(name,network,region,ipCidrRange,'
+                      'secondaryIpRanges/ipCidrRange,gatewayAddress,selfLink,creationTimestamp)')
+
+# Chave da rede sem o prefixo do host, para casar o 'network' das sub-redes
+# com o 'selfLink' das VPCs mesmo quando os endpoints diferem
+def network_key(self_link):
+    index = self_link.find('/projects/')
+    return self_link[index:] if index >= 0 else self_link
+
+# Acumula as VPCs de uma página de networks.list e segue a paginação até o fim
+def follow_network_pages(compute_service, request, response, networks):
+    while True:
+        networks.extend(response.get('items', []))
+        request = compute_service.networks().list_next(previous_request=request, previous_response=response)
+        if request is None:
+            return networks
+        response = rate_limit.execute(request)
+
+# Agrupa as sub-redes de uma página de subnetworks.aggregatedList pela chave
+# da rede e segue a paginação até o fim
+def follow_subnetwork_pages(compute_service, request, response, subnets_by_network):
+    while True:
+        for region_scope in response.get('items', {}).values():
+            for subnetwork in region_scope.get('subnetworks', []):
+                subnets_by_network.setdefault(network_key(subnetwork['network']), []).append(subnetwork)
+        request = compute_service.subnetworks().aggregatedList_next(previous_request=request, previous_response=response)
+        if request is None:
+            return subnets_by_network
+        response = rate_limit.execute(request)
+
+def fetch_networks_batch(project_ids, credentials):
+    """
+    Busca as VPCs e sub-redes de um grupo de projetos. A primeira página de
+    networks.list e de subnetworks.aggregatedList de todos os projetos vai
+    em um único lote (batch HTTP), mesmo com um só projeto, e as páginas
+    seguintes são buscadas individualmente, depois que o lote termina.
+
+    Returns:
+        dict: Para cada projeto, a tupla (VPCs, sub-redes por rede) ou a
+              exceção que impediu a listagem.
+    """
+    compute_service = get_service('compute', 'v1', credentials)
+    requests = []
+    for project_id in project_ids:
+        requests.append(((project_id, 'networks'), compute_service.networks().list(project=project_id, fields=NETWORKS_FIELDS)))
+        requests.append(((project_id, 'subnetworks'),
+                         compute_service.subnetworks().aggregatedList(project=project_id, fields=SUBNETWORKS_FIELDS)))
+    first_requests = dict(requests)
+    # Primeira página (ou erro) de cada listagem
+    first_pages = {}
+
+    def on_response(key, response, exception):
+        first_pages[key] = exception if exception is not None else response
+
+    execute_batch(compute_service, requests, on_response)
+
+    results = {}
+    for project_id in project_ids:
+        networks_page = first_pages.get((project_id, 'networks'))
+        subnetworks_page = first_pages.get((project_id, 'subnetworks'))
+        for page in (networks_page, subnetworks_page):
+            if isinstance(page, Exception):
+                results[project_id] = page
+                break
+        else:
+            try:
+                networks = follow_network_pages(compute_service, first_requests[(project_id, 'networks')],
+                                                networks_page, [])
+                subnets_by_network = follow_subnetwork_pages(compute_service, first_requests[(project_id, 'subnetworks')],
+                                                             subnetworks_page, {})
+                results[project_id] = (networks, subnets_by_network)
+            except Exception as e:
+                results[project_id] = e
+    return results
+
+def build_subnet_row(project_name, network_name, subnetwork):
+    # Busca range de IPs secundarios
+    secondary_ips = subnetwork.get('secondaryIpRanges')
+    if secondary_ips:
+        secondary_ip_ranges = [item['ipCidrRange'] for item in secondary_ips]
+    else: 
+        secondary_ip_ranges = []
+
+    return SubnetRecord(project_name
+                        , network_name
+                        , subnetwork['name']
+                        , subnetwork['region'].split('/')[-1]
+                        , subnetwork['ipCidrRange']
+                        , secondary_ip_ranges
+                        , subnetwork['gatewayAddress']
+                        , subnetwork.get('creationTimestamp', '')
+                        , subnetwork.get('selfLink', ''))
+
+def build_network_rows(project_name, networks, subnets_by_network):
+    """
+    Gera as linhas das sub-redes de cada VPC do projeto.
+
+    Yields:
+        list: As linhas do inventário.
+    """
+    if not networks:
+        logger.info("  Nenhuma VPC encontrada neste projeto.")
+        return
+
+    for network in networks:
+        network_name = network['name']
+        logger.info(f"  VPC: {network_name}")
+        # Sub-redes da VPC a partir do índice do projeto
+        subnetworks = subnets_by_network.get(network_key(network['selfLink']), [])
+        for subnetwork in subnetworks:
+            yield build_subnet_row(project_name, network_name, subnetwork)
+
+        if not subnetworks:
+            logger.info("    Nenhuma sub-rede encontrada para esta VPC neste projeto (ou não acessível diretamente).")
+
+class NetworkCollector(Collector):
     """
-    Lista todas as VPCs e suas sub-redes em todos os projetos GCP acessíveis.
+    Coletor das VPCs e sub-redes de todos os projetos. As duas listagens de
+    cada projeto do grupo vão juntas em um lote (batch HTTP).
     """
 
-    # Constrói os serviços da API do Google Cloud:
-    # - cloudresourcemanager para listar projetos.
-    # - compute para listar recursos computacionais
-    resource_manager_service = discovery.build('cloudresourcemanager', 'v1', credentials=credentials)
-    compute_service = discovery.build('compute', 'v1', credentials=credentials)
-
-    try:
-        # Listar todos os projetos
-        projects_request = resource_manager_service.projects().list()
-     
-        time_now("Varrendo todos os projetos GCP para VPCs e Sub-redes...")
-
-        header()
-        count = 1
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            file_writer = csv.writer(csvfile, delimiter=';')
-            # Escreve o cabeçalho no arquivo CSV
-            file_writer.writerow(header_list)
-            while projects_request is not None:
-                projects_response = projects_request.execute()
-                for project in projects_response.get('projects', []):
-                    project_id = project['projectId']
-                    project_name = project.get('name', project_id)
-                    logger.info(f"--- Projeto: {project_name} (ID: {project_id}) ---")
-                    try:
-                        # Listar redes (VPCs) no projeto
-                        networks_request = compute_service.networks().list(project=project_id)
-                        networks_response = networks_request.execute()
-                        if not networks_response.get('items'):
-                            logger.info("  Nenhuma VPC encontrada neste projeto.")
-                        else:
-                            for network in networks_response.get('items', []):
-                                network_name = network['name']
-                                logger.info(f"  VPC: {network_name}")
-                                # Listar sub-redes para cada VPC
-                                subnetworks_aggregated_request = compute_service.subnetworks().aggregatedList(project=project_id)
-                                subnetworks_aggregated_response = subnetworks_aggregated_request.execute()
-                                found_subnets_for_vpc = False
-                                for region_scope in subnetworks_aggregated_response.get('items', {}).values():
-                                    for subnetwork in region_scope.get('subnetworks', []):
-                                        if subnetwork['network'].endswith(f'/networks/{network_name}'):
-                                            found_subnets_for_vpc = True
-                                            # Busca range de IPs secundarios
-                                            secondary_ips = subnetwork.get('secondaryIpRanges')
-                                            if secondary_ips:
-                                                secondary_ip_ranges = [item['ipCidrRange'] for item in secondary_ips]
-                                            else: 
-                                                secondary_ip_ranges = []
-
-                                            writer_data = [project_name
-                                                        , network_name
-                                                        , subnetwork['name']
-                                                        , subnetwork['region'].split('/')[-1]
-                                                        , subnetwork['ipCidrRange']
-                                                        , secondary_ip_ranges
-                                                        , subnetwork['gatewayAddress']]
-                                            
-                                            logger.info(writer_data)
-                                            file_writer.writerow(writer_data)
-
-                                            print(header_format.
-                                                format(count,
-                                                project_name,
-                                                network_name,
-                                                subnetwork['region'].split('/')[-1],
-                                                subnetwork['ipCidrRange']
-                                            ))
-
-                                            count += 1
-
-                                if not found_subnets_for_vpc:
-                                    logger.info("    Nenhuma sub-rede encontrada para esta VPC neste projeto (ou não acessível diretamente).")
-                    except Exception as e:
-                        logger.info(f"  Erro ao listar VPCs/Sub-redes para o projeto {project_id}: {e}")
-
-                projects_request = resource_manager_service.projects().list_next(
-                    previous_request=projects_request, previous_response=projects_response
-                )
-    except Exception as e:
-        logger.error(f"Erro ao listar projetos: {e}")
-
-try:
-    time_now('Script iniciado')
-
-    credentials = get_user_credentials()
-    if not credentials:
-        logger.error("ERRO: Não foi possível obter as credenciais do usuário. Saindo do script.")
-        sys.exit(1)
-
-    list_vpcs_and_subnets_all_projects(credentials)    
-    time_now("Varredura de projetos concluída.")
-
-except Exception as e:
-    logger.error(f"\nERRO FATAL DURANTE A EXECUÇÃO DO SCRIPT: {e}")
-    sys.exit(1)
-
-time_now('Script finalizado')    
\ No newline at end of file
+    name = 'network'
+    record = SubnetRecord
+    asset_type = 'compute.googleapis.com/Subnetwork'
+    api = 'compute.googleapis.com'
+
+    def print_header(self):
+        super().print_header()
+        print('---' * 50)
+
+    def asset_rows(self, project, subnetwork):
+        # O nome da VPC vem da URL da rede da sub-rede
+        yield build_subnet_row(project.get('name', project['projectId']),
+                               subnetwork['network'].split('/')[-1], subnetwork)
+
+    def collect(self, projects, runner):
+        project_ids = [project['projectId'] for project in projects]
+        results = fetch_networks_batch(project_ids, runner.credentials)
+
+        for project in projects:
+            project_id = project['projectId']
+            project_name = project.get('name', project_id)
+            logger.info(f"--- Projeto: {project_name} (ID: {project_id}) ---")
+            try:
+                result = results.pop(project_id)
+                if isinstance(result, Exception):
+                    raise result
+                networks, subnets_by_network = result
+                # As linhas do projeto saem juntas: um erro no meio não deixa VPCs pela metade
+                yield from list(build_network_rows(project_name, networks, subnets_by_network))
+            except Exception as e:
+                # 403/404 indicam API desabilitada ou sem acesso ao projeto
+                self.log_fetch_error(f"listar VPCs/Sub-redes para o projeto {project_id}", e)
+
+collector = NetworkCollector(logger, filename)
+
+def main():
+    args = build_parser('Lista as VPCs e sub-redes de todos os projetos do GCP.', [collector]).parse_args()
+    run_inventory([collector], args, logger)
+
+if __name__ == '__main__':
+    main()
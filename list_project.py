@@ -2,86 +2,51 @@
 #
 # autor: Marcos Cardoso
 # data: 02/04/2024
-# 
+#
 # Library Installation
 # pip install -U google-api-python-client
 # pip install -U oauth2client
 
-import csv
 import os
-from googleapiclient import discovery
-from src.org.common.credentials import get_user_credentials
 from src.org.common.logger_config import setup_logging
+from src.org.common.cli import build_parser
+from src.org.common.records import ProjectRecord
+from src.org.common.runner import Collector, run_inventory
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 os.makedirs(os.path.join(dir_path, 'csv'), exist_ok=True)
 filename = os.path.join(dir_path, 'csv', 'lista_GCP_project.csv')
 logger = setup_logging(dir_path,'projects.log')
 
-header_format = '{:>3} {:<40} {:<30} {:<20}'
-header_list = 'PROJECT_ID', 'NAME', 'PROJECT_NUMBER'
-
-logger.debug('Script iniciado: ')
+class ProjectCollector(Collector):
+    """
+    Coletor dos projetos. As linhas saem da própria listagem de projetos
+    do executor, sem nenhuma chamada adicional à API.
+    """
 
-credentials = get_user_credentials()
-if not credentials :
-    logger.error('Erro: Não foi possível obter as credenciais')
-    exit(1)
+    name = 'project'
+    record = ProjectRecord
+    # Como antes do catálogo de projetos, lista os projetos em qualquer estado
+    lifecycle_state = 'ALL'
 
-def list_google_cloud_projects():
-    print("Credenciais obtidas. Construindo o serviço da API Cloud Resource Manager... \n")
-    service = None
-    try:
-        # Constrói o serviço da API usando as credenciais obtidas
-        service = discovery.build('cloudresourcemanager', 'v1', credentials=credentials)
-        request = service.projects().list()
-    except Exception as e:
-        logger.error(f"\nERRO FATAL ao construir o serviço da API ou inicializar a requisição: {e}")
-        logger.error("Verifique se a 'Cloud Resource Manager API' está habilitada no seu projeto do Google Cloud Console.")
-        return
-     
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        file_writer = csv.writer(csvfile, delimiter=';')
-        # Escreve o cabeçalho no arquivo CSV
-        file_writer.writerow(header_list)
-
-        print(header_format.
-            format('No.', *header_list))
+    def print_header(self):
+        super().print_header()
         print('---' * 35)
-    
-        count = 1
-        # Loop para paginar os resultados
-        while request is not None:
-            try:
-                response = request.execute()
-            except Exception as e:
-                logger.error(f"\nERRO ao executar a requisição da API: {e}")
-                logger.error("Isso pode ser um problema de permissão (sua conta pode não ter acesso aos projetos).")
-                logger.error("Verifique se a 'Cloud Resource Manager API' está habilitada no seu projeto do Google Cloud Console.")
-                return
-    
-            projects = response.get('projects', [])
-            if not projects:
-                if count == 1: # Se não há projetos na primeira página e o contador é 1
-                    logger.info("Nenhum projeto encontrado ou sua conta não tem permissão para listar projetos.")
-                break
-            
-            for project in projects:
-                project_id = project.get('projectId', 'N/A')
-                project_name = project.get('name', 'N/A')
-                project_number = project.get('projectNumber', 'N/A')
-                
-                print(header_format.
-                    format(count, project_id, project_name, project_number))
 
-                file_writer.writerow([project_id, project_name, project_number])
-                
-                logger.info([project_id, project_name, project_number])
+    def collect(self, projects, runner):
+        for project in projects:
+            project_id = project.get('projectId', 'N/A')
+            project_name = project.get('name', 'N/A')
+            project_number = project.get('projectNumber', 'N/A')
+            # A listagem de projetos não traz selfLink; usa o nome completo do recurso
+            yield ProjectRecord(project_id, project_name, project_number, project.get('createTime', ''),
+                                f'//cloudresourcemanager.googleapis.com/projects/{project_id}')
+
+collector = ProjectCollector(logger, filename)
 
-                count += 1
-            
-            # Pede a próxima página de resultados, se houver
-            request = service.projects().list_next(previous_request=request, previous_response=response)
+def main():
+    args = build_parser('Lista todos os projetos do GCP.', [collector]).parse_args()
+    run_inventory([collector], args, logger)
 
 if __name__ == '__main__':
-    list_google_cloud_projects()
\ No newline at end of file
+    main()
@@ -10,14 +10,13 @@
 # pip install -U google-api-python-client google-auth-oauthlib
 
 import os
-import csv
-import datetime
-import sys
-from googleapiclient import discovery
-from googleapiclient import errors 
-from concurrent.futures import ThreadPoolExecutor, as_completed # Importa para concorrência
 from src.org.common.logger_config import setup_logging
-from src.org.common.credentials import get_user_credentials
+from src.org.common.clients import get_service
+from src.org.common import rate_limit
+from src.org.common.batch import execute_batch, chunked
+from src.org.common.cli import build_parser
+from src.org.common.records import VmRecord
+from src.org.common.runner import Collector, run_inventory
 
 # Define o caminho completo para o arquivo CSV de saída
 dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -25,63 +24,55 @@ os.makedirs(os.path.join(dir_path, 'csv'), exist_ok=True)
 filename = os.path.join(dir_path, 'csv', 'lista_GCP_VM.csv')
 logger = setup_logging(dir_path,'vm.log')
 
-header_format = '{:>2} {:<30} {:<45} {:<25} {:<18} {:<30} {:<20}'
-header_list = 'PROJECT_ID', 'VM', 'ZONA', 'IP PRIVADO', 'SO', 'STATUS'
-
-def time_now(message):
-    now = datetime.datetime.now()
-    date_format = now.strftime("%d-%m-%Y %H:%M:%S")
-    print(f"{date_format} - {message}")
-    logger.info(f"{message}")
-
-# Função para buscar instâncias de VM para um dado projeto e zona
-def fetch_instances_in_zone(project_id, zone, credentials):
-    try:
-        # Constrói uma nova instância do serviço de computação para cada thread.
-        service_compute_thread = discovery.build('compute', 'v1', credentials=credentials)
-        instances = service_compute_thread.instances().list(project=project_id, zone=zone).execute()
-
-        vm_data = []
-        if "items" in instances:
-            for instance in instances["items"]:
-                instance_vm = instance['name']
-                # Ignora VMs que fazem parte de clusters GKE 
-                gke_instance = is_gke_instance(instance)
-                if gke_instance is True:
-                    logger.info(f"GKE => {gke_instance} => {instance_vm}")
-                else:
-                    vm_zone = zone
-                    status = instance['status']
-                    ip_interno = 'N/A'
-                    so_version = 'N/A'
-
-                    # Tenta obter a licença do SO a partir do disco de boot
-                    if ('disks' in instance and len(instance['disks']) > 0 and
-                        'licenses' in instance["disks"][0]):
-                        license_url = instance["disks"][0].get('licenses')
-                        if license_url and len(license_url) > 0:
-                            license_url_string = license_url[0]
-                            so_version = license_url_string.split('/')[-1]
-
-                    # Tenta obter o primeiro IP interno da VM
-                    if 'networkInterfaces' in instance and len(instance['networkInterfaces']) > 0:
-                        ip_interno = instance['networkInterfaces'][0].get('networkIP', 'N/A')
-
-                    vm_data.append({
-                        'project_id': project_id,
-                        'instance_vm': instance_vm,
-                        'vm_zone': vm_zone,
-                        'ip_interno': ip_interno,
-                        'so_version': so_version,
-                        'status': status
-                    })
-        return vm_data
-    except errors.HttpError as http_e:
-        logger.debug(f"  AVISO: Erro HTTP ao listar VMs em '{project_id}' na zona '{zone}': {http_e.resp.status} - {http_e.content.decode()}")
-        return []
-    except Exception as e:
-        logger.debug(f"  AVISO: Falha inesperada ao listar VMs em '{project_id}' na zona '{zone}': {e}")
-        return []
+# Modos de coleta:
+# - aggregated: uma listagem agregada (instances.aggregatedList) paginada por projeto
+# - zones: uma chamada zones.list por projeto e uma instances.list por zona
+COLLECTION_MODES = ('aggregated', 'zones')
+
+# Campos usados de cada instância, enviados como máscara de resposta parcial
+# (parâmetro 'fields'). Os metadados podem ser grandes (startup-script,
+# ssh-keys), por isso vêm apenas a chave e o valor dos itens.
+INSTANCE_FIELDS = 'name,selfLink,creationTimestamp,status,labels,metadata/items(key,value),disks/licenses,networkInterfaces/networkIP'
+AGGREGATED_FIELDS = f'nextPageToken,unreachables,items/*/instances({INSTANCE_FIELDS})'
+INSTANCES_FIELDS = f'nextPageToken,items({INSTANCE_FIELDS})'
+ZONES_FIELDS = 'nextPageToken,items/name'
+
+# Monta a linha de saída de uma instância; retorna None para VMs de clusters GKE
+def build_vm_row(project_id, zone, instance):
+    instance_vm = instance['name']
+    # Ignora VMs que fazem parte de clusters GKE
+    gke_instance = is_gke_instance(instance)
+    if gke_instance is True:
+        logger.info(f"GKE => {gke_instance} => {instance_vm}")
+        return None
+
+    status = instance['status']
+    ip_interno = 'N/A'
+    so_version = 'N/A'
+
+    # Tenta obter a licença do SO a partir do disco de boot
+    if ('disks' in instance and len(instance['disks']) > 0 and
+        'licenses' in instance["disks"][0]):
+        license_url = instance["disks"][0].get('licenses')
+        if license_url and len(license_url) > 0:
+            license_url_string = license_url[0]
+            so_version = license_url_string.split('/')[-1]
+
+    # Tenta obter o primeiro IP interno da VM
+    if 'networkInterfaces' in instance and len(instance['networkInterfaces']) > 0:
+        ip_interno = instance['networkInterfaces'][0].get('networkIP', 'N/A')
+
+    return VmRecord(project_id, instance_vm, zone, ip_interno, so_version, status,
+                    instance.get('creationTimestamp', ''), instance.get('selfLink', ''))
+
+# Cria a requisição da listagem agregada (instances.aggregatedList) de um projeto
+def aggregated_instances_request(service_compute, project_id):
+    request = service_compute.instances().aggregatedList(project=project_id, fields=AGGREGATED_FIELDS)
+    # Zonas indisponíveis não derrubam a listagem inteira; elas voltam em 'unreachables'.
+    # O parâmetro é adicionado direto na URL pois nem todo documento de discovery o declara.
+    # As páginas seguintes (aggregatedList_next) herdam o parâmetro da URL anterior.
+    request.uri += '&returnPartialSuccess=true'
+    return request
 
 def is_gke_instance(instance):
     # Verificar 'labels' nos metadados
@@ -94,7 +85,7 @@ def is_gke_instance(instance):
         for item in instance['metadata']['items']:
             key = item.get('key')
             value = item.get('value', '')
-            
+
             if key == 'created-by' and 'instanceGroupManagers' in value:
                 return True
             if key == 'cluster-name' and value:
@@ -104,91 +95,160 @@ def is_gke_instance(instance):
 
     return False
 
-# Início da execução do script
-time_now('Script iniciado: ')
-
-credentials = get_user_credentials()
-if not credentials:
-    logger.error("ERRO: Não foi possível obter as credenciais do usuário. Saindo do script.")
-    sys.exit(1)
+class VmCollector(Collector):
+    """
+    Coletor das instâncias VM dos projetos ativos, sem as VMs de clusters GKE.
+    """
+
+    name = 'vm'
+    record = VmRecord
+    active_only = True
+    asset_type = 'compute.googleapis.com/Instance'
+    api = 'compute.googleapis.com'
+    # No modo 'zones' as subtarefas de zonas terminam em qualquer ordem
+    ordered = True
+    mode = 'aggregated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=COLLECTION_MODES, default='aggregated',
+                            help='Modo de coleta das instâncias VM (padrão: aggregated).')
+
+    def configure(self, args):
+        self.mode = args.mode
+        # Com as linhas na ordem dos grupos de projetos a varredura pode ser retomada (--resume)
+        self.ordered = self.mode == 'aggregated'
+
+    def print_header(self):
+        super().print_header()
+        print('---' * 55)
 
-# Constrói os serviços da API do Google Cloud:
-# - cloudresourcemanager para listar projetos.
-service_cloudresourcemanager = discovery.build('cloudresourcemanager', 'v1', credentials=credentials)
-service_compute = discovery.build('compute', 'v1', credentials=credentials)
+    def asset_rows(self, project, instance):
+        # O 'zone' da instância é a URL da zona
+        vm = build_vm_row(project['projectId'], instance.get('zone', '').split('/')[-1], instance)
+        if vm is not None:
+            yield vm
+
+    def collect(self, projects, runner):
+        project_ids = [project['projectId'] for project in projects]
+        for project_id in project_ids:
+            logger.info(f"Processando projeto: {project_id}")
+
+        if self.mode == 'aggregated':
+            return self.fetch_projects_aggregated(project_ids, runner.credentials)
+        return self.schedule_projects_zones(runner, project_ids)
+
+    # Função para buscar instâncias de VM de um projeto em um grupo de zonas.
+    # As chamadas instances.list das zonas vão em um único lote (batch HTTP).
+    def fetch_instances_in_zones(self, project_id, zones, credentials):
+        # Cada thread reutiliza o seu próprio cliente do serviço de computação.
+        service_compute_thread = get_service('compute', 'v1', credentials)
+        responses = {}
+
+        def on_response(zone, instances, exception):
+            if exception is not None:
+                self.log_fetch_error(f"listar VMs em '{project_id}' na zona '{zone}'", exception)
+                return
+            responses[zone] = instances
+
+        resources = service_compute_thread.instances()
+        requests = [(zone, resources.list(project=project_id, zone=zone, fields=INSTANCES_FIELDS))
+                    for zone in zones]
+        try:
+            execute_batch(service_compute_thread, requests, on_response)
+        except Exception as e:
+            self.log_fetch_error(f"listar VMs em '{project_id}' nas zonas {zones}", e)
+        for zone in zones:
+            for instance in responses.pop(zone, {}).get("items", []):
+                vm = build_vm_row(project_id, zone, instance)
+                if vm is not None:
+                    yield vm
+
+    # Gera as VMs de uma página da listagem agregada e segue a paginação do
+    # projeto até o fim, buscando a próxima página só quando a anterior foi consumida.
+    # Cada escopo em 'unreachables' é registrado como falha: as VMs dele ficaram de fora.
+    def follow_aggregated_pages(self, service_compute, project_id, request, response):
+        while True:
+            for unreachable in response.get('unreachables', []):
+                context = f"listar VMs do projeto '{project_id}' no escopo '{unreachable}'"
+                self.failed_calls.append(context)
+                logger.warning(f"  AVISO: Escopo '{unreachable}' inacessível ao listar VMs do projeto '{project_id}'.")
+
+            # As chaves do agregado são os escopos no formato 'zones/<zona>'
+            for scope, scoped_list in response.get('items', {}).items():
+                zone = scope.split('/')[-1]
+                for instance in scoped_list.get('instances', []):
+                    vm = build_vm_row(project_id, zone, instance)
+                    if vm is not None:
+                        yield vm
+
+            request = service_compute.instances().aggregatedList_next(
+                previous_request=request, previous_response=response)
+            if request is None:
+                return
+            response = rate_limit.execute(request)
+
+    # Tarefa de um grupo de projetos no modo 'aggregated': a primeira página de
+    # cada projeto vai em um único lote e as páginas seguintes são buscadas
+    # individualmente, à medida que as VMs são consumidas
+    def fetch_projects_aggregated(self, project_ids, credentials):
+        service_compute_thread = get_service('compute', 'v1', credentials)
+        requests = [(project_id, aggregated_instances_request(service_compute_thread, project_id))
+                    for project_id in project_ids]
+        first_requests = dict(requests)
+        responses = {}
+
+        def on_response(project_id, response, exception):
+            if exception is not None:
+                self.log_fetch_error(f"listar VMs do projeto '{project_id}'", exception)
+                return
+            responses[project_id] = response
+
+        try:
+            execute_batch(service_compute_thread, requests, on_response)
+        except Exception as e:
+            self.log_fetch_error(f"listar VMs dos projetos {project_ids}", e)
+
+        for project_id in project_ids:
+            if project_id not in responses:
+                continue
+            try:
+                yield from self.follow_aggregated_pages(service_compute_thread, project_id,
+                                                        first_requests[project_id], responses.pop(project_id))
+            except Exception as e:
+                self.log_fetch_error(f"listar VMs do projeto '{project_id}'", e)
+
+    # Tarefa de um grupo de projetos no modo 'zones': lista as zonas dos projetos
+    # em um lote e agenda as subtarefas de zonas no mesmo agendador, sem esperar
+    # por elas. As zonas de cada projeto são agrupadas em lotes de batch_size.
+    def schedule_projects_zones(self, runner, project_ids):
+        service_compute_thread = get_service('compute', 'v1', runner.credentials)
+
+        def on_response(project_id, zones_response, exception):
+            if exception is not None:
+                self.log_fetch_error(f"listar zonas para o projeto '{project_id}'", exception)
+                return
+            available_zones = [zone['name'] for zone in zones_response.get('items', [])]
+
+            if not available_zones:
+                logger.info(f"  AVISO: Nenhuma zona encontrada para o projeto '{project_id}'. Pulando este projeto.")
+                return
+
+            for zones in chunked(available_zones, runner.batch_size):
+                runner.submit(self, self.fetch_instances_in_zones, project_id, zones, runner.credentials)
+
+        requests = [(project_id, service_compute_thread.zones().list(project=project_id, fields=ZONES_FIELDS))
+                    for project_id in project_ids]
+        try:
+            execute_batch(service_compute_thread, requests, on_response)
+        except Exception as e:
+            self.log_fetch_error(f"listar zonas para os projetos {project_ids}", e)
+        return []
 
-try:
-    # Abre o arquivo CSV para escrita. 'newline=' é importante para evitar linhas em branco.
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        file_writer = csv.writer(csvfile, delimiter=';')
-        # Escreve o cabeçalho no arquivo CSV
-        file_writer.writerow(header_list)
+collector = VmCollector(logger, filename)
 
-        time_now("Iniciando a varredura de projetos...")
-        request_projects = service_cloudresourcemanager.projects().list()
+def main():
+    args = build_parser('Lista as instâncias VM de todos os projetos do GCP.', [collector]).parse_args()
+    run_inventory([collector], args, logger)
 
-        print(header_format.
-            format('', *header_list))
-        print('---' * 55)
-        
-        count = 1
-        # Loop para paginar os resultados
-        while request_projects is not None:
-            response_projects = request_projects.execute()
-
-            for project in response_projects.get('projects', []):
-                project_id = project['projectId']
-                project_state = project['lifecycleState']
-
-                if project_state == 'ACTIVE':
-                    logger.info(f"Processando projeto: {project_id}")
-
-                    try:
-                        zones_response = service_compute.zones().list(project=project_id).execute()
-                        available_zones = [zone['name'] for zone in zones_response.get('items', [])]
-
-                        if not available_zones:
-                            logger.info(f"  AVISO: Nenhuma zona encontrada para o projeto '{project_id}'. Pulando este projeto.")
-                            continue # Pula para o próximo projeto se nenhuma zona for encontrada
-
-                        # Usa ThreadPoolExecutor para buscar instâncias em paralelo para cada zona
-                        # max_workers=10 é um valor inicial, pode ser ajustado para otimizar o desempenho
-                        with ThreadPoolExecutor(max_workers=1000) as executor:
-                            # Mapeia futures para suas respectivas zonas para melhor tratamento de erros/logs
-                            future_to_zone = {executor.submit(fetch_instances_in_zone, project_id, zone, credentials): zone for zone in available_zones}
-
-                            # Processa os resultados à medida que ficam prontos
-                            for future in as_completed(future_to_zone):
-                                zone = future_to_zone[future]
-                                try:
-                                    vms_in_zone = future.result()
-                                    for vm in vms_in_zone:
-                                        # Imprime os detalhes da instância no console
-                                        print(header_format.
-                                              format(count, vm['project_id'], vm['instance_vm'], vm['vm_zone'],
-                                                     vm['ip_interno'], vm['so_version'], vm['status']))
-                                        logger.info([vm['project_id'], vm['instance_vm'], vm['vm_zone'],
-                                                     vm['ip_interno'], vm['so_version'], vm['status']])
-                                        # Escreve os dados no arquivo CSV
-                                        file_writer.writerow([vm['project_id'], vm['instance_vm'], vm['vm_zone'],
-                                                              vm['ip_interno'], vm['so_version'], vm['status']])
-                                        count += 1
-                                except Exception as exc:
-                                    logger.debug(f"  AVISO: Falha ao processar VMs da zona '{zone}' no projeto '{project_id}': {exc}")
-
-                    except errors.HttpError as http_e:
-                        logger.debug(f"  AVISO: Erro HTTP ao listar zonas para o projeto '{project_id}': {http_e.resp.status} - {http_e.content.decode()}")
-                    except Exception as e:
-                        logger.debug(f"  AVISO: Falha inesperada ao listar zonas para o projeto '{project_id}': {e}")
-
-            # Obtém a próxima página de projetos, se houver
-            request_projects = service_cloudresourcemanager.projects().list_next(
-                previous_request=request_projects, previous_response=response_projects)
-
-    time_now("Varredura de projetos concluída.")
-
-except Exception as e:
-    logger.error(f"\nERRO FATAL DURANTE A EXECUÇÃO DO SCRIPT: {e}")
-    sys.exit(1)
-
-time_now('Script finalizado: ')
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+# Script de benchmark dos scripts de inventário contra o servidor GCP simulado
+#
+# autor: Marcos Cardoso
+#
+# src/org/bench/benchmark.py
+#
+# Para cada tamanho de organização, sobe o servidor de fake_gcp.py, executa cada
+# script em um diretório temporário (sem tocar em csv/, log/ e cache/ do
+# repositório) e mede o tempo total, as chamadas à API, o pico de memória (RSS)
+# e as linhas geradas por segundo.
+#
+# Uso:
+# python3 -m src.org.bench.benchmark
+# python3 -m src.org.bench.benchmark --sizes 10,1000 --latency 0.05 --json bench.json -- --batch-size 20
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from src.org.bench.fake_gcp import FakeConfig, FakeGcpServer
+from src.org.common.clients import API_ENDPOINT_ENV, FAKE_ENV
+from src.org.common.rate_limit import DEFAULT_RATES
+
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+DEFAULT_SIZES = (10, 1000, 10000)
+
+# Scripts medidos e os CSVs que cada um gera
+SCRIPTS = {
+    'list_project.py': ('lista_GCP_project.csv',),
+    'list_vm.py': ('lista_GCP_VM.csv',),
+    'list_network.py': ('lista_GCP_network.csv',),
+    'list_k8s.py': ('lista_GCP_k8s.csv',),
+    'list_cloud_sql.py': ('lista_GCP_cloud_sql.csv',),
+    'inventory.py': ('lista_GCP_project.csv', 'lista_GCP_VM.csv', 'lista_GCP_network.csv',
+                     'lista_GCP_k8s.csv', 'lista_GCP_cloud_sql.csv'),
+}
+DEFAULT_SCRIPTS = ('list_project.py', 'list_vm.py', 'list_network.py', 'list_k8s.py', 'list_cloud_sql.py')
+
+# Chamadas por segundo usadas no benchmark, para medir o código e não a cota
+DEFAULT_QPS = 1000.0
+
+report_format = '{:>6} {:<18} {:>9} {:>8} {:>8} {:>9} {:>8} {:>10} {:<6}'
+report_list = 'PROJ.', 'SCRIPT', 'TEMPO', 'CHAMADAS', 'HTTP', 'RSS MB', 'LINHAS', 'LINHAS/S', 'STATUS'
+
+def sizes_type(value):
+    return [int(size) for size in value.split(',') if size.strip()]
+
+def scripts_type(value):
+    scripts = [script.strip() for script in value.split(',') if script.strip()]
+    unknown = [script for script in scripts if script not in SCRIPTS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"scripts válidos: {', '.join(SCRIPTS)}")
+    return scripts
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Mede os scripts de inventário contra o servidor GCP simulado. '
+                    'Argumentos depois de -- são repassados aos scripts.')
+    parser.add_argument('--sizes', type=sizes_type, default=list(DEFAULT_SIZES),
+                        help='Números de projetos, separados por vírgula (padrão: 10,1000,10000).')
+    parser.add_argument('--scripts', type=scripts_type, default=list(DEFAULT_SCRIPTS),
+                        help=f"Scripts medidos (padrão: {','.join(DEFAULT_SCRIPTS)}).")
+    parser.add_argument('--zones', type=int, default=4)
+    parser.add_argument('--vms-per-zone', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help='Latência por requisição HTTP, em segundos.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Variação aleatória da latência, em segundos.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração das chamadas respondidas com 429.')
+    parser.add_argument('--straggler-rate', type=float, default=0.0,
+                        help='Fração das requisições que demoram --straggler-delay segundos a mais.')
+    parser.add_argument('--straggler-delay', type=float, default=1.0, help='Atraso das requisições lentas, em segundos.')
+    parser.add_argument('--qps', type=float, default=DEFAULT_QPS,
+                        help=f'Chamadas por segundo de cada serviço nos scripts (padrão: {DEFAULT_QPS:g}).')
+    parser.add_argument('--timeout', type=float, default=3600, help='Tempo máximo de cada execução, em segundos.')
+    parser.add_argument('--json', help='Grava o relatório completo neste arquivo JSON.')
+    parser.add_argument('--keep', action='store_true', help='Mantém o diretório temporário com CSVs e logs.')
+    args, script_args = parser.parse_known_args()
+    if script_args[:1] == ['--']:
+        script_args = script_args[1:]
+    return args, script_args
+
+def prepare_workspace():
+    """
+    Copia os scripts e src/ para um diretório temporário, onde cada execução
+    grava os seus CSVs, logs e cache.
+    """
+    workspace = tempfile.mkdtemp(prefix='inventory-bench-')
+    for script in SCRIPTS:
+        shutil.copy2(os.path.join(BASE_DIR, script), workspace)
+    shutil.copytree(os.path.join(BASE_DIR, 'src'), os.path.join(workspace, 'src'),
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    if os.path.isdir(os.path.join(BASE_DIR, 'discovery')):
+        shutil.copytree(os.path.join(BASE_DIR, 'discovery'), os.path.join(workspace, 'discovery'))
+    return workspace
+
+def count_rows(workspace, script):
+    rows = 0
+    for csv_name in SCRIPTS[script]:
+        file_path = os.path.join(workspace, 'csv', csv_name)
+        if os.path.exists(file_path):
+            with open(file_path, encoding='utf-8') as csvfile:
+                # Desconta o cabeçalho
+                rows += max(0, sum(1 for _ in csvfile) - 1)
+    return rows
+
+def run_script(workspace, script, server, args, script_args):
+    """
+    Executa um script contra o servidor e retorna as medidas da execução.
+    """
+    # Sem os mapas em disco (projetos, APIs habilitadas) de um script para o seguinte
+    command = [sys.executable, script, '--projects-ttl', '0', '--apis-ttl', '0']
+    for api in DEFAULT_RATES:
+        command += ['--rate', f'{api}={args.qps:g}']
+    command += script_args
+
+    env = dict(os.environ, **{API_ENDPOINT_ENV: server.url, FAKE_ENV: '1'})
+    server.stats.reset()
+    with open(os.path.join(workspace, f'{script}.out'), 'w') as output:
+        started = time.monotonic()
+        process = subprocess.Popen(command, cwd=workspace, env=env, stdout=output, stderr=subprocess.STDOUT)
+        deadline = started + args.timeout
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.monotonic() > deadline:
+                process.kill()
+                pid, status, usage = os.wait4(process.pid, 0)
+                break
+            time.sleep(0.05)
+        wall = time.monotonic() - started
+
+    stats = server.stats.snapshot()
+    rows = count_rows(workspace, script)
+    return_code = os.waitstatus_to_exitcode(status)
+    return {
+        'script': script,
+        'wall_seconds': round(wall, 3),
+        'return_code': return_code,
+        'api_calls': stats['total_calls'],
+        'http_requests': stats['http_requests'],
+        'batch_requests': stats['batch_requests'],
+        'bytes_received': stats['bytes_sent'],
+        'calls_by_method': stats['calls'],
+        'errors_by_method': stats['errors'],
+        # ru_maxrss é informado em KB no Linux
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'rows': rows,
+        'rows_per_second': round(rows / wall, 1) if wall > 0 else 0.0,
+    }
+
+def main():
+    args, script_args = parse_args()
+    workspace = prepare_workspace()
+    report = {'settings': {key: value for key, value in vars(args).items() if key != 'json'},
+              'script_args': script_args, 'runs': []}
+    failed = False
+
+    print(f"Diretório de trabalho: {workspace}")
+    print(report_format.
+        format(*report_list))
+    print('---' * 31)
+    try:
+        for size in args.sizes:
+            config = FakeConfig(projects=size, zones=args.zones, vms_per_zone=args.vms_per_zone,
+                                latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=size,
+                                straggler_rate=args.straggler_rate, straggler_delay=args.straggler_delay)
+            server = FakeGcpServer(config).start()
+            try:
+                for script in args.scripts:
+                    result = run_script(workspace, script, server, args, script_args)
+                    result['projects'] = size
+                    report['runs'].append(result)
+                    failed = failed or result['return_code'] != 0
+                    print(report_format.
+                        format(size, script, f"{result['wall_seconds']:.2f}s", result['api_calls'],
+                               result['http_requests'], result['peak_rss_mb'], result['rows'],
+                               result['rows_per_second'], 'OK' if result['return_code'] == 0 else 'FALHA'))
+            finally:
+                server.stop()
+    finally:
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as json_file:
+                json.dump(report, json_file, indent=2)
+            print(f"Relatório gravado em {args.json}")
+        if args.keep:
+            print(f"CSVs e logs mantidos em {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
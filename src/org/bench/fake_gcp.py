@@ -0,0 +1,702 @@
+# Script com um servidor local que imita as APIs do Google Cloud usadas pelo inventário
+#
+# autor: Marcos Cardoso
+#
+# src/org/bench/fake_gcp.py
+#
+# Serve respostas sintéticas de Resource Manager, Compute, Container, SQL Admin,
+# Cloud Asset Inventory (assets.list) e Service Usage (services.batchGet), com paginação, lotes (batch HTTP), máscaras 'fields', latência e erros 429
+# injetados. Os dados são gerados a cada chamada a partir do índice do projeto,
+# então a memória do servidor não cresce com o tamanho da organização.
+#
+# Uso:
+# python3 -m src.org.bench.fake_gcp --projects 1000 --latency 0.05 --error-rate 0.01
+#
+# E, em outro terminal, qualquer script apontando para ele:
+# GCP_FAKE=1 GCP_API_ENDPOINT=http://127.0.0.1:8765/ python3 list_vm.py
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_PORT = 8765
+REGIONS = ('us-central1', 'southamerica-east1', 'europe-west1', 'asia-east1')
+
+# Serviços desabilitados nos projetos de 'disabled_every'
+DISABLED_SERVICES = ('compute.googleapis.com', 'container.googleapis.com', 'sqladmin.googleapis.com')
+
+# Tipos do Cloud Asset Inventory: prefixo do selfLink e do nome do asset
+ASSET_NAME_PREFIXES = {
+    'compute.googleapis.com/Instance': ('https://www.googleapis.com/compute/v1/', '//compute.googleapis.com/'),
+    'compute.googleapis.com/Subnetwork': ('https://www.googleapis.com/compute/v1/', '//compute.googleapis.com/'),
+    'container.googleapis.com/Cluster': ('https://container.googleapis.com/v1/', '//container.googleapis.com/'),
+    'sqladmin.googleapis.com/Instance': ('https://sqladmin.googleapis.com/sql/v1beta4/', '//cloudsql.googleapis.com/'),
+}
+
+class FakeConfig:
+    """
+    Tamanho e comportamento da organização simulada.
+
+    Args:
+        projects (int): Número de projetos.
+        zones (int): Zonas por projeto (duas por região).
+        vms_per_zone (int): VMs por zona; a última de cada zona é um nó GKE.
+        networks (int): VPCs por projeto, cada uma com uma sub-rede por região.
+        page_size (int): Itens por página quando a chamada não informa o tamanho.
+        latency (float): Latência de cada requisição HTTP, em segundos.
+        jitter (float): Variação aleatória somada à latência, em segundos.
+        error_rate (float): Fração das chamadas respondidas com 429.
+        straggler_rate (float): Fração das requisições que demoram
+                                'straggler_delay' segundos a mais (cauda de latência).
+        straggler_delay (float): Atraso extra das requisições lentas, em segundos.
+        deleted_every (int): A cada N projetos, um fica DELETE_REQUESTED (0 desativa).
+        disabled_every (int): A cada N projetos, um tem Compute/GKE/SQL
+                              desabilitadas e responde 403 (0 desativa).
+        seed (int, optional): Semente dos erros e da latência aleatória.
+    """
+
+    def __init__(self, projects=10, zones=4, vms_per_zone=3, networks=2, page_size=100,
+                 latency=0.0, jitter=0.0, error_rate=0.0, deleted_every=7, disabled_every=10, seed=None,
+                 straggler_rate=0.0, straggler_delay=0.0):
+        self.projects = projects
+        self.zones = zones
+        self.vms_per_zone = vms_per_zone
+        self.networks = networks
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.deleted_every = deleted_every
+        self.disabled_every = disabled_every
+        self.seed = seed
+        self.straggler_rate = straggler_rate
+        self.straggler_delay = straggler_delay
+
+# ---------------------------------------------------------------------------
+# Máscaras de resposta parcial ('fields')
+# ---------------------------------------------------------------------------
+
+def parse_fields(mask):
+    """
+    Converte uma máscara como 'nextPageToken,items/*/instances(name,status)'
+    em uma árvore {campo: subárvore ou None}.
+    """
+    position = 0
+
+    def parse_list(end):
+        nonlocal position
+        tree = {}
+        while position < len(mask) and mask[position] != end:
+            if mask[position] == ',':
+                position += 1
+                continue
+            path = ['']
+            while position < len(mask) and mask[position] not in ',()':
+                if mask[position] == '/':
+                    path.append('')
+                else:
+                    path[-1] += mask[position]
+                position += 1
+            subtree = None
+            if position < len(mask) and mask[position] == '(':
+                position += 1
+                subtree = parse_list(')')
+                position += 1
+            node = tree
+            for name in path[:-1]:
+                if name in node and node[name] is None:
+                    node = None
+                    break
+                node = node.setdefault(name, {})
+            if node is not None:
+                node[path[-1]] = subtree
+        return tree
+
+    return parse_list(None)
+
+def apply_fields(value, tree):
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [apply_fields(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for name, subtree in tree.items():
+        if name == '*':
+            for key, item in value.items():
+                result[key] = apply_fields(item, subtree)
+        elif name in value:
+            result[name] = apply_fields(value[name], subtree)
+    return result
+
+# ---------------------------------------------------------------------------
+# Dados sintéticos
+# ---------------------------------------------------------------------------
+
+def zone_name(index):
+    # Duas zonas por região ('-a', '-b'); depois de usar todas as regiões,
+    # continua com '-c', '-d' e assim por diante
+    region = REGIONS[(index // 2) % len(REGIONS)]
+    suffix = 'abcdefgh'[index % 2 + 2 * (index // (2 * len(REGIONS)))]
+    return f'{region}-{suffix}'
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class FakeGcp:
+    """
+    Gera as respostas das APIs a partir da configuração.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.zone_names = [zone_name(index) for index in range(config.zones)]
+        self.region_names = sorted({zone.rsplit('-', 1)[0] for zone in self.zone_names})
+
+    # Projetos
+
+    def project_id(self, index):
+        return f'proj-{index:05d}'
+
+    def project_index(self, project_id):
+        match = re.fullmatch(r'proj-(\d+)', project_id)
+        if not match or int(match[1]) >= self.config.projects:
+            raise HttpError(404, f"Projeto '{project_id}' não encontrado.")
+        return int(match[1])
+
+    def project(self, index):
+        every = self.config.deleted_every
+        return {
+            'projectId': self.project_id(index),
+            'name': f'Projeto {index}',
+            'projectNumber': str(100000 + index),
+            'lifecycleState': 'DELETE_REQUESTED' if every and index % every == every - 1 else 'ACTIVE',
+            'labels': {'env': ('dev', 'hml', 'prd')[index % 3]},
+            'parent': {'type': 'folder', 'id': str(index % 5)},
+            'createTime': '2024-01-01T00:00:00Z',
+        }
+
+    def project_index_or_number(self, project):
+        # A Service Usage aceita o ID ou o número do projeto
+        if project.isdigit() and 0 <= int(project) - 100000 < self.config.projects:
+            return int(project) - 100000
+        return self.project_index(project)
+
+    def service_enabled(self, index, service):
+        every = self.config.disabled_every
+        return not (every and index % every == every - 1 and service in DISABLED_SERVICES)
+
+    def check_enabled(self, project_id, api):
+        index = self.project_index(project_id)
+        every = self.config.disabled_every
+        if every and index % every == every - 1:
+            raise HttpError(403, f"{api} API has not been used in project {project_id} before or it is disabled.")
+        return index
+
+    def matches_filter(self, project, api_filter):
+        # Suporta os termos usados pelo catálogo: campo:valor, com '*' no fim
+        for term in api_filter.split():
+            field, _, expected = term.partition(':')
+            if field == 'lifecycleState':
+                actual = project['lifecycleState']
+            elif field == 'id':
+                actual = project['projectId']
+            elif field.startswith('labels.'):
+                actual = project['labels'].get(field[len('labels.'):])
+            elif field in ('parent.type', 'parent.id'):
+                actual = project['parent'][field.split('.')[1]]
+            else:
+                continue
+            if actual is None:
+                return False
+            if expected.endswith('*'):
+                if not actual.lower().startswith(expected[:-1].lower()):
+                    return False
+            elif actual.lower() != expected.lower():
+                return False
+        return True
+
+    # Compute
+
+    def instance(self, project_id, zone, index):
+        name = f'vm-{zone}-{index}'
+        link = f'https://www.googleapis.com/compute/v1/projects/{project_id}/zones/{zone}/instances/{name}'
+        instance = {
+            'kind': 'compute#instance',
+            'id': str(zlib.crc32(link.encode('utf-8'))),
+            'name': name,
+            'status': 'RUNNING' if index % 4 else 'TERMINATED',
+            'zone': f'https://www.googleapis.com/compute/v1/projects/{project_id}/zones/{zone}',
+            'machineType': f'zones/{zone}/machineTypes/e2-medium',
+            'creationTimestamp': '2024-01-01T00:00:00.000-03:00',
+            'selfLink': link,
+            'disks': [{'boot': True, 'licenses': ['https://www.googleapis.com/compute/v1/projects/debian-cloud/global/licenses/debian-12']}],
+            'networkInterfaces': [{'network': f'projects/{project_id}/global/networks/default',
+                                   'networkIP': f'10.{index % 250}.{len(zone)}.{index % 200 + 2}'}],
+            # Metadados grandes, como os scripts de inicialização reais
+            'metadata': {'fingerprint': 'abc=', 'items': [{'key': 'startup-script', 'value': '#!/bin/bash\n' + 'echo ok\n' * 200}]},
+        }
+        if index == self.config.vms_per_zone - 1:
+            instance['labels'] = {'goog-k8s-cluster-name': 'gke-1', 'goog-k8s-node-pool-name': 'pool-1'}
+        return instance
+
+    def instance_keys(self):
+        return [(zone, index) for zone in self.zone_names for index in range(self.config.vms_per_zone)]
+
+    def subnetwork(self, project_id, network, region):
+        index = self.region_names.index(region)
+        return {
+            'name': f'{network}-{region}',
+            'network': f'https://www.googleapis.com/compute/v1/projects/{project_id}/global/networks/{network}',
+            'region': f'https://www.googleapis.com/compute/v1/projects/{project_id}/regions/{region}',
+            'ipCidrRange': f'10.{index}.0.0/20',
+            'gatewayAddress': f'10.{index}.0.1',
+            'creationTimestamp': '2024-01-01T00:00:00.000-03:00',
+            'secondaryIpRanges': [{'rangeName': 'pods', 'ipCidrRange': f'10.{100 + index}.0.0/16'}],
+            'selfLink': f'https://www.googleapis.com/compute/v1/projects/{project_id}/regions/{region}/subnetworks/{network}-{region}',
+        }
+
+    def network_names(self):
+        return ['default'] + [f'vpc-{index}' for index in range(1, self.config.networks)]
+
+    # Container e SQL
+
+    def clusters(self, project_id):
+        index = self.project_index(project_id)
+        if index % 2 == 0:
+            return []
+        return [{
+            'name': 'gke-1',
+            'currentMasterVersion': '1.30.5-gke.1014001',
+            'createTime': '2024-01-01T00:00:00+00:00',
+            'zone': 'us-central1',
+            'location': 'us-central1',
+            'nodeConfig': {'diskSizeGb': 100, 'machineType': 'e2-standard-4'},
+            'currentNodeCount': 3,
+            'autoscaling': {'autoscalingProfile': 'BALANCED'},
+            'locations': ['us-central1-a', 'us-central1-b', 'us-central1-c'],
+            'nodePools': [{'name': f'pool-{pool}', 'version': '1.30.5-gke.1014001',
+                           'config': {'machineType': 'e2-standard-4'}} for pool in (1, 2)],
+            'selfLink': f'https://container.googleapis.com/v1/projects/{project_id}/locations/us-central1/clusters/gke-1',
+        }]
+
+    def sql_instances(self, project_id):
+        index = self.project_index(project_id)
+        if index % 3 == 2:
+            return []
+        return [{
+            'name': f'sql-{index}',
+            'databaseInstalledVersion': 'POSTGRES_15_7',
+            'createTime': '2024-01-01T00:00:00.000Z',
+            'instanceType': 'CLOUD_SQL_INSTANCE' if index % 3 == 0 else 'READ_REPLICA_INSTANCE',
+            'region': 'us-central1',
+            'settings': {'tier': 'db-custom-2-7680', 'dataDiskType': 'PD_SSD', 'dataDiskSizeGb': '100',
+                         'locationPreference': {'zone': 'us-central1-a'},
+                         'backupConfiguration': {'enabled': index % 3 == 0}},
+            'ipAddresses': [{'type': 'PRIVATE', 'ipAddress': f'10.200.{index % 250}.3'}],
+            'selfLink': f'https://sqladmin.googleapis.com/sql/v1beta4/projects/{project_id}/instances/sql-{index}',
+        }]
+
+    # Cloud Asset Inventory
+
+    def asset_keys(self, scope, asset_types):
+        """
+        Chaves (projeto, tipo, recurso) dos assets do escopo. Projetos com as
+        APIs desabilitadas não têm recursos.
+        """
+        kind, _, scope_id = scope.partition('/')
+        every = self.config.disabled_every
+        keys = []
+        for index in range(self.config.projects):
+            if every and index % every == every - 1:
+                continue
+            project = self.project(index)
+            if kind == 'folders' and project['parent']['id'] != scope_id:
+                continue
+            if kind == 'projects' and scope_id not in (project['projectId'], project['projectNumber']):
+                continue
+            project_id = project['projectId']
+            for asset_type in asset_types:
+                if asset_type == 'compute.googleapis.com/Instance':
+                    resources = self.instance_keys()
+                elif asset_type == 'compute.googleapis.com/Subnetwork':
+                    resources = [(network, region) for network in self.network_names() for region in self.region_names]
+                elif asset_type == 'container.googleapis.com/Cluster':
+                    resources = range(len(self.clusters(project_id)))
+                elif asset_type == 'sqladmin.googleapis.com/Instance':
+                    resources = range(len(self.sql_instances(project_id)))
+                else:
+                    resources = ()
+                keys += [(index, asset_type, resource) for resource in resources]
+        return keys
+
+    def asset(self, index, asset_type, resource, content_type):
+        project_id = self.project_id(index)
+        if asset_type == 'compute.googleapis.com/Instance':
+            data = self.instance(project_id, *resource)
+        elif asset_type == 'compute.googleapis.com/Subnetwork':
+            data = self.subnetwork(project_id, *resource)
+        elif asset_type == 'container.googleapis.com/Cluster':
+            data = self.clusters(project_id)[resource]
+        else:
+            data = self.sql_instances(project_id)[resource]
+        link_prefix, name_prefix = ASSET_NAME_PREFIXES[asset_type]
+        asset = {
+            'name': name_prefix + data['selfLink'][len(link_prefix):],
+            'assetType': asset_type,
+            'ancestors': [f'projects/{100000 + index}', f'folders/{index % 5}', 'organizations/1'],
+            'updateTime': '2024-01-01T00:00:00Z',
+        }
+        if content_type == 'RESOURCE':
+            asset['resource'] = {'version': 'v1', 'discoveryName': asset_type.split('/')[-1],
+                                 'parent': f'//cloudresourcemanager.googleapis.com/projects/{100000 + index}',
+                                 'data': data}
+        return asset
+
+# ---------------------------------------------------------------------------
+# Rotas
+# ---------------------------------------------------------------------------
+
+def paginate(items, query, size_param, default_size):
+    start = int(query.get('pageToken', ['0'])[0] or 0)
+    size = int(query.get(size_param, [default_size])[0])
+    page = items[start:start + size]
+    next_token = str(start + size) if start + size < len(items) else None
+    return page, next_token
+
+def with_token(body, next_token):
+    if next_token:
+        body['nextPageToken'] = next_token
+    return body
+
+class Router:
+    """
+    Associa cada caminho a um método da API e monta a resposta.
+    """
+
+    def __init__(self, fake):
+        self.fake = fake
+        config = fake.config
+        self.routes = [
+            ('cloudresourcemanager.projects.list', r'/v1/projects', self.projects_list),
+            ('cloudresourcemanager.projects.get', r'/v1/projects/([^/:]+)', self.projects_get),
+            ('compute.zones.list', r'/compute/v1/projects/([^/]+)/zones', self.zones_list),
+            ('compute.instances.list', r'/compute/v1/projects/([^/]+)/zones/([^/]+)/instances', self.instances_list),
+            ('compute.instances.aggregatedList', r'/compute/v1/projects/([^/]+)/aggregated/instances', self.instances_aggregated),
+            ('compute.networks.list', r'/compute/v1/projects/([^/]+)/global/networks', self.networks_list),
+            ('compute.subnetworks.aggregatedList', r'/compute/v1/projects/([^/]+)/aggregated/subnetworks', self.subnetworks_aggregated),
+            ('container.projects.locations.clusters.list', r'/v1/projects/([^/]+)/locations/([^/]+)/clusters', self.clusters_list),
+            ('sql.instances.list', r'/sql/v1beta4/projects/([^/]+)/instances', self.sql_instances_list),
+            ('cloudasset.assets.list', r'/v1/((?:organizations|folders|projects)/[^/]+)/assets', self.assets_list),
+            ('serviceusage.services.batchGet', r'/v1/projects/([^/]+)/services:batchGet', self.services_batch_get),
+        ]
+        self.default_size = config.page_size
+
+    def method(self, path):
+        url_path = urlparse(path).path
+        for method, pattern, _ in self.routes:
+            if re.fullmatch(pattern, url_path):
+                return method
+        return 'unknown'
+
+    def route(self, path):
+        """
+        Returns:
+            tuple: (método, status, corpo)
+        """
+        url = urlparse(path)
+        query = parse_qs(url.query)
+        for method, pattern, handler in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if match:
+                try:
+                    body = handler(query, *match.groups())
+                except HttpError as e:
+                    return method, e.status, {'error': {'code': e.status, 'message': str(e)}}
+                if 'fields' in query:
+                    body = apply_fields(body, parse_fields(query['fields'][0]))
+                return method, 200, body
+        return 'unknown', 404, {'error': {'code': 404, 'message': f'Caminho desconhecido: {url.path}'}}
+
+    def projects_list(self, query):
+        fake = self.fake
+        api_filter = query.get('filter', [''])[0]
+        projects = (fake.project(index) for index in range(fake.config.projects))
+        if api_filter:
+            projects = (project for project in projects if fake.matches_filter(project, api_filter))
+        page, next_token = paginate(list(projects), query, 'pageSize', self.default_size)
+        return with_token({'projects': page}, next_token)
+
+    def projects_get(self, query, project_id):
+        return self.fake.project(self.fake.project_index(project_id))
+
+    def zones_list(self, query, project_id):
+        self.fake.check_enabled(project_id, 'Compute Engine')
+        page, next_token = paginate(self.fake.zone_names, query, 'maxResults', 500)
+        return with_token({'items': [{'name': zone, 'status': 'UP'} for zone in page]}, next_token)
+
+    def instances_list(self, query, project_id, zone):
+        self.fake.check_enabled(project_id, 'Compute Engine')
+        indexes = list(range(self.fake.config.vms_per_zone)) if zone in self.fake.zone_names else []
+        page, next_token = paginate(indexes, query, 'maxResults', 500)
+        return with_token({'items': [self.fake.instance(project_id, zone, index) for index in page]}, next_token)
+
+    def instances_aggregated(self, query, project_id):
+        self.fake.check_enabled(project_id, 'Compute Engine')
+        page, next_token = paginate(self.fake.instance_keys(), query, 'maxResults', 500)
+        items = {}
+        for zone, index in page:
+            items.setdefault(f'zones/{zone}', {'instances': []})['instances'].append(
+                self.fake.instance(project_id, zone, index))
+        return with_token({'items': items}, next_token)
+
+    def networks_list(self, query, project_id):
+        self.fake.check_enabled(project_id, 'Compute Engine')
+        page, next_token = paginate(self.fake.network_names(), query, 'maxResults', 500)
+        return with_token({'items': [{
+            'name': network,
+            'selfLink': f'https://www.googleapis.com/compute/v1/projects/{project_id}/global/networks/{network}',
+        } for network in page]}, next_token)
+
+    def subnetworks_aggregated(self, query, project_id):
+        self.fake.check_enabled(project_id, 'Compute Engine')
+        keys = [(network, region) for network in self.fake.network_names() for region in self.fake.region_names]
+        page, next_token = paginate(keys, query, 'maxResults', 500)
+        items = {}
+        for network, region in page:
+            items.setdefault(f'regions/{region}', {'subnetworks': []})['subnetworks'].append(
+                self.fake.subnetwork(project_id, network, region))
+        return with_token({'items': items}, next_token)
+
+    def clusters_list(self, query, project_id, location):
+        self.fake.check_enabled(project_id, 'Kubernetes Engine')
+        return {'clusters': self.fake.clusters(project_id)}
+
+    def sql_instances_list(self, query, project_id):
+        self.fake.check_enabled(project_id, 'Cloud SQL Admin')
+        page, next_token = paginate(self.fake.sql_instances(project_id), query, 'maxResults', 500)
+        return with_token({'items': page}, next_token)
+
+    def services_batch_get(self, query, project):
+        index = self.fake.project_index_or_number(project)
+        return {'services': [{'name': name, 'state': 'ENABLED' if self.fake.service_enabled(index, name.split('/')[-1])
+                              else 'DISABLED'} for name in query.get('names', [])]}
+
+    def assets_list(self, query, scope):
+        keys = self.fake.asset_keys(scope, query.get('assetTypes', []))
+        page, next_token = paginate(keys, query, 'pageSize', 100)
+        content_type = query.get('contentType', [''])[0]
+        return with_token({'assets': [self.fake.asset(*key, content_type) for key in page],
+                           'readTime': '2024-01-01T00:00:00Z'}, next_token)
+
+# ---------------------------------------------------------------------------
+# Servidor HTTP
+# ---------------------------------------------------------------------------
+
+class FakeStats:
+    """
+    Contadores de chamadas por método, requisições HTTP e bytes enviados.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = {}
+            self.errors = {}
+            self.http_requests = 0
+            self.batch_requests = 0
+            self.bytes_sent = 0
+
+    def record(self, method, status):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if status != 200:
+                key = f'{method} {status}'
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def record_request(self, size, batch=False):
+        with self._lock:
+            self.http_requests += 1
+            self.batch_requests += int(batch)
+            self.bytes_sent += size
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': dict(self.calls),
+                'total_calls': sum(self.calls.values()),
+                'errors': dict(self.errors),
+                'http_requests': self.http_requests,
+                'batch_requests': self.batch_requests,
+                'bytes_sent': self.bytes_sent,
+            }
+
+class FakeGcpServer:
+    """
+    Servidor HTTP da organização simulada, executado em uma thread.
+
+    Args:
+        config (FakeConfig): Tamanho e comportamento da organização.
+        host (str): Endereço de escuta.
+        port (int): Porta de escuta; 0 escolhe uma porta livre.
+    """
+
+    def __init__(self, config, host='127.0.0.1', port=0):
+        self.config = config
+        self.router = Router(FakeGcp(config))
+        self.stats = FakeStats()
+        self._random = random.Random(config.seed)
+        self._random_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def _random_value(self):
+        with self._random_lock:
+            return self._random.random()
+
+    def _sleep(self):
+        delay = self.config.latency + self.config.jitter * self._random_value()
+        if self.config.straggler_rate and self._random_value() < self.config.straggler_rate:
+            delay += self.config.straggler_delay
+        if delay > 0:
+            time.sleep(delay)
+
+    def call(self, path):
+        """
+        Responde a uma chamada (isolada ou item de um lote).
+
+        Returns:
+            tuple: (status, corpo)
+        """
+        if self.config.error_rate and self._random_value() < self.config.error_rate:
+            method = self.router.method(path)
+            self.stats.record(method, 429)
+            return 429, {'error': {'code': 429, 'message': 'Quota exceeded (simulado).', 'status': 'RESOURCE_EXHAUSTED'}}
+        method, status, body = self.router.route(path)
+        self.stats.record(method, status)
+        return status, body
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def send_body(self, status, content_type, data, batch=False):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                server.stats.record_request(len(data), batch)
+
+            def do_GET(self):
+                if self.path.startswith('/_fake/stats'):
+                    self.send_body(200, 'application/json', json.dumps(server.stats.snapshot()).encode())
+                    return
+                server._sleep()
+                status, body = server.call(self.path)
+                self.send_body(status, 'application/json; charset=UTF-8', json.dumps(body).encode())
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = self.rfile.read(length)
+                if self.path.startswith('/_fake/reset'):
+                    server.stats.reset()
+                    self.send_body(200, 'application/json', b'{}')
+                    return
+                if not self.path.startswith('/batch'):
+                    self.send_body(404, 'application/json', b'{}')
+                    return
+                server._sleep()
+                boundary = 'fake_gcp_batch'
+                parts = []
+                for content_id, path in parse_batch(self.headers['Content-Type'], payload):
+                    status, body = server.call(path)
+                    parts.append(f'--{boundary}\r\nContent-Type: application/http\r\n'
+                                 f'Content-ID: <response-{content_id}>\r\n\r\n'
+                                 f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'
+                                 f'Content-Type: application/json; charset=UTF-8\r\n\r\n'
+                                 f'{json.dumps(body)}\r\n')
+                data = (''.join(parts) + f'--{boundary}--\r\n').encode()
+                self.send_body(200, f'multipart/mixed; boundary={boundary}', data, batch=True)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-gcp', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+def parse_batch(content_type, payload):
+    """
+    Gera (Content-ID, caminho) de cada item de um lote multipart/mixed.
+    """
+    boundary = content_type.split('boundary=')[1].strip('"')
+    text = payload.decode('utf-8').replace('\r\n', '\n')
+    for part in text.split(f'--{boundary}'):
+        part = part.strip('\n')
+        if not part or part == '--':
+            continue
+        headers, _, request = part.partition('\n\n')
+        content_id = re.search(r'Content-ID: <(.*)>', headers, re.IGNORECASE)[1]
+        method, path = request.split('\n')[0].split(' ')[:2]
+        yield content_id, path
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Servidor local que imita as APIs do GCP usadas pelo inventário.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--projects', type=int, default=10)
+    parser.add_argument('--zones', type=int, default=4)
+    parser.add_argument('--vms-per-zone', type=int, default=3)
+    parser.add_argument('--networks', type=int, default=2)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0, help='Latência por requisição HTTP, em segundos.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Variação aleatória da latência, em segundos.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração das chamadas respondidas com 429.')
+    parser.add_argument('--straggler-rate', type=float, default=0.0,
+                        help='Fração das requisições que demoram --straggler-delay segundos a mais.')
+    parser.add_argument('--straggler-delay', type=float, default=1.0, help='Atraso das requisições lentas, em segundos.')
+    parser.add_argument('--seed', type=int)
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    config = FakeConfig(args.projects, args.zones, args.vms_per_zone, args.networks, args.page_size,
+                        args.latency, args.jitter, args.error_rate, seed=args.seed,
+                        straggler_rate=args.straggler_rate, straggler_delay=args.straggler_delay)
+    server = FakeGcpServer(config, args.host, args.port)
+    print(f"Servidor GCP simulado em {server.url} ({args.projects} projetos). Ctrl-C para sair.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats.snapshot(), indent=1))
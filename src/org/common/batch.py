@@ -0,0 +1,106 @@
+# Script com o agrupamento de requisições em lotes (batch HTTP)
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/batch.py
+#
+# Documentation
+# https://googleapis.github.io/google-api-python-client/docs/batch.html
+
+import argparse
+from src.org.common import metrics, rate_limit
+
+# Por padrão cada chamada é enviada sozinha (sem lote)
+DEFAULT_BATCH_SIZE = 1
+# Limite de chamadas por lote das APIs do Google
+MAX_BATCH_SIZE = 1000
+
+def batch_size_type(value):
+    """
+    Valida o tamanho de lote informado na linha de comando (argparse).
+    """
+    size = int(value)
+    if size < 1 or size > MAX_BATCH_SIZE:
+        raise argparse.ArgumentTypeError(f"o tamanho do lote deve estar entre 1 e {MAX_BATCH_SIZE}")
+    return size
+
+def chunked(items, size):
+    """
+    Agrupa os itens de um iterável em listas de até 'size' itens.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def execute_batch(service, requests, callback):
+    """
+    Executa as requisições em um único lote (BatchHttpRequest) e chama
+    'callback' para cada item. O erro de um item (ex.: 403 de um projeto sem
+    a API habilitada) é entregue apenas ao callback daquele item, sem
+    derrubar o lote. Itens que voltam com 429/5xx são repetidos
+    individualmente pelo controle de taxa. Com uma única requisição, ela é
+    executada diretamente.
+
+    Os callbacks são chamados depois que o lote termina e libera a sua vaga
+    na concorrência adaptativa: um callback que faz novas chamadas (ex.: a
+    próxima página de uma listagem) não espera por uma vaga ocupada pelo
+    próprio lote.
+
+    Args:
+        service (googleapiclient.discovery.Resource): Cliente da API usado
+            para criar o lote (define o endpoint de batch da API).
+        requests (list): Lista de tuplas (chave, HttpRequest), com no máximo
+            MAX_BATCH_SIZE itens.
+        callback (callable): Chamado como callback(chave, resposta, exceção);
+            'resposta' é None quando há exceção e vice-versa.
+    """
+    if len(requests) == 1:
+        key, request = requests[0]
+        execute_item(key, request, callback)
+        return
+
+    keys = {}
+    retries = []
+    # Resultado de cada item, entregue ao callback depois do lote
+    results = []
+
+    def on_item(request_id, response, exception):
+        key, request = keys[request_id]
+        if exception is not None and rate_limit.is_retryable(exception):
+            retries.append((key, request, exception))
+            return
+        results.append((key, request, response, exception))
+
+    batch = service.new_batch_http_request(callback=on_item)
+    for index, (key, request) in enumerate(requests):
+        keys[str(index)] = (key, request)
+        batch.add(metrics.instrument(request), request_id=str(index))
+    rate_limit.execute(batch, api=rate_limit.api_name(requests[0][1]), calls=len(requests))
+
+    metrics.record_batch(len(requests))
+    for _, request, _, exception in results:
+        metrics.record(request, 200 if exception is None else metrics.error_status(exception), batch.latency)
+    for key, _, response, exception in results:
+        callback(key, response, exception)
+    if any(rate_limit.is_throttling(exception) for _, _, exception in retries):
+        rate_limit.limiter.concurrency.signal_throttling()
+    for key, request, _ in retries:
+        execute_item(key, request, callback, retries=1)
+
+def execute_item(key, request, callback, retries=0):
+    """
+    Executa uma requisição pelo controle de taxa e entrega o resultado ou a
+    exceção ao callback. 'retries' conta as tentativas já feitas dentro de
+    um lote.
+    """
+    try:
+        response = rate_limit.execute(request, retries=retries)
+    except Exception as e:
+        callback(key, None, e)
+    else:
+        callback(key, response, None)
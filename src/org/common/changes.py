@@ -0,0 +1,161 @@
+# Script com a detecção de mudanças entre varreduras do inventário
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/changes.py
+#
+# Com --changes cada coletor guarda em disco (cache/) um retrato da varredura:
+# para cada recurso (self_link) a impressão digital da linha, a data de
+# criação (creationTimestamp/createTime) e os valores das colunas. Na
+# varredura seguinte as linhas são comparadas com esse retrato e as mudanças
+# são gravadas ao lado do CSV completo (ex.: csv/lista_GCP_VM_changes.csv):
+# - added: recurso novo, ou recriado (mesmo self_link com outra data de criação)
+# - removed: recurso que não apareceu mais em um projeto varrido
+# - modified: recurso com alguma coluna diferente (ver CAMPOS)
+#
+# Recursos de projetos fora da varredura (ex.: --include-projects) continuam
+# no retrato. Se um coletor teve chamadas com falha, os recursos não vistos
+# também continuam no retrato e não são dados como removidos.
+
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from src.org.common.metrics import write_atomic
+from src.org.common.sinks import Sink
+
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+SNAPSHOT_DIR = os.path.join(BASE_DIR, 'cache')
+
+CHANGE_KINDS = ('added', 'removed', 'modified')
+
+# Projeto do recurso a partir do self_link
+PROJECT_PATTERN = re.compile(r'/projects/([^/?]+)')
+
+def add_arguments(parser):
+    """
+    Adiciona as opções da detecção de mudanças ao parser.
+    """
+    group = parser.add_argument_group('mudanças entre varreduras')
+    group.add_argument('--changes', action='store_true',
+                       help='Compara com a varredura anterior e grava as mudanças (added/removed/modified) '
+                            'em csv/<arquivo>_changes.csv, além da saída completa.')
+
+def fingerprint(values):
+    return hashlib.sha1(json.dumps(values, default=str).encode('utf-8')).hexdigest()[:16]
+
+def resource_project(self_link):
+    match = PROJECT_PATTERN.search(self_link)
+    return match[1] if match else None
+
+class ChangeSetSink(Sink):
+    """
+    Compara as linhas da varredura com o retrato anterior de cada coletor,
+    grava o conjunto de mudanças e o novo retrato ao fim da varredura.
+
+    Args:
+        runner (InventoryRunner): Executor da varredura, com os projetos
+            enviados a cada coletor e as chamadas com falha.
+        snapshot_dir (str): Diretório dos retratos.
+    """
+
+    def __init__(self, runner, snapshot_dir=SNAPSHOT_DIR):
+        self.runner = runner
+        self.snapshot_dir = snapshot_dir
+        self._current = {}
+        # Resumo por coletor: {'added': n, 'removed': n, 'modified': n, 'file': caminho}
+        self.report = {}
+
+    def snapshot_path(self, collector):
+        return os.path.join(self.snapshot_dir, f'snapshot-{collector.name}.json')
+
+    def changes_path(self, collector):
+        return os.path.splitext(collector.filename)[0] + '_changes.csv'
+
+    def open(self, collector):
+        self._current[collector] = {}
+
+    def write(self, collector, rows):
+        current = self._current[collector]
+        for row in rows:
+            values = list(row)
+            current[row.self_link] = [fingerprint(values), getattr(row, 'created', ''), values]
+
+    def load_snapshot(self, collector):
+        try:
+            with open(self.snapshot_path(collector), encoding='utf-8') as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            return None
+        # Retrato de uma versão com outras colunas: as linhas não são comparáveis
+        if snapshot.get('fields') != list(collector.record._fields):
+            collector.logger.info("Retrato anterior com outras colunas; as mudanças não serão calculadas.")
+            return None
+        return snapshot['resources']
+
+    def diff(self, collector, previous):
+        """
+        Returns:
+            tuple: As mudanças [(tipo, valores, campos alterados)] e os
+                   recursos anteriores que continuam no novo retrato.
+        """
+        current = self._current[collector]
+        record = collector.record
+        changes = []
+        for self_link, (digest, created, values) in current.items():
+            old = previous.get(self_link)
+            if old is None:
+                changes.append(('added', values, ''))
+            elif old[1] != created:
+                changes.append(('removed', old[2], ''))
+                changes.append(('added', values, ''))
+            elif old[0] != digest:
+                changed = [column.header for column, old_value, value in zip(record.columns, old[2], values)
+                           if column.report and old_value != value]
+                changes.append(('modified', values, ','.join(changed)))
+
+        scanned = self.runner.stats[collector].project_ids
+        complete = not collector.failed_calls
+        if not complete:
+            collector.logger.warning("Coletor com chamadas com falha: recursos não encontrados não serão "
+                                     "dados como removidos.")
+        kept = {}
+        for self_link, entry in previous.items():
+            if self_link in current:
+                continue
+            if complete and resource_project(self_link) in scanned:
+                changes.append(('removed', entry[2], ''))
+            else:
+                kept[self_link] = entry
+        return changes, kept
+
+    def close(self):
+        # Varredura interrompida: o retrato anterior continua valendo
+        if not self.runner.completed:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        for collector, current in self._current.items():
+            previous = self.load_snapshot(collector)
+            if previous is None:
+                changes, kept = None, {}
+            else:
+                changes, kept = self.diff(collector, previous)
+                self.write_changes(collector, changes)
+            write_atomic(self.snapshot_path(collector), json.dumps({
+                'created': time.time(),
+                'fields': list(collector.record._fields),
+                'resources': {**kept, **current},
+            }))
+            self.report[collector.name] = {kind: sum(1 for change in changes or () if change[0] == kind)
+                                           for kind in CHANGE_KINDS}
+            self.report[collector.name]['file'] = self.changes_path(collector) if changes is not None else None
+
+    def write_changes(self, collector, changes):
+        record = collector.record
+        with open(self.changes_path(collector), 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile, delimiter=';')
+            writer.writerow(('MUDANCA', *record.headers, 'CAMPOS'))
+            for kind, values, changed in changes:
+                writer.writerow((kind, *record(*values).report_values(), changed))
@@ -0,0 +1,77 @@
+# Script com os checkpoints das varreduras longas
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/checkpoint.py
+#
+# Durante a varredura o executor grava periodicamente em cache/ um checkpoint
+# com o ponto da listagem de projetos (projetos já listados e o token da
+# próxima página de projects.list) e, para cada coletor, os grupos de
+# projetos já gravados, as linhas gravadas e o estado de cada destino (ex.: a
+# posição no CSV). Com --resume a varredura continua desse ponto: as linhas
+# gravadas depois do checkpoint são descartadas e os grupos seguintes são
+# coletados de novo, o que dá a mesma saída de uma varredura sem interrupção.
+#
+# O checkpoint é apagado quando a varredura termina. Apenas os grupos dos
+# coletores ordenados são aproveitados; os demais (ex.: VMs com --mode zones)
+# recomeçam do início.
+
+import json
+import os
+import time
+from src.org.common.metrics import write_atomic
+
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+CHECKPOINT_DIR = os.path.join(BASE_DIR, 'cache')
+
+# Intervalo mínimo entre dois checkpoints, em segundos
+CHECKPOINT_INTERVAL = 30.0
+
+def add_arguments(parser):
+    """
+    Adiciona as opções de checkpoint ao parser.
+    """
+    group = parser.add_argument_group('checkpoint e retomada')
+    group.add_argument('--resume', action='store_true',
+                       help='Continua a última varredura interrompida a partir do checkpoint '
+                            '(cache/checkpoint-<script>.json); use as mesmas opções da varredura original.')
+
+class Checkpoint:
+    """
+    Checkpoint de uma varredura em disco.
+
+    Args:
+        name (str): Nome da varredura (ex.: 'vm', 'inventory').
+        options (dict): Opções que definem os grupos de projetos e os
+            destinos; um checkpoint só é retomado com as mesmas opções.
+        directory (str): Diretório dos checkpoints.
+    """
+
+    def __init__(self, name, options, directory=CHECKPOINT_DIR):
+        self.path = os.path.join(directory, f'checkpoint-{name}.json')
+        self.options = options
+
+    def load(self):
+        """
+        Returns:
+            dict: O checkpoint salvo, ou None se não existe ou foi gravado
+                  com outras opções.
+        """
+        try:
+            with open(self.path, encoding='utf-8') as checkpoint_file:
+                state = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return None
+        if state.get('options') != self.options:
+            return None
+        return state
+
+    def save(self, state):
+        # Gravado em um arquivo temporário para nunca deixar um checkpoint pela metade
+        write_atomic(self.path, json.dumps({'options': self.options, 'saved': time.time(), **state}))
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
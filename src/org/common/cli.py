@@ -0,0 +1,66 @@
+# Script com as opções de linha de comando comuns aos coletores
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/cli.py
+
+import argparse
+from src.org.common.rate_limit import DEFAULT_RATES
+from src.org.common.scheduler import DEFAULT_MAX_WORKERS
+from src.org.common.batch import batch_size_type, DEFAULT_BATCH_SIZE
+from src.org.common.logger_config import LOG_LEVELS, DEFAULT_LOG_LEVEL
+from src.org.common import (assets, changes, checkpoint, console, credentials, metrics, projects,
+                            service_usage, sinks, transport)
+
+def rate_type(value):
+    """
+    Valida uma taxa no formato 'servico=chamadas_por_segundo' (argparse).
+    """
+    api, _, rate = value.partition('=')
+    try:
+        rate = float(rate)
+    except ValueError:
+        rate = 0
+    if not api or rate <= 0:
+        raise argparse.ArgumentTypeError("use o formato servico=chamadas_por_segundo (ex.: compute=50)")
+    return api, rate
+
+def build_parser(description, collectors=()):
+    """
+    Cria o parser com as opções comuns da varredura, as opções de
+    autenticação, de conexões, de seleção de projetos, do motor de coleta,
+    de APIs habilitadas, de destinos das linhas, de detecção de mudanças, de retomada, de saída
+    de console e dos relatórios de métricas e as opções próprias de cada
+    coletor (Collector.add_arguments).
+
+    Args:
+        description (str): Descrição exibida no --help.
+        collectors (list): Coletores que participam da varredura.
+
+    Returns:
+        argparse.ArgumentParser: O parser configurado.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f'Limite global de chamadas concorrentes (padrão: {DEFAULT_MAX_WORKERS}).')
+    parser.add_argument('--batch-size', type=batch_size_type, default=DEFAULT_BATCH_SIZE,
+                        help='Agrupa as chamadas de até N projetos em um único batch HTTP (padrão: 1, sem lote).')
+    parser.add_argument('--rate', type=rate_type, action='append', default=[], metavar='SERVICO=QPS',
+                        help=f"Chamadas por segundo de um serviço, conforme a cota do projeto (padrão: "
+                             f"{', '.join(f'{api}={rate:g}' for api, rate in DEFAULT_RATES.items())}).")
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default=DEFAULT_LOG_LEVEL,
+                        help=f'Nível do log (padrão: {DEFAULT_LOG_LEVEL}, que registra cada linha de saída; '
+                             'INFO desliga o registro das linhas).')
+    credentials.add_arguments(parser)
+    transport.add_arguments(parser)
+    projects.add_arguments(parser)
+    assets.add_arguments(parser)
+    service_usage.add_arguments(parser)
+    sinks.add_arguments(parser)
+    changes.add_arguments(parser)
+    checkpoint.add_arguments(parser)
+    console.add_arguments(parser)
+    metrics.add_arguments(parser)
+    for collector in collectors:
+        collector.add_arguments(parser)
+    return parser
@@ -0,0 +1,153 @@
+# Script com a fábrica de clientes das APIs do Google Cloud
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/clients.py
+#
+# Uso para salvar uma cópia estática de um documento de discovery:
+# python3 -m src.org.common.clients compute v1
+
+import json
+import os
+import sys
+import threading
+import httplib2
+from googleapiclient import discovery
+from googleapiclient.discovery_cache import get_static_doc
+from src.org.common.transport import get_http
+
+BASE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..')
+
+# Diretório opcional com cópias estáticas dos documentos de discovery
+# no formato '<api>.<versao>.json'. Quando existe, nenhuma busca na rede
+# é feita para montar o cliente.
+DISCOVERY_DIR = os.path.join(BASE_DIR, 'discovery')
+
+DISCOVERY_URIS = (discovery.DISCOVERY_URI, discovery.V2_DISCOVERY_URI)
+
+# Variável de ambiente que troca o endpoint de todas as APIs (inclusive o de
+# batch), usada para rodar os scripts contra o servidor local de
+# src/org/bench/fake_gcp.py, sem autenticação. Só vale junto com GCP_FAKE=1,
+# para que uma variável esquecida no ambiente não desvie uma varredura real.
+# Ex.: GCP_FAKE=1 GCP_API_ENDPOINT=http://127.0.0.1:8765/
+API_ENDPOINT_ENV = 'GCP_API_ENDPOINT'
+FAKE_ENV = 'GCP_FAKE'
+
+# Documentos de discovery já lidos e convertidos, compartilhados entre threads
+_documents = {}
+_documents_lock = threading.Lock()
+
+# Clientes construídos por thread; as conexões vêm do pool compartilhado
+# por todas as threads (ver transport.py)
+_local = threading.local()
+
+def fake_endpoint():
+    """
+    Returns:
+        str: O endpoint do servidor simulado, ou None se GCP_API_ENDPOINT não
+             está definida ou GCP_FAKE=1 não foi informada.
+    """
+    endpoint = os.environ.get(API_ENDPOINT_ENV)
+    if endpoint and os.environ.get(FAKE_ENV) == '1':
+        return endpoint
+    return None
+
+def _discovery_file_path(api, version):
+    return os.path.join(DISCOVERY_DIR, f'{api}.{version}.json')
+
+def _fetch_discovery_document(api, version):
+    http = httplib2.Http()
+    for uri in DISCOVERY_URIS:
+        url = uri.replace('{api}', api).replace('{apiVersion}', version)
+        resp, content = http.request(url)
+        if resp.status == 200:
+            return content.decode('utf-8')
+    raise RuntimeError(f"Documento de discovery não encontrado para '{api}' '{version}'.")
+
+def _load_discovery_document(api, version):
+    # 1. Cópia estática local em discovery/
+    file_path = _discovery_file_path(api, version)
+    if os.path.exists(file_path):
+        with open(file_path, encoding='utf-8') as doc_file:
+            return doc_file.read()
+
+    # 2. Documentos empacotados com a google-api-python-client
+    document = get_static_doc(api, version)
+    if document is not None:
+        return document
+
+    # 3. Busca no serviço de discovery
+    return _fetch_discovery_document(api, version)
+
+def get_discovery_document(api, version):
+    """
+    Retorna o documento de discovery já convertido, lendo e fazendo o parse
+    apenas uma vez por processo.
+
+    Args:
+        api (str): Nome da API (ex.: 'compute').
+        version (str): Versão da API (ex.: 'v1').
+
+    Returns:
+        dict: O documento de discovery.
+    """
+    key = (api, version)
+    with _documents_lock:
+        document = _documents.get(key)
+        if document is None:
+            document = json.loads(_load_discovery_document(api, version))
+            _documents[key] = document
+    return document
+
+def save_discovery_document(api, version):
+    """
+    Salva uma cópia estática do documento de discovery em DISCOVERY_DIR.
+
+    Returns:
+        str: O caminho do arquivo salvo.
+    """
+    document = get_discovery_document(api, version)
+    os.makedirs(DISCOVERY_DIR, exist_ok=True)
+    file_path = _discovery_file_path(api, version)
+    with open(file_path, 'w', encoding='utf-8') as doc_file:
+        json.dump(document, doc_file)
+    return file_path
+
+def get_service(api, version, credentials):
+    """
+    Retorna o cliente da API para a thread atual, construindo-o apenas na
+    primeira chamada da thread para essa API, versão e credencial. As
+    requisições de todos os clientes da credencial usam o mesmo pool de
+    conexões keep-alive (ver transport.get_http).
+
+    Args:
+        api (str): Nome da API (ex.: 'compute').
+        version (str): Versão da API (ex.: 'v1').
+        credentials: As credenciais usadas nas requisições.
+
+    Returns:
+        googleapiclient.discovery.Resource: O cliente da API.
+    """
+    services = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = {}
+
+    key = (api, version, id(credentials))
+    cached = services.get(key)
+    if cached is not None and cached[0] is credentials:
+        return cached[1]
+
+    document = get_discovery_document(api, version)
+    endpoint = fake_endpoint()
+    if endpoint:
+        # O endpoint de batch vem do rootUrl do documento, e não de client_options
+        document = dict(document, rootUrl=endpoint)
+    service = discovery.build_from_document(document, http=get_http(credentials))
+    services[key] = (credentials, service)
+    return service
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Uso: python3 -m src.org.common.clients <api> <versao>")
+        sys.exit(1)
+    print(save_discovery_document(sys.argv[1], sys.argv[2]))
@@ -0,0 +1,164 @@
+# Script com a saída de console da varredura
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/console.py
+#
+# Modos de saída:
+# - progress (padrão): uma linha de progresso com projetos concluídos/total,
+#   linhas, chamadas por segundo e tempo restante, atualizada algumas vezes
+#   por segundo (ou a cada PLAIN_INTERVAL segundos quando a saída não é um
+#   terminal, ex.: log de CI)
+# - rows: a tabela com uma linha impressa por recurso (--rows)
+# - quiet: apenas erros e avisos de falha (--quiet)
+
+import sys
+import threading
+
+CONSOLE_MODES = ('progress', 'rows', 'quiet')
+DEFAULT_CONSOLE_MODE = 'progress'
+
+# Intervalo de atualização da linha de progresso em um terminal, em segundos
+REFRESH_INTERVAL = 0.25
+# Intervalo entre as linhas de progresso quando a saída não é um terminal
+PLAIN_INTERVAL = 10.0
+
+# Limpa a linha atual do terminal
+CLEAR_LINE = '\r\033[K'
+
+def add_arguments(parser):
+    """
+    Adiciona as opções de saída de console ao parser.
+    """
+    group = parser.add_argument_group('saída de console').add_mutually_exclusive_group()
+    group.add_argument('--rows', dest='console', action='store_const', const='rows',
+                       help='Imprime a tabela com cada recurso encontrado em vez da linha de progresso.')
+    group.add_argument('--quiet', dest='console', action='store_const', const='quiet',
+                       help='Não imprime progresso, linhas nem resumo; apenas erros e avisos de falha.')
+    parser.set_defaults(console=DEFAULT_CONSOLE_MODE)
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+class Console:
+    """
+    Saída de console compartilhada pela varredura.
+
+    Args:
+        mode (str): Um de CONSOLE_MODES.
+        stream: Onde imprimir (padrão: sys.stdout).
+    """
+
+    def __init__(self, mode=DEFAULT_CONSOLE_MODE, stream=None):
+        self.mode = mode
+        self.stream = stream or sys.stdout
+        self.interactive = self.stream.isatty()
+        self._lock = threading.Lock()
+        self._progress = None
+        self._stop = threading.Event()
+        self._thread = None
+        # Se há uma linha de progresso sem quebra de linha no terminal
+        self._pending_line = False
+
+    @property
+    def quiet(self):
+        return self.mode == 'quiet'
+
+    def message(self, text, always=False):
+        """
+        Imprime uma mensagem sem misturá-la com a linha de progresso. Em modo
+        quiet só imprime com always=True.
+        """
+        if self.quiet and not always:
+            return
+        with self._lock:
+            self._clear_line()
+            print(text, file=self.stream, flush=True)
+
+    def header(self, collector):
+        if self.mode == 'rows':
+            with self._lock:
+                collector.print_header()
+
+    def row(self, collector, count, row):
+        if self.mode == 'rows':
+            collector.print_row(count, row)
+
+    def start_progress(self, progress):
+        """
+        Inicia a linha de progresso (apenas no modo progress).
+
+        Args:
+            progress (callable): Retorna um dict com 'done', 'total',
+                'listing' (se os projetos ainda estão sendo listados), 'rows',
+                'calls' e 'elapsed'.
+        """
+        if self.mode != 'progress':
+            return
+        self._progress = progress
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh, name='console-progress', daemon=True)
+        self._thread.start()
+
+    def stop_progress(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        # Deixa a última linha de progresso na tela
+        self._render(final=True)
+
+    def _refresh(self):
+        interval = REFRESH_INTERVAL if self.interactive else PLAIN_INTERVAL
+        while not self._stop.wait(interval):
+            self._render()
+
+    def _render(self, final=False):
+        line = self.progress_line(self._progress())
+        with self._lock:
+            if self.interactive:
+                self.stream.write(CLEAR_LINE + line + ('\n' if final else ''))
+                self._pending_line = not final
+            else:
+                self.stream.write(line + '\n')
+            self.stream.flush()
+
+    def _clear_line(self):
+        if self._pending_line:
+            self.stream.write(CLEAR_LINE)
+            self._pending_line = False
+
+    @staticmethod
+    def progress_line(state):
+        done, total, elapsed = state['done'], state['total'], state['elapsed']
+        if state['listing']:
+            projects = f"projetos {done}/{total}+"
+            eta = 'listando'
+        else:
+            percent = done * 100 // total if total else 100
+            projects = f"projetos {done}/{total} ({percent}%)"
+            eta = format_duration(elapsed * (total - done) / done) if done else '--:--:--'
+        calls_per_second = state['calls'] / elapsed if elapsed > 0 else 0.0
+        return (f"{projects} | linhas {state['rows']} | {calls_per_second:.1f} chamadas/s | "
+                f"decorrido {format_duration(elapsed)} | ETA {eta}")
+
+# Instância única usada pelo executor da varredura
+console = Console()
+
+def configure(mode=DEFAULT_CONSOLE_MODE):
+    """
+    Recria a saída de console do processo no modo informado. Deve ser
+    chamada antes de iniciar a varredura.
+    """
+    global console
+    console = Console(mode)
+    return console
+
+def message(text, always=False):
+    """
+    Imprime uma mensagem pela saída de console do processo (ver Console.message).
+    """
+    console.message(text, always)
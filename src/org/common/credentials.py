@@ -4,17 +4,50 @@
 # data: 15/04/2024 
 # 
 # src/org/common/credentials.py
+#
+# Fontes das credenciais (--auth):
+# - auto (padrão): arquivo de --credentials-file; token de usuário salvo em
+#   credentials/token.json; Application Default Credentials (variável
+#   GOOGLE_APPLICATION_CREDENTIALS, gcloud auth application-default login ou
+#   a conta de serviço da VM), também quando o token salvo não pode ser
+#   renovado; por fim o fluxo OAuth no navegador, apenas quando há um
+#   terminal interativo
+# - user: token de usuário salvo ou fluxo OAuth no navegador
+# - adc: apenas Application Default Credentials (ou --credentials-file)
+#
+# O processo inteiro usa uma única credencial (SharedCredentials), renovada
+# por uma thread própria alguns minutos antes de expirar. As requisições dos
+# workers não esperam pela renovação e nunca renovam o token ao mesmo tempo.
+import datetime
 import os
 import pickle
+import sys
+import threading
+import google.auth
+from google.auth import credentials as auth_credentials
+from google.auth.exceptions import DefaultCredentialsError
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials as UserCredentials # Renomeado para evitar conflito
+from google.auth.credentials import AnonymousCredentials
+from src.org.common.clients import API_ENDPOINT_ENV, FAKE_ENV, fake_endpoint
+from src.org.common import console
 
 BASE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..')
 CREDENTIALS_DIR = os.path.join(BASE_DIR, 'credentials')
 
 CLIENT_SECRETS_FILE_PATH = os.path.join(CREDENTIALS_DIR, 'client_secrets.json')
-TOKEN_FILE_PATH = os.path.join(CREDENTIALS_DIR, 'token.pickle')
+# Token do usuário em JSON (authorized_user); o token.pickle de versões
+# anteriores é convertido na primeira execução e removido
+TOKEN_FILE_PATH = os.path.join(CREDENTIALS_DIR, 'token.json')
+LEGACY_TOKEN_FILE_PATH = os.path.join(CREDENTIALS_DIR, 'token.pickle')
+
+AUTH_SOURCES = ('auto', 'user', 'adc')
+
+# Antecedência da renovação em segundo plano em relação à expiração do token
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+# Espera antes de tentar de novo uma renovação que falhou, em segundos
+REFRESH_RETRY_INTERVAL = 30.0
 
 # Escopos comuns para as APIs do Google Cloud
 # Você pode ajustar isso para ter escopos mais específicos se necessário
@@ -30,6 +63,212 @@ ICON_ERROR = "❌"   # Cross mark
 ICON_LOADING = "⏳"  # Hourglass
 ICON_KEY = "🔑"    # Key
 
+def add_arguments(parser):
+    """
+    Adiciona as opções de autenticação ao parser.
+    """
+    group = parser.add_argument_group('autenticação')
+    group.add_argument('--auth', choices=AUTH_SOURCES, default='auto',
+                       help='Fonte das credenciais (padrão: auto; adc nunca abre o navegador).')
+    group.add_argument('--credentials-file', metavar='ARQUIVO',
+                       help='JSON de uma conta de serviço (ou de credenciais de usuário) usado no lugar das demais fontes.')
+
+class SharedCredentials(auth_credentials.Credentials):
+    """
+    Credencial única do processo, compartilhada por todas as threads.
+
+    Uma thread própria renova o token REFRESH_MARGIN antes da expiração, de
+    modo que as requisições encontram sempre um token válido. Quando uma
+    renovação é necessária na hora (falha da renovação em segundo plano ou
+    resposta 401), apenas uma thread renova; as demais esperam e usam o novo
+    token.
+
+    Args:
+        inner (google.auth.credentials.Credentials): A credencial de origem
+            (usuário, conta de serviço ou ADC).
+    """
+
+    def __init__(self, inner):
+        super().__init__()
+        self.inner = inner
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._sync()
+
+    def _sync(self):
+        self.token = self.inner.token
+        self.expiry = self.inner.expiry
+        self._quota_project_id = getattr(self.inner, 'quota_project_id', None)
+
+    def refresh(self, request):
+        observed = self.token
+        with self._lock:
+            # Outra thread já renovou enquanto esta esperava
+            if self.token != observed and self.valid:
+                return
+            self.inner.refresh(request)
+            self._sync()
+
+    def start_refresh(self):
+        """
+        Obtém o primeiro token, se necessário, e inicia a renovação em segundo plano.
+        """
+        if not self.valid:
+            self.refresh(Request())
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, name='credentials-refresh', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop_refresh(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        while True:
+            if self.expiry is None:
+                # Token sem expiração conhecida: nada a renovar
+                return
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            wait = (self.expiry - REFRESH_MARGIN - now).total_seconds()
+            if self._stop.wait(max(wait, 0)):
+                return
+            try:
+                self.refresh(Request())
+            except Exception as e:
+                console.message(f"{ICON_WARNING} Falha ao renovar o token de acesso: {e}. "
+                                f"Nova tentativa em {REFRESH_RETRY_INTERVAL:.0f}s.", always=True)
+                if self._stop.wait(REFRESH_RETRY_INTERVAL):
+                    return
+
+# Credencial única do processo (ver get_credentials)
+_shared = None
+_shared_lock = threading.Lock()
+
+def get_credentials(source='auto', credentials_file=None, scopes=None):
+    """
+    Retorna a credencial única do processo, criando-a na primeira chamada.
+
+    Args:
+        source (str): Uma de AUTH_SOURCES.
+        credentials_file (str, optional): JSON de conta de serviço ou de
+            credenciais de usuário; tem prioridade sobre as demais fontes.
+        scopes (list, optional): Escopos OAuth 2.0 (padrão: DEFAULT_SCOPES).
+
+    Returns:
+        google.auth.credentials.Credentials: A credencial compartilhada, ou
+            None se nenhuma fonte está disponível.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is not None:
+            return _shared
+
+        # Contra o servidor local de testes (src/org/bench) não há autenticação
+        endpoint = fake_endpoint()
+        if endpoint:
+            print(f"{ICON_WARNING} {FAKE_ENV}=1: todas as APIs apontam para {endpoint} ({API_ENDPOINT_ENV}), "
+                  f"com credenciais anônimas. Use apenas com o servidor simulado.")
+            _shared = AnonymousCredentials()
+            return _shared
+        if os.environ.get(API_ENDPOINT_ENV):
+            print(f"{ICON_WARNING} {API_ENDPOINT_ENV} ignorada: o endpoint só é trocado junto com {FAKE_ENV}=1.")
+
+        inner = load_credentials(source, credentials_file, scopes or DEFAULT_SCOPES)
+        if inner is None:
+            return None
+        try:
+            _shared = SharedCredentials(inner).start_refresh()
+        except Exception as e:
+            print(f"{ICON_ERROR} Erro ao obter o token de acesso: {e}")
+            return None
+        return _shared
+
+def load_credentials(source, credentials_file, scopes):
+    """
+    Carrega a credencial de origem conforme --auth e --credentials-file.
+    """
+    if credentials_file:
+        print(f"{ICON_KEY} Usando as credenciais de '{credentials_file}'.")
+        try:
+            credentials, _ = google.auth.load_credentials_from_file(credentials_file, scopes=scopes)
+        except (OSError, DefaultCredentialsError) as e:
+            print(f"{ICON_ERROR} Erro ao carregar '{credentials_file}': {e}")
+            return None
+        return credentials
+
+    if source == 'user':
+        return get_user_credentials(scopes)
+
+    saved_failed = False
+    if source == 'auto':
+        credentials = load_saved_user_credentials(scopes)
+        if credentials is not None:
+            if credentials.valid:
+                return credentials
+            # Token salvo expirado: renova aqui para, se falhar, seguir para as ADC
+            try:
+                credentials.refresh(Request())
+                return credentials
+            except Exception as e:
+                print(f"{ICON_WARNING} Não foi possível renovar o token salvo em '{TOKEN_FILE_PATH}': {e}. "
+                      f"Tentando as Application Default Credentials.")
+                saved_failed = True
+
+    try:
+        credentials, _ = google.auth.default(scopes=scopes)
+        print(f"{ICON_KEY} Usando Application Default Credentials.")
+        return credentials
+    except DefaultCredentialsError as e:
+        if source == 'adc':
+            print(f"{ICON_ERROR} Application Default Credentials não encontradas: {e}")
+            return None
+        adc_error = e
+
+    # O fluxo no navegador só é possível com alguém no terminal (não em execuções agendadas)
+    if not sys.stdin.isatty():
+        if saved_failed:
+            print(f"{ICON_ERROR} O token salvo em '{TOKEN_FILE_PATH}' não pôde ser renovado e as Application "
+                  f"Default Credentials não foram encontradas ({adc_error}). Sem terminal interativo para o "
+                  f"fluxo OAuth: autentique de novo com --auth user, use --credentials-file ou configure as ADC.")
+        else:
+            print(f"{ICON_ERROR} Nenhuma credencial encontrada e não há terminal interativo para o fluxo OAuth. "
+                  f"Use --credentials-file ou configure as Application Default Credentials.")
+        return None
+    return get_user_credentials(scopes)
+
+def load_saved_user_credentials(scopes):
+    """
+    Carrega o token de usuário salvo (credentials/token.json), convertendo o
+    token.pickle de versões anteriores. Retorna None se não há token salvo.
+    """
+    if not os.path.exists(TOKEN_FILE_PATH) and os.path.exists(LEGACY_TOKEN_FILE_PATH):
+        print(f"{ICON_INFO} Convertendo '{LEGACY_TOKEN_FILE_PATH}' para '{TOKEN_FILE_PATH}'...")
+        try:
+            with open(LEGACY_TOKEN_FILE_PATH, 'rb') as token:
+                save_user_credentials(pickle.load(token))
+            os.remove(LEGACY_TOKEN_FILE_PATH)
+        except Exception as e:
+            print(f"{ICON_WARNING} Aviso: Não foi possível converter o token salvo: {e}")
+
+    if not os.path.exists(TOKEN_FILE_PATH):
+        return None
+    print(f"{ICON_LOADING} Tentando carregar credenciais de '{TOKEN_FILE_PATH}'...")
+    try:
+        credentials = UserCredentials.from_authorized_user_file(TOKEN_FILE_PATH, scopes)
+    except Exception as e:
+        print(f"{ICON_ERROR} Erro ao carregar credenciais salvas: {e}. Será necessário autenticar novamente.")
+        return None
+    print(f"{ICON_SUCCESS} Credenciais carregadas com sucesso.")
+    return credentials
+
+def save_user_credentials(credentials):
+    os.makedirs(CREDENTIALS_DIR, exist_ok=True)
+    # Apenas o dono lê o arquivo, que contém o refresh token
+    descriptor = os.open(TOKEN_FILE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w', encoding='utf-8') as token:
+        token.write(credentials.to_json())
+
 def get_user_credentials(scopes=None):
     """
     Obtém as credenciais do usuário para acesso às APIs do Google Cloud.
@@ -46,18 +285,8 @@ def get_user_credentials(scopes=None):
     if scopes is None:
         scopes = DEFAULT_SCOPES
 
-    credentials = None
-
     # 1. Tentar carregar credenciais de um arquivo salvo
-    if os.path.exists(TOKEN_FILE_PATH):
-        print(f"{ICON_LOADING} Tentando carregar credenciais de '{TOKEN_FILE_PATH}'...")
-        try:
-            with open(TOKEN_FILE_PATH, 'rb') as token:
-                credentials = pickle.load(token)
-            print(f"{ICON_SUCCESS} Credenciais carregadas com sucesso.")
-        except Exception as e:
-            print(f"{ICON_ERROR} Erro ao carregar credenciais salvas: {e}. Será necessário autenticar novamente.")
-            credentials = None
+    credentials = load_saved_user_credentials(scopes)
 
     # 2. Se não há credenciais válidas ou se expiraram e podem ser renovadas
     if not credentials or not credentials.valid:
@@ -110,8 +339,7 @@ def get_user_credentials(scopes=None):
             # Salva as credenciais para futuras execuções
             print(f"\n{ICON_SUCCESS} Autenticação concluída. Salvando credenciais em '{TOKEN_FILE_PATH}' para uso futuro.")
             try:
-                with open(TOKEN_FILE_PATH, 'wb') as token:
-                    pickle.dump(credentials, token)
+                save_user_credentials(credentials)
             except Exception as e:
                 print(f"{ICON_WARNING} Aviso: Não foi possível salvar as credenciais em '{TOKEN_FILE_PATH}': {e}")
                 print(f"{ICON_INFO} Você pode precisar autenticar novamente na próxima execução.")
@@ -120,7 +348,7 @@ def get_user_credentials(scopes=None):
 
 if __name__ == '__main__':
     print(f"{ICON_INFO} Testando o módulo de autenticação...")
-    creds = get_user_credentials()
+    creds = get_credentials()
     if creds:
         print(f"\n{ICON_SUCCESS} Credenciais obtidas com sucesso!")
         # Agora você pode usar 'creds' para construir um serviço da API
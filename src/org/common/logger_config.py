@@ -1,23 +1,91 @@
 # Script para configuração do loggin
 #
 # autor: Marcos Cardoso
-# 
+#
 # src/org/common/logger_config.py
+#
+# As mensagens entram em uma fila (QueueHandler) e são gravadas por uma thread
+# própria (QueueListener), para que a gravação do arquivo não aconteça na
+# thread que consome os resultados nem nos workers.
 
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import sys
+import time
+
+# Nível das linhas de saída registradas no log (uma por linha do CSV). Fica
+# entre DEBUG e INFO para poder ser desligado com --log-level INFO.
+ROW = 15
+logging.addLevelName(ROW, 'ROW')
+LOG_LEVELS = ('DEBUG', 'ROW', 'INFO', 'WARNING', 'ERROR')
+DEFAULT_LOG_LEVEL = 'ROW'
+
+# Tamanho máximo de cada arquivo de log em bytes antes da rotação (0 = sem rotação)
+LOG_MAX_BYTES_ENV = 'INVENTORY_LOG_MAX_BYTES'
+LOG_BACKUP_COUNT = 5
+
+# Intervalo máximo em segundos entre duas gravações do buffer no disco
+FLUSH_INTERVAL = 1.0
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler que não grava o buffer no disco a cada mensagem:
+    apenas a cada FLUSH_INTERVAL segundos, em avisos e erros e ao fechar.
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self._flushed = time.monotonic()
+        self._force_flush = False
+
+    def emit(self, record):
+        self._force_flush = record.levelno >= logging.WARNING
+        super().emit(record)
 
-def setup_logging(dir_path, file_name_log):
+    def flush(self):
+        now = time.monotonic()
+        if self._force_flush or now - self._flushed >= FLUSH_INTERVAL:
+            super().flush()
+            self._flushed = now
+
+    def close(self):
+        self._force_flush = True
+        super().close()
+
+def setup_logging(dir_path, file_name_log, max_bytes=None, backup_count=LOG_BACKUP_COUNT):
+    """
+    Configura o logger de um arquivo de log. Chamar de novo com o mesmo
+    arquivo retorna o mesmo logger, sem duplicar os handlers.
+
+    Args:
+        dir_path (str): Diretório base; o log fica em <dir_path>/log.
+        file_name_log (str): Nome do arquivo de log (ex.: 'vm.log').
+        max_bytes (int, optional): Tamanho para rotação do arquivo; se None,
+            é lido de INVENTORY_LOG_MAX_BYTES (padrão: sem rotação).
+        backup_count (int): Arquivos rotacionados mantidos.
+
+    Returns:
+        logging.Logger: O logger configurado.
+    """
     log_dir = os.path.join(dir_path, 'log')
     log_filename = os.path.join(log_dir, file_name_log)
     os.makedirs(log_dir, exist_ok=True)
 
-    logger = logging.getLogger(__name__)
+    # Um logger por arquivo de log ('vm.log' -> 'vm'), para que os coletores
+    # importados no mesmo processo (inventory.py) não dividam os handlers
+    logger = logging.getLogger(os.path.splitext(file_name_log)[0])
+    if any(isinstance(handler, logging.handlers.QueueHandler) for handler in logger.handlers):
+        return logger
     logger.setLevel(logging.DEBUG)
 
+    if max_bytes is None:
+        max_bytes = int(os.environ.get(LOG_MAX_BYTES_ENV, '0'))
+
     # Cria um handler para o arquivo de log
-    file_handler = logging.FileHandler(log_filename)
+    file_handler = BufferedRotatingFileHandler(log_filename, max_bytes, backup_count)
     file_handler.setLevel(logging.DEBUG)
 
     # Cria um handler para o console
@@ -29,9 +97,22 @@ def setup_logging(dir_path, file_name_log):
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
-    # Adiciona os handlers ao logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # O logger só coloca as mensagens na fila; a thread do listener formata e grava
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler,
+                                              respect_handler_level=True)
+    listener.start()
+    # Esvazia a fila antes do encerramento do logging (atexit executa na ordem inversa)
+    atexit.register(listener.stop)
+
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
     return logger
-    
\ No newline at end of file
+
+def set_log_level(loggers, level):
+    """
+    Aplica o nível de --log-level aos loggers da varredura. Com INFO ou
+    acima as linhas de saída (ROW) não são registradas.
+    """
+    for logger in loggers:
+        logger.setLevel(level)
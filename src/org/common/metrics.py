@@ -0,0 +1,358 @@
+# Script com a instrumentação das chamadas às APIs do Google Cloud
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/metrics.py
+#
+# Cada chamada executada pelo controle de taxa (rate_limit.execute) e cada item
+# de um lote (batch.execute_batch) é registrado com método, projeto, zona,
+# status, latência, bytes recebidos e novas tentativas. Ao final da varredura o
+# executor grava um relatório JSON e um arquivo para o textfile collector do
+# Prometheus (node_exporter), com p50/p95/p99 por método, os projetos e zonas
+# mais lentos, os erros por status, os prazos estourados e as cópias (hedge).
+
+import json
+import os
+import re
+import threading
+import time
+from googleapiclient import errors
+
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+METRICS_DIR = os.path.join(BASE_DIR, 'log')
+
+# Quantidade de projetos e zonas mais lentos no relatório
+TOP_SLOWEST = 10
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+PROJECT_PATTERN = re.compile(r'/projects/([^/?]+)')
+ZONE_PATTERN = re.compile(r'/zones/([^/?]+)')
+
+def add_arguments(parser):
+    """
+    Adiciona as opções dos relatórios de métricas ao parser.
+    """
+    group = parser.add_argument_group('métricas das chamadas')
+    group.add_argument('--metrics-json', metavar='ARQUIVO',
+                       help='Relatório JSON das chamadas da varredura (padrão: log/<script>_metrics.json).')
+    group.add_argument('--metrics-prom', metavar='ARQUIVO',
+                       help='Arquivo para o textfile collector do Prometheus (padrão: log/<script>.prom).')
+
+# Coletor da tarefa em execução em cada thread (ver set_collector)
+_context = threading.local()
+
+def set_collector(name):
+    """
+    Associa as próximas chamadas da thread atual a um coletor (ex.: 'vm').
+    """
+    _context.collector = name
+
+def current_collector():
+    return getattr(_context, 'collector', None)
+
+def instrument(request):
+    """
+    Prepara a requisição para informar o status e o tamanho da resposta,
+    inclusive quando ela é um item de um lote. As páginas seguintes
+    (list_next) copiam a requisição e são preparadas de novo a cada execução.
+    """
+    postproc = getattr(request, 'original_postproc', request.postproc)
+    request.original_postproc = postproc
+
+    def measured(resp, content):
+        request.response_status = resp.status
+        request.response_bytes = len(content or b'')
+        return postproc(resp, content)
+
+    request.postproc = measured
+    request.response_status = None
+    request.response_bytes = 0
+    return request
+
+def error_status(exception):
+    if isinstance(exception, errors.HttpError):
+        return exception.resp.status
+    return type(exception).__name__
+
+def percentile(values, quantile):
+    # 'values' já ordenados; método do posto mais próximo
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(quantile * len(values) + 0.5)) - 1))
+    return values[index]
+
+class MethodStats:
+    __slots__ = ('calls', 'latencies', 'bytes', 'retries', 'statuses')
+
+    def __init__(self):
+        self.calls = 0
+        self.latencies = []
+        self.bytes = 0
+        self.retries = 0
+        self.statuses = {}
+
+class CallMetrics:
+    """
+    Registro das chamadas da varredura, compartilhado por todas as threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.methods = {}
+        self.collectors = {}
+        # Latência somada e número de chamadas por projeto e por (projeto, zona)
+        self.projects = {}
+        self.zones = {}
+        self.batches = 0
+        self.batch_items = 0
+        # Chamadas registradas, sem contar os envelopes dos lotes
+        self.calls = 0
+        # Tentativas que estouraram o prazo e cópias enviadas (e as que responderam primeiro)
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def record(self, request, status, latency, retries=0):
+        """
+        Registra uma chamada concluída. O envelope de um lote (BatchHttpRequest)
+        entra apenas como o método 'batch'; os seus itens são registrados
+        individualmente por batch.execute_batch.
+
+        Args:
+            request: A HttpRequest (preparada com instrument()) ou o lote.
+            status: Status HTTP final ou o nome da exceção.
+            latency (float): Duração da última tentativa, em segundos.
+            retries (int): Novas tentativas feitas antes do resultado final.
+        """
+        uri = getattr(request, 'uri', None)
+        method = getattr(request, 'methodId', None) or 'batch'
+        size = getattr(request, 'response_bytes', 0) if status == 200 else 0
+
+        with self._lock:
+            stats = self.methods.get(method)
+            if stats is None:
+                stats = self.methods[method] = MethodStats()
+            stats.calls += 1
+            stats.latencies.append(latency)
+            stats.bytes += size
+            stats.retries += retries
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if uri is None:
+                return
+            self.calls += 1
+
+            totals = self.collectors.setdefault(current_collector() or 'geral', [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += latency
+            totals[2] += int(status != 200)
+
+            project = PROJECT_PATTERN.search(uri)
+            if project:
+                totals = self.projects.setdefault(project[1], [0.0, 0])
+                totals[0] += latency
+                totals[1] += 1
+                zone = ZONE_PATTERN.search(uri)
+                if zone:
+                    totals = self.zones.setdefault((project[1], zone[1]), [0.0, 0])
+                    totals[0] += latency
+                    totals[1] += 1
+
+    def record_batch(self, items):
+        with self._lock:
+            self.batches += 1
+            self.batch_items += items
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_hedge(self, won=False):
+        with self._lock:
+            if won:
+                self.hedges_won += 1
+            else:
+                self.hedges += 1
+
+    def summary(self, extra=None):
+        """
+        Returns:
+            dict: O relatório da varredura (ver write_json).
+        """
+        with self._lock:
+            methods = {}
+            errors_by_status = {}
+            for method, stats in sorted(self.methods.items()):
+                latencies = sorted(stats.latencies)
+                method_errors = {str(status): count for status, count in stats.statuses.items() if status != 200}
+                for status, count in method_errors.items():
+                    errors_by_status[status] = errors_by_status.get(status, 0) + count
+                methods[method] = {
+                    'calls': stats.calls,
+                    'errors': method_errors,
+                    'retries': stats.retries,
+                    'bytes': stats.bytes,
+                    'latency_seconds': {
+                        'sum': round(sum(latencies), 6),
+                        'mean': round(sum(latencies) / len(latencies), 6) if latencies else 0.0,
+                        'max': round(latencies[-1], 6) if latencies else 0.0,
+                        **{f'p{int(quantile * 100)}': round(percentile(latencies, quantile), 6)
+                           for quantile in QUANTILES},
+                    },
+                }
+
+            slowest_projects = sorted(self.projects.items(), key=lambda item: item[1][0], reverse=True)[:TOP_SLOWEST]
+            slowest_zones = sorted(self.zones.items(), key=lambda item: item[1][0], reverse=True)[:TOP_SLOWEST]
+            report = {
+                'started': self.started,
+                'finished': time.time(),
+                'collectors': {name: {'calls': calls, 'latency_seconds': round(latency, 6), 'errors': failed}
+                               for name, (calls, latency, failed) in sorted(self.collectors.items())},
+                'methods': methods,
+                'errors_by_status': errors_by_status,
+                'batches': {'requests': self.batches, 'items': self.batch_items},
+                'timeouts': self.timeouts,
+                'hedges': {'sent': self.hedges, 'won': self.hedges_won},
+                'slowest_projects': [{'project': project, 'latency_seconds': round(latency, 6), 'calls': calls}
+                                     for project, (latency, calls) in slowest_projects],
+                'slowest_zones': [{'project': project, 'zone': zone, 'latency_seconds': round(latency, 6), 'calls': calls}
+                                  for (project, zone), (latency, calls) in slowest_zones],
+            }
+        report['duration_seconds'] = round(report['finished'] - report['started'], 3)
+        if extra:
+            report.update(extra)
+        return report
+
+    def write_json(self, file_path, extra=None):
+        report = self.summary(extra)
+        write_atomic(file_path, json.dumps(report, indent=2))
+        return report
+
+    def write_prometheus(self, file_path, report=None):
+        """
+        Grava as métricas no formato de texto do Prometheus, para o textfile
+        collector do node_exporter.
+        """
+        report = report or self.summary()
+        lines = [
+            '# HELP inventory_api_calls_total Chamadas às APIs do GCP por método e status.',
+            '# TYPE inventory_api_calls_total counter',
+        ]
+        with self._lock:
+            statuses = {method: dict(stats.statuses) for method, stats in self.methods.items()}
+        for method in sorted(statuses):
+            for status, count in sorted(statuses[method].items(), key=lambda item: str(item[0])):
+                lines.append(f'inventory_api_calls_total{{method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP inventory_api_latency_seconds Latência das chamadas por método.',
+            '# TYPE inventory_api_latency_seconds summary',
+        ]
+        for method, stats in report['methods'].items():
+            latency = stats['latency_seconds']
+            for quantile in QUANTILES:
+                lines.append(f'inventory_api_latency_seconds{{method="{method}",quantile="{quantile}"}} '
+                             f'{latency[f"p{int(quantile * 100)}"]}')
+            lines.append(f'inventory_api_latency_seconds_sum{{method="{method}"}} {latency["sum"]}')
+            lines.append(f'inventory_api_latency_seconds_count{{method="{method}"}} {stats["calls"]}')
+
+        lines += [
+            '# HELP inventory_api_response_bytes_total Bytes recebidos por método.',
+            '# TYPE inventory_api_response_bytes_total counter',
+        ]
+        lines += [f'inventory_api_response_bytes_total{{method="{method}"}} {stats["bytes"]}'
+                  for method, stats in report['methods'].items()]
+        lines += [
+            '# HELP inventory_api_retries_total Novas tentativas por método.',
+            '# TYPE inventory_api_retries_total counter',
+        ]
+        lines += [f'inventory_api_retries_total{{method="{method}"}} {stats["retries"]}'
+                  for method, stats in report['methods'].items()]
+
+        lines += [
+            '# HELP inventory_api_timeouts_total Tentativas que estouraram o prazo da chamada.',
+            '# TYPE inventory_api_timeouts_total counter',
+            f'inventory_api_timeouts_total {report["timeouts"]}',
+            '# HELP inventory_api_hedges_total Cópias enviadas de leituras lentas.',
+            '# TYPE inventory_api_hedges_total counter',
+            f'inventory_api_hedges_total {report["hedges"]["sent"]}',
+            '# HELP inventory_api_hedges_won_total Cópias que responderam antes da chamada original.',
+            '# TYPE inventory_api_hedges_won_total counter',
+            f'inventory_api_hedges_won_total {report["hedges"]["won"]}',
+        ]
+
+        lines += [
+            '# HELP inventory_collector_api_latency_seconds Latência somada das chamadas por coletor.',
+            '# TYPE inventory_collector_api_latency_seconds gauge',
+        ]
+        lines += [f'inventory_collector_api_latency_seconds{{collector="{name}"}} {totals["latency_seconds"]}'
+                  for name, totals in report['collectors'].items()]
+        for name, help_text in (('rows', 'Linhas geradas por coletor.'),
+                                ('duration_seconds', 'Duração do coletor na varredura.'),
+                                ('skipped', 'Projetos pulados por estarem com a API do coletor desabilitada.')):
+            values = {collector: stats[name] for collector, stats in report.get('collector_stats', {}).items()}
+            if values:
+                lines.append(f'# HELP inventory_collector_{name} {help_text}')
+                lines.append(f'# TYPE inventory_collector_{name} gauge')
+                lines += [f'inventory_collector_{name}{{collector="{collector}"}} {value}'
+                          for collector, value in values.items()]
+
+        lines += [
+            '# HELP inventory_scan_duration_seconds Duração total da varredura.',
+            '# TYPE inventory_scan_duration_seconds gauge',
+            f'inventory_scan_duration_seconds {report["duration_seconds"]}',
+            '# HELP inventory_scan_finished_timestamp_seconds Fim da última varredura.',
+            '# TYPE inventory_scan_finished_timestamp_seconds gauge',
+            f'inventory_scan_finished_timestamp_seconds {report["finished"]:.0f}',
+        ]
+        write_atomic(file_path, '\n'.join(lines) + '\n')
+
+def write_atomic(file_path, content):
+    # O textfile collector pode ler o arquivo a qualquer momento
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    temp_path = f'{file_path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as output:
+        output.write(content)
+    os.replace(temp_path, file_path)
+
+# Registro único usado por todas as chamadas do processo
+registry = CallMetrics()
+
+def reset():
+    """
+    Recria o registro do processo. Deve ser chamada antes de iniciar a varredura.
+    """
+    global registry
+    registry = CallMetrics()
+    return registry
+
+def record(request, status, latency, retries=0):
+    registry.record(request, status, latency, retries)
+
+def record_batch(items):
+    registry.record_batch(items)
+
+def record_timeout():
+    registry.record_timeout()
+
+def record_hedge(won=False):
+    registry.record_hedge(won)
+
+def write_reports(args, name, extra=None):
+    """
+    Grava o relatório JSON e o arquivo do Prometheus da varredura.
+
+    Args:
+        args (argparse.Namespace): Opções de linha de comando (ver add_arguments).
+        name (str): Nome usado nos caminhos padrão (ex.: 'vm', 'inventory').
+        extra (dict, optional): Dados adicionais do relatório (ex.: 'collector_stats').
+
+    Returns:
+        tuple: Os caminhos do JSON e do arquivo do Prometheus.
+    """
+    json_path = args.metrics_json or os.path.join(METRICS_DIR, f'{name}_metrics.json')
+    prom_path = args.metrics_prom or os.path.join(METRICS_DIR, f'{name}.prom')
+    report = registry.write_json(json_path, extra)
+    registry.write_prometheus(prom_path, report)
+    return json_path, prom_path
@@ -0,0 +1,300 @@
+# Script com o catálogo de projetos da varredura
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/projects.py
+#
+# Os filtros de estado, labels, pasta/organização e ID são enviados para a API
+# no parâmetro 'filter' de projects.list, e o resultado fica salvo em disco
+# (cache/) por um tempo configurável. Com --include-projects apenas com IDs
+# exatos, os projetos são buscados diretamente com projects.get, sem listar a
+# organização inteira.
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import time
+from src.org.common.clients import get_service
+from src.org.common import rate_limit
+from src.org.common.batch import execute_batch, chunked
+
+BASE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..')
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
+# Validade padrão do catálogo em disco, em segundos
+DEFAULT_CACHE_TTL = 3600
+
+LIFECYCLE_STATES = ('ACTIVE', 'DELETE_REQUESTED', 'ALL')
+
+# Limite de projects.get por lote (batch HTTP)
+GET_BATCH_SIZE = 100
+
+GLOB_CHARS = '*?['
+
+# Campos usados dos projetos (máscaras de resposta parcial, parâmetro 'fields')
+PROJECT_FIELDS = 'projectId,name,projectNumber,lifecycleState,labels,parent,createTime'
+PROJECTS_FIELDS = f'nextPageToken,projects({PROJECT_FIELDS})'
+
+def split_list(value):
+    """
+    Converte uma lista separada por vírgulas da linha de comando (argparse).
+    """
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def add_arguments(parser):
+    """
+    Adiciona as opções de seleção de projetos ao parser.
+    """
+    group = parser.add_argument_group('seleção de projetos')
+    group.add_argument('--lifecycle-state', choices=LIFECYCLE_STATES,
+                       help='Estado dos projetos varridos (padrão: ALL na listagem de projetos e '
+                            'ACTIVE nos demais coletores).')
+    group.add_argument('--label', action='append', default=[], metavar='CHAVE[=VALOR]',
+                       help='Apenas projetos com a label (pode ser repetido).')
+    group.add_argument('--parent', type=parent_type, metavar='folders/ID|organizations/ID',
+                       help='Apenas projetos filhos diretos da pasta ou organização.')
+    group.add_argument('--project-id', metavar='GLOB',
+                       help="Apenas projetos cujo ID casa com o padrão (ex.: 'prd-*').")
+    group.add_argument('--include-projects', type=split_list, default=[], metavar='LISTA',
+                       help='IDs ou padrões de projetos a varrer, separados por vírgula.')
+    group.add_argument('--exclude-projects', type=split_list, default=[], metavar='LISTA',
+                       help='IDs ou padrões de projetos a ignorar, separados por vírgula.')
+    group.add_argument('--projects-ttl', type=int, default=DEFAULT_CACHE_TTL, metavar='SEGUNDOS',
+                       help=f'Validade do catálogo de projetos em disco; 0 desativa (padrão: {DEFAULT_CACHE_TTL}).')
+    group.add_argument('--refresh-projects', action='store_true',
+                       help='Ignora o catálogo em disco e lista os projetos novamente.')
+
+def parent_type(value):
+    """
+    Valida o pai informado em --parent (argparse).
+    """
+    try:
+        parse_parent(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+def is_glob(pattern):
+    return any(char in pattern for char in GLOB_CHARS)
+
+def parse_label(label):
+    key, _, value = label.partition('=')
+    return key, value or None
+
+def parse_parent(parent):
+    """
+    Converte 'folders/123' ou 'organizations/456' no par (tipo, id) do
+    campo 'parent' dos projetos.
+    """
+    kind, _, parent_id = parent.partition('/')
+    kinds = {'folders': 'folder', 'organizations': 'organization'}
+    if kind not in kinds or not parent_id:
+        raise ValueError(f"pai inválido '{parent}': use folders/ID ou organizations/ID")
+    return kinds[kind], parent_id
+
+class ProjectCatalog:
+    """
+    Seleção dos projetos da varredura.
+
+    Args:
+        lifecycle_state (str): Estado dos projetos ('ALL' para todos).
+        labels (list, optional): Labels no formato 'chave' ou 'chave=valor'.
+        parent (str, optional): 'folders/ID' ou 'organizations/ID'.
+        id_glob (str, optional): Padrão do ID dos projetos.
+        include (list, optional): IDs ou padrões a varrer.
+        exclude (list, optional): IDs ou padrões a ignorar.
+        ttl (int): Validade do catálogo em disco, em segundos; 0 desativa.
+        refresh (bool): Se True, ignora o catálogo em disco.
+        logger (logging.Logger, optional): Logger da varredura.
+    """
+
+    def __init__(self, lifecycle_state='ACTIVE', labels=None, parent=None, id_glob=None,
+                 include=None, exclude=None, ttl=DEFAULT_CACHE_TTL, refresh=False, logger=None):
+        self.lifecycle_state = lifecycle_state
+        self.labels = [parse_label(label) for label in labels or []]
+        self.parent = parse_parent(parent) if parent else None
+        self.id_glob = id_glob
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.ttl = ttl
+        self.refresh = refresh
+        self.logger = logger
+        # Ponto da listagem que pode ser retomado (ver iter_projects): quantos
+        # projetos selecionados vieram das páginas já concluídas, o token da
+        # página seguinte e se a listagem terminou
+        self.position = {'count': 0, 'page_token': None, 'done': False}
+        self._selected = 0
+
+    @classmethod
+    def from_args(cls, args, logger=None, lifecycle_state='ACTIVE'):
+        """
+        Cria a seleção a partir das opções da linha de comando; 'lifecycle_state'
+        vale quando --lifecycle-state não é informado.
+        """
+        return cls(args.lifecycle_state or lifecycle_state, args.label, args.parent, args.project_id,
+                   args.include_projects, args.exclude_projects,
+                   args.projects_ttl, args.refresh_projects, logger)
+
+    def api_filter(self):
+        """
+        Monta o parâmetro 'filter' de projects.list. Padrões de ID só vão para
+        a API quando são um prefixo ('prd-*'); os demais são aplicados aqui.
+        """
+        terms = []
+        if self.lifecycle_state != 'ALL':
+            terms.append(f'lifecycleState:{self.lifecycle_state}')
+        for key, value in self.labels:
+            terms.append(f'labels.{key}:{value or "*"}')
+        if self.parent:
+            terms.append(f'parent.type:{self.parent[0]} parent.id:{self.parent[1]}')
+        if self.id_glob and not is_glob(self.id_glob.rstrip('*')):
+            terms.append(f'id:{self.id_glob}')
+        return ' '.join(terms) or None
+
+    def matches(self, project):
+        """
+        Confere o projeto com todos os filtros, inclusive os que a API não
+        aplica (padrões de ID, --include-projects e --exclude-projects).
+        """
+        project_id = project.get('projectId', '')
+        if self.lifecycle_state != 'ALL' and project.get('lifecycleState') != self.lifecycle_state:
+            return False
+        labels = project.get('labels', {})
+        for key, value in self.labels:
+            if key not in labels or (value is not None and labels[key] != value):
+                return False
+        if self.parent:
+            parent = project.get('parent', {})
+            if (parent.get('type'), parent.get('id')) != self.parent:
+                return False
+        if self.id_glob and not fnmatch.fnmatchcase(project_id, self.id_glob):
+            return False
+        if self.include and not any(fnmatch.fnmatchcase(project_id, pattern) for pattern in self.include):
+            return False
+        if any(fnmatch.fnmatchcase(project_id, pattern) for pattern in self.exclude):
+            return False
+        return True
+
+    def cache_path(self):
+        key = json.dumps([self.api_filter(), self.id_glob, sorted(self.include), sorted(self.exclude)])
+        return os.path.join(CACHE_DIR, f"projects-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}.json")
+
+    def load_cache(self):
+        if self.ttl <= 0 or self.refresh:
+            return None
+        try:
+            with open(self.cache_path(), encoding='utf-8') as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - cached.get('created', 0) > self.ttl:
+            return None
+        return cached['projects']
+
+    def save_cache(self, projects):
+        if self.ttl <= 0:
+            return
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        file_path = self.cache_path()
+        # Grava em um arquivo temporário para nunca deixar um catálogo pela metade
+        temp_path = f'{file_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as cache_file:
+            json.dump({'created': time.time(), 'filter': self.api_filter(), 'projects': projects}, cache_file)
+        os.replace(temp_path, file_path)
+
+    def iter_projects(self, credentials, resume=None):
+        """
+        Gera os projetos selecionados: do catálogo em disco, se ainda válido,
+        ou da API, à medida que as páginas chegam.
+
+        Args:
+            credentials: Credenciais da varredura.
+            resume (dict, optional): Ponto de uma listagem interrompida, com
+                'projects' (os projetos até o ponto), 'page_token' e 'done'
+                (ver position). Os projetos são repetidos e a listagem
+                continua da página seguinte.
+        """
+        projects = []
+        page_token = None
+        if resume is not None:
+            projects = list(resume['projects'])
+            page_token = resume['page_token']
+            self._log(f"Retomando a listagem de projetos depois de {len(projects)} projetos.")
+            self._selected = len(projects)
+            yield from projects
+            self.position = {'count': len(projects), 'page_token': page_token, 'done': resume['done']}
+            if resume['done']:
+                return
+        else:
+            cached = self.load_cache()
+            if cached is not None:
+                self._log(f"Usando o catálogo de projetos em disco ({len(cached)} projetos).")
+                yield from cached
+                self.position = {'count': len(cached), 'page_token': None, 'done': True}
+                return
+
+        if self.include and not any(is_glob(pattern) for pattern in self.include):
+            # Sem paginação: uma listagem retomada busca tudo de novo e pula os já repetidos
+            source = self._get_projects(credentials)
+            skip = len(projects)
+        else:
+            source = self._list_projects(credentials, page_token)
+            skip = 0
+        for project in source:
+            if self.matches(project):
+                if skip:
+                    skip -= 1
+                    continue
+                projects.append(project)
+                self._selected = len(projects)
+                yield project
+        self.position = {'count': len(projects), 'page_token': None, 'done': True}
+        self.save_cache(projects)
+
+    # Pagina projects.list com o filtro do lado do servidor, a partir de
+    # 'page_token' quando a listagem é retomada
+    def _list_projects(self, credentials, page_token=None):
+        service = get_service('cloudresourcemanager', 'v1', credentials)
+        api_filter = self.api_filter()
+        self._log(f"Listando projetos com o filtro: {api_filter or '(nenhum)'}")
+        params = {'fields': PROJECTS_FIELDS}
+        if api_filter:
+            params['filter'] = api_filter
+        if page_token:
+            params['pageToken'] = page_token
+        request = service.projects().list(**params)
+        while request is not None:
+            response = rate_limit.execute(request)
+            yield from response.get('projects', [])
+            # Página concluída: os projetos selecionados até aqui podem ser
+            # repetidos e a listagem continuar do próximo token
+            next_token = response.get('nextPageToken')
+            self.position = {'count': self._selected, 'page_token': next_token, 'done': not next_token}
+            request = service.projects().list_next(previous_request=request, previous_response=response)
+
+    # Busca diretamente os projetos de --include-projects, em lotes de projects.get
+    def _get_projects(self, credentials):
+        service = get_service('cloudresourcemanager', 'v1', credentials)
+        self._log(f"Buscando {len(self.include)} projetos informados em --include-projects.")
+        for project_ids in chunked(self.include, GET_BATCH_SIZE):
+            found = {}
+
+            def on_response(project_id, project, exception):
+                if exception is not None:
+                    self._log(f"  AVISO: Projeto '{project_id}' não encontrado ou sem acesso: "
+                              f"{rate_limit.describe_error(exception)}", warning=True)
+                    return
+                found[project_id] = project
+
+            execute_batch(service, [(project_id, service.projects().get(projectId=project_id, fields=PROJECT_FIELDS))
+                                    for project_id in project_ids], on_response)
+            # Mantém a ordem informada na linha de comando
+            for project_id in project_ids:
+                if project_id in found:
+                    yield found[project_id]
+
+    def _log(self, message, warning=False):
+        if self.logger is not None:
+            (self.logger.warning if warning else self.logger.info)(message)
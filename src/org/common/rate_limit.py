@@ -0,0 +1,394 @@
+# Script com o controle de taxa das chamadas às APIs do Google Cloud
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/rate_limit.py
+#
+# Todas as chamadas execute() passam por aqui:
+# - um token bucket por serviço (compute, sqladmin, ...) limita as chamadas por segundo
+# - respostas 429/5xx e falhas de rede são repetidas com backoff exponencial e jitter
+# - a concorrência se adapta (AIMD): cai pela metade quando há throttling e
+#   volta a subir aos poucos quando as chamadas voltam a passar
+# - com --hedge, uma leitura (GET) que passa do p95 de latência observado do
+#   seu método recebe uma cópia; vale a primeira resposta e a outra é descartada.
+#   A cópia ocupa uma vaga de concorrência até a última das duas terminar
+
+import copy
+import logging
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+from googleapiclient import errors
+from googleapiclient.http import HttpRequest
+from src.org.common import metrics
+
+# Logger usado até configure() receber o logger da varredura
+default_logger = logging.getLogger(__name__)
+
+# Status HTTP que indicam throttling ou falha temporária do servidor
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+# Status que reduzem a concorrência (cota excedida ou serviço sobrecarregado)
+THROTTLING_STATUS = (429, 503)
+
+# Chamadas por segundo por serviço. Ajuste conforme as cotas do projeto de
+# faturamento das credenciais (ex.: Compute 'Read requests per minute').
+DEFAULT_RATES = {
+    # assets.list: cota de 100 chamadas por minuto
+    'cloudasset': 1.0,
+    'cloudresourcemanager': 10.0,
+    'compute': 20.0,
+    'container': 10.0,
+    # services.batchGet: cota de leitura da Service Usage (6.000 chamadas por
+    # minuto); cada projeto de um lote conta como uma chamada
+    'serviceusage': 100.0,
+    'sqladmin': 10.0,
+}
+DEFAULT_RATE = 10.0
+
+# Prefixos de methodId que diferem do nome do serviço ('sql.instances.list')
+METHOD_PREFIXES = {'sql': 'sqladmin'}
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_MAX_RETRIES = 6
+
+# Backoff exponencial em segundos: min(BACKOFF_CAP, BACKOFF_BASE * 2^tentativa)
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+# Intervalo mínimo entre duas reduções de concorrência, para que uma rajada
+# de 429 das chamadas já em andamento conte como um único sinal de throttling
+DECREASE_COOLDOWN = 1.0
+
+# Falhas de rede que também são repetidas
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, socket.timeout)
+
+# Cópias (hedge): latências recentes de cada método usadas no p95, mínimo de
+# amostras antes da primeira cópia e fração máxima de chamadas copiadas
+HEDGE_QUANTILE = 0.95
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_BUDGET = 0.1
+
+class TokenBucket:
+    """
+    Token bucket com 'rate' tokens por segundo e capacidade 'burst'.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        # Um lote maior que a capacidade espera o balde encher e é cobrado
+        # inteiro: o saldo fica negativo e as chamadas seguintes esperam a
+        # dívida ser paga, então a taxa média respeita 'rate'
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+class AdaptiveConcurrency:
+    """
+    Limite de chamadas simultâneas com aumento aditivo e redução
+    multiplicativa (AIMD).
+    """
+
+    def __init__(self, max_limit, min_limit=1, logger=default_logger):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.logger = logger
+        self.limit = float(max_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def try_acquire(self):
+        """
+        Ocupa uma vaga apenas se houver uma livre, sem esperar.
+
+        Returns:
+            bool: True se a vaga foi ocupada.
+        """
+        with self._condition:
+            if self._in_flight >= int(self.limit):
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, throttled=False):
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self._decrease()
+            elif self.limit < self.max_limit:
+                # +1 a cada 'limit' chamadas bem-sucedidas
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def signal_throttling(self):
+        """
+        Registra throttling observado fora de acquire/release (ex.: um item
+        de um lote que voltou com 429).
+        """
+        with self._condition:
+            self._decrease()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease >= DECREASE_COOLDOWN:
+            self.limit = max(self.min_limit, self.limit / 2)
+            self._last_decrease = now
+            self.logger.warning(f"Throttling detectado: concorrência reduzida para {int(self.limit)}.")
+
+def api_name(request):
+    """
+    Nome do serviço de uma requisição (ex.: 'compute'), a partir do methodId
+    ('compute.instances.list') ou, na falta dele, do host da URL.
+    """
+    method_id = getattr(request, 'methodId', None)
+    if method_id:
+        prefix = method_id.split('.')[0]
+        return METHOD_PREFIXES.get(prefix, prefix)
+    return urlparse(request.uri).hostname.split('.')[0]
+
+def backoff_delay(attempt):
+    # Jitter "full": espera aleatória entre metade e o total do backoff
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
+
+def is_throttling(exception):
+    return isinstance(exception, errors.HttpError) and exception.resp.status in THROTTLING_STATUS
+
+def is_retryable(exception):
+    if isinstance(exception, errors.HttpError):
+        return exception.resp.status in RETRYABLE_STATUS
+    return isinstance(exception, TRANSIENT_ERRORS)
+
+class RateLimiter:
+    """
+    Controle de taxa compartilhado por todas as chamadas do processo.
+
+    Args:
+        rates (dict, optional): Chamadas por segundo por serviço.
+        default_rate (float): Taxa dos serviços ausentes em 'rates'.
+        max_concurrency (int): Teto da concorrência adaptativa.
+        max_retries (int): Número máximo de novas tentativas por chamada.
+        hedge (bool): Envia cópias das leituras mais lentas que o p95 do método.
+        logger (logging.Logger, optional): Logger da varredura, que recebe os
+            avisos de novas tentativas e de throttling.
+    """
+
+    def __init__(self, rates=None, default_rate=DEFAULT_RATE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES, hedge=False,
+                 logger=None):
+        self.rates = dict(DEFAULT_RATES, **(rates or {}))
+        self.default_rate = default_rate
+        self.max_retries = max_retries
+        self.logger = logger or default_logger
+        self.concurrency = AdaptiveConcurrency(max_concurrency, logger=self.logger)
+        self.hedge = hedge
+        self._buckets = {}
+        self._lock = threading.Lock()
+        # Latências recentes por método e contagem de leituras e de cópias
+        self._latencies = {}
+        self._hedge_calls = 0
+        self._hedges = 0
+        self._executor = None
+
+    def bucket(self, api):
+        with self._lock:
+            bucket = self._buckets.get(api)
+            if bucket is None:
+                bucket = self._buckets[api] = TokenBucket(self.rates.get(api, self.default_rate))
+            return bucket
+
+    def execute(self, request, api=None, calls=1, retries=0):
+        """
+        Executa a requisição respeitando a taxa do serviço e a concorrência
+        adaptativa, repetindo 429/5xx e falhas de rede com backoff. Depois da
+        última tentativa o erro é levantado, nunca descartado. O resultado
+        final é registrado em metrics, com a latência da última tentativa
+        (também guardada em request.latency).
+
+        Args:
+            request: HttpRequest ou BatchHttpRequest.
+            api (str, optional): Serviço da chamada; se None, é obtido da requisição.
+            calls (int): Quantas chamadas de cota a requisição representa
+                         (ex.: o número de itens de um lote).
+            retries (int): Tentativas já feitas fora daqui (ex.: o item de um
+                           lote que voltou com 429), somadas nas métricas.
+        """
+        api = api or api_name(request)
+        if isinstance(request, HttpRequest):
+            metrics.instrument(request)
+        attempt = 0
+        while True:
+            self.bucket(api).acquire(calls)
+            self.concurrency.acquire()
+            throttled = False
+            started = time.monotonic()
+            try:
+                if self.hedge and isinstance(request, HttpRequest) and request.method == 'GET':
+                    response = self.execute_hedged(request, api)
+                else:
+                    response = request.execute()
+            except Exception as e:
+                request.latency = time.monotonic() - started
+                if isinstance(e, TimeoutError):
+                    metrics.record_timeout()
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    metrics.record(request, metrics.error_status(e), request.latency, retries + attempt)
+                    raise
+                throttled = is_throttling(e)
+                delay = backoff_delay(attempt)
+                self.logger.warning(f"Chamada '{api}' falhou ({describe_error(e)}); "
+                               f"nova tentativa {attempt + 1}/{self.max_retries} em {delay:.1f}s.")
+            else:
+                request.latency = time.monotonic() - started
+                metrics.record(request, 200, request.latency, retries + attempt)
+                self.observe(request, request.latency)
+                return response
+            finally:
+                self.concurrency.release(throttled)
+            time.sleep(delay)
+            attempt += 1
+
+    def observe(self, request, latency):
+        method = getattr(request, 'methodId', None)
+        if not self.hedge or method is None:
+            return
+        with self._lock:
+            latencies = self._latencies.get(method)
+            if latencies is None:
+                latencies = self._latencies[method] = deque(maxlen=HEDGE_WINDOW)
+            latencies.append(latency)
+
+    def hedge_delay(self, method):
+        """
+        Returns:
+            float: O p95 das latências recentes do método, ou None enquanto
+                   não há amostras suficientes.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(method, ()))
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return metrics.percentile(latencies, HEDGE_QUANTILE)
+
+    def _take_hedge(self):
+        with self._lock:
+            if self._hedges >= HEDGE_BUDGET * self._hedge_calls:
+                return False
+            self._hedges += 1
+            return True
+
+    def _hedge_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Cada leitura ocupa até duas threads (a original e a cópia)
+                self._executor = ThreadPoolExecutor(max_workers=4 * self.concurrency.max_limit,
+                                                    thread_name_prefix='hedge')
+            return self._executor
+
+    def execute_hedged(self, request, api):
+        """
+        Executa a leitura em uma thread auxiliar. Se ela não responder dentro
+        do p95 do método, uma cópia é enviada e vale a primeira resposta bem
+        sucedida; a outra é descartada quando chegar, então o chamador
+        recebe sempre uma única resposta. Se as duas falham, o erro da
+        original é levantado.
+        """
+        with self._lock:
+            self._hedge_calls += 1
+        executor = self._hedge_executor()
+        delay = self.hedge_delay(request.methodId)
+        original = executor.submit(request.execute)
+        if delay is None:
+            return original.result()
+        done, _ = wait([original], timeout=delay)
+        if done or not self._take_hedge():
+            return original.result()
+        # A cópia só sai com uma vaga de concorrência livre; sem ela, esperar
+        # por uma vaga prenderia a vaga da original
+        if not self.concurrency.try_acquire():
+            return original.result()
+
+        # A cópia também respeita a taxa do serviço
+        self.bucket(api).acquire()
+        duplicate = copy.copy(request)
+        duplicate.headers = dict(request.headers)
+        hedge = executor.submit(duplicate.execute)
+        metrics.record_hedge()
+        # A vaga de execute() é devolvida quando esta função retorna; a da cópia
+        # fica ocupada até a última das duas chamadas terminar, então a chamada
+        # descartada continua contada na concorrência enquanto está em andamento
+        self._release_when_done(original, hedge)
+        pending = {original, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        metrics.record_hedge(won=True)
+                    return future.result()
+        return original.result()
+
+    def _release_when_done(self, *futures):
+        # Devolve uma vaga de concorrência quando todas as chamadas terminarem
+        remaining = len(futures)
+        lock = threading.Lock()
+
+        def on_done(future):
+            nonlocal remaining
+            with lock:
+                remaining -= 1
+                if remaining:
+                    return
+            self.concurrency.release(is_throttling(future.exception()))
+
+        for future in futures:
+            future.add_done_callback(on_done)
+
+def describe_error(exception):
+    if isinstance(exception, errors.HttpError):
+        return f"HTTP {exception.resp.status}"
+    return f"{type(exception).__name__}: {exception}"
+
+# Instância única usada por todos os coletores
+limiter = RateLimiter()
+
+def configure(rates=None, default_rate=DEFAULT_RATE,
+              max_concurrency=DEFAULT_MAX_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES, hedge=False,
+              logger=None):
+    """
+    Recria o controle de taxa do processo com novos parâmetros. Deve ser
+    chamada antes de iniciar a varredura.
+    """
+    global limiter
+    limiter = RateLimiter(rates, default_rate, max_concurrency, max_retries, hedge, logger)
+    return limiter
+
+def execute(request, api=None, calls=1, retries=0):
+    """
+    Executa a requisição pelo controle de taxa do processo (ver RateLimiter.execute).
+    """
+    return limiter.execute(request, api, calls, retries)
@@ -0,0 +1,158 @@
+# Script com os tipos de registro das linhas do inventário
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/records.py
+#
+# Cada linha é uma tupla nomeada (sem __dict__ por instância) e cada tipo é
+# definido uma única vez a partir das suas colunas. O cabeçalho do CSV, a
+# tabela do console (--rows), a linha do log e as tabelas/esquemas das saídas
+# Parquet, Arrow e SQLite saem dessa definição.
+
+import re
+from collections import namedtuple
+from operator import itemgetter
+from typing import NamedTuple
+
+class Column(NamedTuple):
+    """
+    Coluna de um registro.
+
+    Args:
+        field (str): Nome do campo na tupla.
+        header (str): Rótulo no cabeçalho do CSV e do console.
+        width (int): Largura na tabela do console; 0 deixa a coluna fora do console.
+        align (str): Alinhamento no console ('<' ou '>').
+        kind (str): Tipo nas saídas colunares (ver COLUMN_KINDS).
+        report (bool): Se False, a coluna fica fora do CSV e do log (ex.: o
+            self_link, usado como chave no SQLite).
+        indexed (bool): Se True, a coluna ganha um índice no SQLite.
+    """
+    field: str
+    header: str
+    width: int = 0
+    align: str = '<'
+    kind: str = 'str'
+    report: bool = True
+    indexed: bool = False
+
+# Tipos de coluna: texto, inteiro (vazio vira nulo) e lista de textos
+COLUMN_KINDS = ('str', 'int', 'list')
+
+def record_type(name, columns, index_header='', index_width=2, index_align='>'):
+    """
+    Cria um tipo de registro a partir das suas colunas.
+
+    Args:
+        name (str): Nome do tipo.
+        columns (list): Colunas (Column) na ordem do CSV.
+        index_header (str): Rótulo da coluna de contagem no console.
+        index_width (int): Largura da coluna de contagem no console.
+        index_align (str): Alinhamento da coluna de contagem no console.
+
+    Returns:
+        type: Subclasse de tupla nomeada com 'columns', 'table' (nome da
+              tabela no SQLite), 'headers' (cabeçalho do CSV), report_values(),
+              console_header(), console_line(contagem) e __str__ (linha do log).
+    """
+    columns = tuple(columns)
+    report_positions = [position for position, column in enumerate(columns) if column.report]
+    headers = tuple(columns[position].header for position in report_positions)
+    # Todas as colunas no relatório: a própria tupla serve como linha do CSV
+    report_getter = itemgetter(*report_positions) if len(report_positions) < len(columns) else None
+    console_columns = [(position, column) for position, column in enumerate(columns) if column.width]
+    console_format = ' '.join([f'{{:{index_align}{index_width}}}'] +
+                              [f'{{:{column.align}{column.width}}}' for _, column in console_columns])
+    console_positions = [position for position, _ in console_columns]
+
+    class Record(namedtuple(name, [column.field for column in columns])):
+        __slots__ = ()
+
+        def report_values(self):
+            """
+            Os valores das colunas do relatório (CSV e log), na ordem de 'headers'.
+            """
+            return self if report_getter is None else report_getter(self)
+
+        @classmethod
+        def console_header(cls):
+            return console_format.format(index_header, *(column.header for _, column in console_columns))
+
+        def console_line(self, count):
+            return console_format.format(count, *(self[position] for position in console_positions))
+
+        def __str__(self):
+            return '; '.join(f'{header}={value}' for header, value in zip(headers, self.report_values()))
+
+    Record.columns = columns
+    Record.headers = headers
+    # 'VmRecord' -> 'vm', 'NodePoolRecord' -> 'node_pool'
+    Record.table = re.sub(r'(?<!^)(?=[A-Z])', '_', name.removesuffix('Record')).lower()
+    Record.__name__ = Record.__qualname__ = name
+    return Record
+
+# Identificador único do recurso (selfLink da API), chave das atualizações no SQLite
+SELF_LINK = Column('self_link', 'SELF_LINK', report=False)
+# Criação do recurso (creationTimestamp/createTime); um valor diferente para o
+# mesmo self_link indica um recurso recriado (ver changes.py)
+CREATED = Column('created', 'CREATED', report=False)
+
+ProjectRecord = record_type('ProjectRecord', [
+    Column('project_id', 'PROJECT_ID', 40, indexed=True),
+    Column('name', 'NAME', 30, indexed=True),
+    Column('project_number', 'PROJECT_NUMBER', 20),
+    CREATED,
+    SELF_LINK,
+], index_header='No.', index_width=3)
+
+VmRecord = record_type('VmRecord', [
+    Column('project_id', 'PROJECT_ID', 30, indexed=True),
+    Column('name', 'VM', 45, indexed=True),
+    Column('zone', 'ZONA', 25, indexed=True),
+    Column('private_ip', 'IP PRIVADO', 18, indexed=True),
+    Column('os', 'SO', 30),
+    Column('status', 'STATUS', 20),
+    CREATED,
+    SELF_LINK,
+])
+
+SubnetRecord = record_type('SubnetRecord', [
+    Column('project', 'PROJECT_ID', 35, indexed=True),
+    Column('vpc', 'VPC', 45),
+    Column('name', 'NAME', indexed=True),
+    Column('region', 'REGION', 25, indexed=True),
+    Column('ip_range', 'RANGE', 20, indexed=True),
+    Column('secondary_ranges', 'SECONDARY', kind='list'),
+    Column('gateway', 'GATEWAY', indexed=True),
+    CREATED,
+    SELF_LINK,
+])
+
+NodePoolRecord = record_type('NodePoolRecord', [
+    Column('project_id', 'PROJECT_ID', 28, indexed=True),
+    Column('cluster', 'CLUSTER', 40, indexed=True),
+    Column('cluster_version', 'CLUSTER_VERSION', 20),
+    Column('pool', 'POOL', 35, indexed=True),
+    Column('nodes', 'NOS', 4, kind='int'),
+    Column('machine_type', 'TYPE', 18),
+    Column('autoscaling', 'AUTOSCALING', 20),
+    Column('zones', 'ZONAS', 5, kind='int'),
+    CREATED,
+    SELF_LINK,
+], index_width=3, index_align='<')
+
+SqlInstanceRecord = record_type('SqlInstanceRecord', [
+    Column('env', 'ENV', 4),
+    Column('project_id', 'PROJECT_ID', 25, indexed=True),
+    Column('instance', 'INSTANCIA', 30, indexed=True),
+    Column('version', 'TIPO', 30),
+    Column('backup', 'BACKUP', 6),
+    Column('public_ip', 'IP PUBLIC', 15, indexed=True),
+    Column('private_ip', 'IP PRIVATE', 15, indexed=True),
+    Column('tier', 'TIER', 23),
+    Column('disk_type', 'DISK TYPE', 10),
+    Column('disk_size_gb', 'SIZE Gb', 8, kind='int'),
+    Column('region', 'REGION', 10, indexed=True),
+    CREATED,
+    SELF_LINK,
+])
@@ -0,0 +1,621 @@
+# Script com o executor único da varredura do inventário
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/runner.py
+#
+# Os projetos são listados uma única vez (ver projects.py) e cada projeto é
+# enviado a todos os coletores selecionados (projetos, VM, rede, GKE, Cloud
+# SQL), que compartilham o mesmo agendador, as mesmas credenciais e o mesmo
+# controle de taxa. Cada coletor continua gravando o seu próprio CSV.
+#
+# Com --engine assets os coletores que têm um tipo do Cloud Asset Inventory
+# (asset_type) recebem todos os projetos selecionados em uma única tarefa,
+# que lê os recursos da organização em uma listagem paginada (ver assets.py).
+#
+# Com a consulta de APIs habilitadas (ver service_usage.py), cada coletor
+# recebe apenas os projetos com a sua API habilitada; os demais ficam
+# registrados como pulados.
+
+import datetime
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from googleapiclient import errors
+from src.org.common.credentials import get_credentials
+from src.org.common.logger_config import set_log_level
+from src.org.common import console, metrics, rate_limit, transport
+from src.org.common.assets import asset_project, iter_assets
+from src.org.common.changes import ChangeSetSink
+from src.org.common.checkpoint import CHECKPOINT_INTERVAL, Checkpoint
+from src.org.common.scheduler import BoundedScheduler
+from src.org.common.projects import ProjectCatalog
+from src.org.common.service_usage import CHECK_BATCH_SIZE, CHECK_WORKERS, EnabledApis
+from src.org.common.sinks import CHUNK_ROWS, SinkWriter, build_sinks, sink_key
+
+summary_format = '{:<10} {:>9} {:>9} {:>8} {:>12} {:>10} {:>7} {:>8}'
+summary_list = 'COLETOR', 'PROJETOS', 'LINHAS', 'TAREFAS', 'TEMPO ATIVO', 'DURAÇÃO', 'FALHAS', 'PULADOS'
+
+def time_now(logger, message, always=False):
+    now = datetime.datetime.now()
+    date_format = now.strftime("%d-%m-%Y %H:%M:%S")
+    console.message(f"{date_format} - {message}", always)
+    logger.info(f"{message}")
+
+class Collector:
+    """
+    Base dos coletores do inventário.
+
+    Cada coletor recebe grupos de até batch_size projetos em collect() e
+    gera as linhas do inventário. O executor cuida da listagem de projetos,
+    do agendamento, da entrega das linhas aos destinos (ver sinks.py) e do
+    resumo de tempos.
+
+    Args:
+        logger (logging.Logger): Logger do coletor.
+        filename (str): Caminho do CSV de saída.
+    """
+
+    # Nome usado em --collect
+    name = None
+    # Tipo das linhas geradas (ver records.py); define o cabeçalho do CSV e a tabela do console
+    record = None
+    # Se True, o coletor recebe apenas os projetos com lifecycleState ACTIVE
+    active_only = False
+    # Estado dos projetos varridos quando --lifecycle-state não é informado ('ALL' para todos)
+    lifecycle_state = 'ACTIVE'
+    # Se True, as linhas saem na ordem de listagem dos projetos
+    ordered = True
+    # Tipo do Cloud Asset Inventory lido com --engine assets (ex.: 'compute.googleapis.com/Instance');
+    # None mantém a coleta por projeto
+    asset_type = None
+    # Serviço chamado pelo coletor em cada projeto (ex.: 'compute.googleapis.com'); os
+    # projetos em que ele está desabilitado são pulados
+    api = None
+
+    def __init__(self, logger, filename):
+        self.logger = logger
+        self.filename = filename
+        # Chamadas que falharam mesmo depois das novas tentativas do controle
+        # de taxa. Cada uma representa recursos que podem faltar no inventário.
+        self.failed_calls = []
+
+    def add_arguments(self, parser):
+        """
+        Adiciona as opções de linha de comando próprias do coletor.
+        """
+
+    def configure(self, args):
+        """
+        Lê as opções do coletor já interpretadas, antes da varredura.
+        """
+
+    def accepts(self, project):
+        state = project.get('lifecycleState')
+        if self.active_only and state != 'ACTIVE':
+            return False
+        return self.lifecycle_state == 'ALL' or state == self.lifecycle_state
+
+    def collect(self, projects, runner):
+        """
+        Coleta os recursos de um grupo de projetos. Deve ser um gerador, para
+        que as linhas sigam para os destinos enquanto a coleta continua.
+
+        Args:
+            projects (list): Projetos (dicts de projects.list) do grupo.
+            runner (InventoryRunner): Executor da varredura, com as
+                credenciais, o tamanho de lote e o envio de subtarefas.
+
+        Yields:
+            As linhas do inventário, do tipo 'record'.
+        """
+        raise NotImplementedError
+
+    def skipped_rows(self, project):
+        """
+        Linhas de um projeto pulado por estar com a API do coletor
+        desabilitada; por padrão, nenhuma.
+        """
+        return ()
+
+    def collect_assets(self, projects, runner):
+        """
+        Coleta os recursos de todos os projetos selecionados a partir de uma
+        única listagem do Cloud Asset Inventory (--engine assets). Os
+        recursos de projetos fora da seleção são ignorados.
+
+        Yields:
+            As linhas do inventário, do tipo 'record'.
+        """
+        selected = {project['projectId']: project for project in projects}
+        try:
+            for asset in iter_assets(runner.credentials, runner.asset_scope, self.asset_type):
+                project = selected.get(asset_project(asset))
+                if project is None:
+                    continue
+                try:
+                    # As linhas do recurso saem juntas: um erro no meio não deixa o recurso pela metade
+                    yield from list(self.asset_rows(project, asset['resource']['data']))
+                except Exception as e:
+                    self.log_fetch_error(f"processar o recurso '{asset.get('name')}'", e)
+        except Exception as e:
+            self.log_fetch_error(f"listar '{self.asset_type}' em '{runner.asset_scope}'", e)
+
+    def asset_rows(self, project, resource):
+        """
+        Gera as linhas de um recurso do Cloud Asset Inventory, no mesmo
+        formato da API de origem (ex.: uma instância de instances.list).
+        """
+        raise NotImplementedError
+
+    def print_header(self):
+        print(self.record.console_header())
+
+    def print_row(self, count, row):
+        print(row.console_line(count))
+
+    def log_fetch_error(self, context, e):
+        """
+        Registra a falha de uma chamada da API no log. 403/404 indicam API
+        desabilitada ou sem acesso; os demais erros são contados como falhas.
+        """
+        if isinstance(e, errors.HttpError) and e.resp.status in (403, 404):
+            self.logger.warning(f"  AVISO: Erro HTTP ao {context}: {e.resp.status} - {e.content.decode()}")
+            return
+        self.failed_calls.append(context)
+        if isinstance(e, errors.HttpError):
+            self.logger.error(f"  ERRO: Erro HTTP ao {context}: {e.resp.status} - {e.content.decode()}")
+        else:
+            self.logger.error(f"  ERRO: Falha inesperada ao {context}: {e}")
+
+class CollectorStats:
+    """
+    Contadores de tempo e volume de um coletor durante a varredura.
+    """
+
+    def __init__(self):
+        self.projects = 0
+        # IDs dos projetos enviados ao coletor
+        self.project_ids = set()
+        # Projetos cujas tarefas de grupo (collect) já terminaram
+        self.projects_done = 0
+        # IDs dos projetos pulados por estarem com a API do coletor desabilitada
+        self.skipped = []
+        self.tasks = 0
+        self.rows = 0
+        # Soma do tempo das tarefas do coletor nos workers
+        self.busy = 0.0
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self):
+        if self.started is None:
+            return 0.0
+        return self.finished - self.started
+
+class InventoryRunner:
+    """
+    Executa os coletores sobre uma única listagem de projetos.
+
+    Args:
+        collectors (list): Coletores selecionados.
+        catalog (ProjectCatalog): Seleção dos projetos da varredura.
+        credentials: Credenciais compartilhadas por todos os coletores.
+        workers (int): Limite global de tarefas concorrentes.
+        batch_size (int): Número de projetos por tarefa (e por batch HTTP).
+        logger (logging.Logger): Logger da varredura.
+        output (console.Console, optional): Saída de console da varredura.
+        checkpoint (checkpoint.Checkpoint, optional): Onde gravar os
+            checkpoints periódicos da varredura.
+        resume (dict, optional): Checkpoint de uma varredura interrompida,
+            a ser continuada.
+        asset_scope (str, optional): Escopo do Cloud Asset Inventory; quando
+            informado, os coletores com asset_type leem os recursos de lá.
+        enabled_apis (service_usage.EnabledApis, optional): Mapa das APIs
+            habilitadas; quando informado, os projetos são consultados antes
+            de ir para os coletores.
+    """
+
+    def __init__(self, collectors, catalog, credentials, workers, batch_size, logger, output=None,
+                 checkpoint=None, resume=None, asset_scope=None, enabled_apis=None):
+        self.collectors = collectors
+        self.catalog = catalog
+        self.credentials = credentials
+        self.workers = workers
+        self.batch_size = batch_size
+        self.logger = logger
+        self.output = output or console.console
+        self.projects_listed = 0
+        self.listing = True
+        self.started = None
+        # Se todas as tarefas terminaram (a varredura não foi interrompida)
+        self.completed = False
+        self.stats = {collector: CollectorStats() for collector in collectors}
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.asset_scope = asset_scope
+        self.enabled_apis = enabled_apis
+        # Pontos do checkpoint retomado por coletor (ver sinks.SinkWriter)
+        self._boundaries = {}
+        for collector in collectors:
+            boundary = (resume or {}).get('collectors', {}).get(collector.name)
+            if boundary is not None:
+                self._boundaries[collector] = boundary
+                self.stats[collector].rows = boundary['rows']
+        # Projetos na ordem em que vieram do catálogo, para os checkpoints
+        self._listed = []
+        self._lock = threading.Lock()
+        self._scheduler = None
+        self._writer = None
+
+    def submit(self, collector, fn, *args):
+        """
+        Envia uma subtarefa de um coletor (ex.: as zonas de um projeto) de
+        dentro de um worker, sem bloquear. A subtarefa gera linhas do
+        coletor como collect(); só deve ser usada por coletores sem ordem.
+        """
+        return self._scheduler.submit(self._run_task, collector, None, fn, *args, bounded=False)
+
+    def uses_assets(self, collector):
+        return self.asset_scope is not None and collector.asset_type is not None
+
+    def _submit_group(self, collector, sequence, projects):
+        with self._lock:
+            self.stats[collector].projects += len(projects)
+            self.stats[collector].project_ids.update(project.get('projectId') for project in projects)
+            # Grupo já gravado antes do checkpoint retomado
+            if collector in self._boundaries and sequence < self._boundaries[collector]['sequence']:
+                self.stats[collector].projects_done += len(projects)
+                return
+        if self.uses_assets(collector):
+            self._scheduler.submit(self._run_task, collector, sequence, collector.collect_assets, projects, self)
+        else:
+            self._scheduler.submit(self._run_task, collector, sequence, self._collect_group, projects, collector)
+
+    # Tarefa de um grupo de projetos: os projetos com a API do coletor
+    # desabilitada são registrados e pulados, e os demais vão para collect()
+    def _collect_group(self, projects, collector):
+        selected = []
+        for project in projects:
+            project_id = project.get('projectId')
+            if (self.enabled_apis is None or collector.api is None
+                    or self.enabled_apis.is_enabled(project_id, collector.api)):
+                selected.append(project)
+                continue
+            collector.logger.info(f"Projeto '{project_id}' com a API {collector.api} desabilitada; pulado.")
+            with self._lock:
+                self.stats[collector].skipped.append(project_id)
+            yield from collector.skipped_rows(project)
+        if selected:
+            yield from collector.collect(selected, self)
+
+    # Consome as linhas geradas pela tarefa e entrega ao SinkWriter em blocos
+    # de CHUNK_ROWS linhas
+    def _run_task(self, collector, sequence, fn, *args):
+        metrics.set_collector(collector.name)
+        started = time.monotonic()
+        error = None
+        chunk = []
+        try:
+            for row in fn(*args):
+                chunk.append(row)
+                if len(chunk) >= CHUNK_ROWS:
+                    self._writer.put(collector, sequence, chunk)
+                    chunk = []
+        except Exception as e:
+            error = e
+        finally:
+            if chunk:
+                self._writer.put(collector, sequence, chunk)
+            if sequence is not None:
+                self._writer.done(collector, sequence)
+        finished = time.monotonic()
+
+        with self._lock:
+            stats = self.stats[collector]
+            stats.tasks += 1
+            if sequence is not None:
+                # Tarefa de um grupo de projetos: args = (projects, runner)
+                stats.projects_done += len(args[0])
+            stats.busy += finished - started
+            if stats.started is None or started < stats.started:
+                stats.started = started
+            if stats.finished is None or finished > stats.finished:
+                stats.finished = finished
+        return collector, error
+
+    # Lista os projetos uma única vez e envia a cada coletor grupos de até
+    # batch_size projetos. Roda em uma thread própria para buscar a próxima
+    # página enquanto os workers ainda estão ocupados. Os coletores lidos do
+    # Cloud Asset Inventory recebem um único grupo com todos os projetos.
+    # Com o mapa de APIs habilitadas, os projetos são consultados em blocos
+    # de CHECK_BATCH_SIZE em segundo plano (ver EnabledApis.submit) e cada
+    # bloco é distribuído, na ordem da listagem, quando a sua consulta termina.
+    def _produce(self):
+        metrics.set_collector('catalogo')
+        groups = {collector: [] for collector in self.collectors}
+        sequences = dict.fromkeys(self.collectors, 0)
+
+        def submit_group(collector):
+            self._submit_group(collector, sequences[collector], groups[collector])
+            sequences[collector] += 1
+            groups[collector] = []
+
+        def distribute(projects):
+            for project in projects:
+                for collector in self.collectors:
+                    if not collector.accepts(project):
+                        continue
+                    groups[collector].append(project)
+                    if len(groups[collector]) >= self.batch_size and not self.uses_assets(collector):
+                        submit_group(collector)
+
+        # Blocos em consulta, na ordem da listagem: (projetos, Future)
+        checks = deque()
+
+        def distribute_checked(wait):
+            while checks and (wait or checks[0][1].done()):
+                projects, future = checks.popleft()
+                future.result()
+                distribute(projects)
+
+        pending = []
+
+        def check_pending():
+            checks.append((list(pending), self.enabled_apis.submit(self.credentials, list(pending))))
+            pending.clear()
+            # Limita os blocos listados à frente da distribuição
+            if len(checks) > 2 * CHECK_WORKERS:
+                checks[0][1].result()
+            distribute_checked(wait=False)
+
+        resume = self.resume['listing'] if self.resume else None
+        try:
+            for project in self.catalog.iter_projects(self.credentials, resume):
+                with self._lock:
+                    self._listed.append(project)
+                    self.projects_listed += 1
+                if self.enabled_apis is None:
+                    distribute([project])
+                    continue
+                pending.append(project)
+                if len(pending) >= CHECK_BATCH_SIZE:
+                    check_pending()
+            if pending:
+                check_pending()
+            distribute_checked(wait=True)
+        finally:
+            if self.enabled_apis is not None:
+                self.enabled_apis.shutdown()
+
+        for collector in self.collectors:
+            if groups[collector]:
+                submit_group(collector)
+        self.listing = False
+
+    def progress(self):
+        """
+        Estado da varredura para a linha de progresso (ver console.Console).
+        Com vários coletores, os projetos concluídos são a média entre eles.
+        """
+        with self._lock:
+            done = sum(stats.projects_done for stats in self.stats.values())
+            submitted = sum(stats.projects for stats in self.stats.values())
+            rows = sum(stats.rows for stats in self.stats.values())
+        total = self.projects_listed
+        return {
+            'done': round(done / submitted * total) if submitted else 0,
+            'total': total,
+            'listing': self.listing,
+            'rows': rows,
+            'calls': metrics.registry.calls,
+            'elapsed': time.monotonic() - self.started,
+        }
+
+    def _count_rows(self, collector, rows):
+        with self._lock:
+            self.stats[collector].rows += rows
+
+    # Grava o checkpoint com o ponto da listagem e os pontos do SinkWriter.
+    # Chamado pela thread do SinkWriter e, ao final, pela thread principal.
+    def _save_checkpoint(self, boundaries):
+        with self._lock:
+            position = self.catalog.position
+            listed = self._listed[:position['count']]
+        self.checkpoint.save({
+            'listing': {'projects': listed, 'page_token': position['page_token'], 'done': position['done']},
+            'collectors': {collector.name: boundary for collector, boundary in boundaries.items()},
+        })
+
+    def _finish_checkpoint(self):
+        if self.completed:
+            self.checkpoint.remove()
+        elif self._writer is not None:
+            self._save_checkpoint(self._writer.boundaries)
+            self.output.message(f"Varredura interrompida; checkpoint gravado em {self.checkpoint.path}. "
+                                "Use --resume para continuar.", always=True)
+
+    def run(self, sinks):
+        """
+        Executa a varredura, gravando as linhas em 'sinks' (ver sinks.build_sinks).
+        Com um checkpoint e apenas destinos que podem ser retomados, grava
+        checkpoints periódicos e, se a varredura for interrompida, um final.
+        """
+        self.started = time.monotonic()
+        on_checkpoint = None
+        if self.checkpoint is not None and all(sink.resumable for sink in sinks):
+            on_checkpoint = self._save_checkpoint
+        with ExitStack() as stack:
+            if on_checkpoint is not None:
+                # Executado depois do fechamento do SinkWriter
+                stack.callback(self._finish_checkpoint)
+            # Fechado por último: grava os blocos pendentes depois que todas as tarefas terminam
+            self._writer = stack.enter_context(SinkWriter(sinks, self.collectors, self._count_rows,
+                                                          resume=self._boundaries,
+                                                          on_checkpoint=on_checkpoint,
+                                                          checkpoint_interval=CHECKPOINT_INTERVAL))
+            stack.callback(self.output.stop_progress)
+            self.output.start_progress(self.progress)
+            self._scheduler = stack.enter_context(BoundedScheduler(max_workers=self.workers))
+            self._scheduler.start_producer(self._produce)
+            for future in self._scheduler.as_completed():
+                collector, error = future.result()
+                if error is not None:
+                    collector.log_fetch_error("processar o resultado de uma tarefa", error)
+            self.completed = True
+
+        if self.projects_listed == 0:
+            self.logger.info("Nenhum projeto encontrado ou sua conta não tem permissão para listar projetos.")
+
+    def stats_report(self):
+        """
+        Returns:
+            dict: Os contadores de cada coletor, para o relatório de métricas.
+        """
+        return {collector.name: {'projects': stats.projects, 'rows': stats.rows, 'tasks': stats.tasks,
+                                 'busy_seconds': round(stats.busy, 3),
+                                 'duration_seconds': round(stats.duration, 3),
+                                 'failed_calls': len(collector.failed_calls),
+                                 'skipped': len(stats.skipped),
+                                 'skipped_projects': sorted(stats.skipped)}
+                for collector, stats in self.stats.items()}
+
+    def print_summary(self):
+        self.output.message(summary_format.
+            format(*summary_list))
+        self.output.message('---' * 26)
+        for collector in self.collectors:
+            stats = self.stats[collector]
+            row = [collector.name, stats.projects, stats.rows, stats.tasks,
+                   f"{stats.busy:.1f}s", f"{stats.duration:.1f}s", len(collector.failed_calls), len(stats.skipped)]
+            self.output.message(summary_format.
+                format(*row))
+            self.logger.info(f"Resumo: {row}")
+
+def checkpoint_options(args, collectors, catalog, sinks):
+    """
+    Opções que definem os grupos de projetos e a saída; um checkpoint só
+    pode ser retomado com as mesmas opções.
+    """
+    return {
+        'collectors': [collector.name for collector in collectors],
+        'ordered': [collector.name for collector in collectors if collector.ordered],
+        'batch_size': args.batch_size,
+        'engine': args.engine,
+        'projects': os.path.basename(catalog.cache_path()),
+        'sinks': [sink_key(sink) for sink in sinks],
+    }
+
+def print_changes(report, logger):
+    for name, changes in report.items():
+        if changes['file'] is None:
+            time_now(logger, f"Sem varredura anterior de '{name}' para comparar; o retrato atual foi gravado.")
+        else:
+            time_now(logger, f"Mudanças em '{name}': {changes['added']} novos, {changes['removed']} removidos, "
+                             f"{changes['modified']} alterados ({changes['file']})")
+
+def run_inventory(collectors, args, logger):
+    """
+    Executa a varredura completa: controle de taxa, credenciais, listagem
+    única dos projetos selecionados (ver projects.ProjectCatalog), coletores,
+    resumo de tempos por coletor e relatórios de métricas das chamadas.
+
+    Args:
+        collectors (list): Coletores selecionados.
+        args (argparse.Namespace): Opções de linha de comando (ver cli.build_parser).
+        logger (logging.Logger): Logger da varredura.
+    """
+    rate_limit.configure(rates=dict(args.rate), max_concurrency=args.workers, hedge=args.hedge,
+                         logger=logger)
+    transport.configure(pool_size=args.pool_size or args.workers, timeout=args.call_timeout)
+    output = console.configure(args.console)
+    metrics.reset()
+    set_log_level({logger, *(collector.logger for collector in collectors)}, args.log_level)
+    time_now(logger, 'Script iniciado')
+
+    credentials = get_credentials(args.auth, args.credentials_file)
+    if not credentials:
+        logger.error("ERRO: Não foi possível obter as credenciais do usuário. Saindo do script.")
+        sys.exit(1)
+
+    asset_scope = None
+    if args.engine == 'assets':
+        if not args.asset_scope:
+            logger.error("ERRO: --engine assets exige o escopo da leitura em --asset-scope. Saindo do script.")
+            sys.exit(1)
+        asset_scope = args.asset_scope
+
+    try:
+        for collector in collectors:
+            collector.configure(args)
+            if args.lifecycle_state:
+                collector.lifecycle_state = args.lifecycle_state
+        # Com estados diferentes entre os coletores (ex.: projetos e VMs no
+        # inventário) a listagem traz todos e cada coletor filtra os seus
+        states = {collector.lifecycle_state for collector in collectors}
+        catalog = ProjectCatalog.from_args(args, logger, states.pop() if len(states) == 1 else 'ALL')
+        sinks = build_sinks(args, output)
+        checkpoint = Checkpoint(logger.name, checkpoint_options(args, collectors, catalog, sinks))
+        resume = None
+        if args.resume:
+            if args.changes or not all(sink.resumable for sink in sinks):
+                logger.error("ERRO: --resume não pode ser usado com --changes nem com os destinos parquet e arrow.")
+                sys.exit(1)
+            resume = checkpoint.load()
+            if resume is None:
+                logger.error(f"ERRO: Nenhum checkpoint com as mesmas opções em {checkpoint.path}. Saindo do script.")
+                sys.exit(1)
+            saved = datetime.datetime.fromtimestamp(resume['saved']).strftime("%d-%m-%Y %H:%M:%S")
+            time_now(logger, f"Retomando a varredura a partir do checkpoint de {saved}.")
+        # APIs chamadas por projeto (os coletores lidos do Cloud Asset Inventory não chamam nenhuma)
+        apis = {collector.api for collector in collectors
+                if collector.api is not None and not (asset_scope and collector.asset_type)}
+        enabled_apis = EnabledApis(apis, args.apis_ttl, logger=logger) if args.api_check and apis else None
+        runner = InventoryRunner(collectors, catalog, credentials, args.workers, args.batch_size, logger, output,
+                                 checkpoint, resume, asset_scope, enabled_apis)
+
+        time_now(logger, "Iniciando a varredura de projetos...")
+        change_set = ChangeSetSink(runner) if args.changes else None
+        if change_set is not None:
+            sinks.append(change_set)
+        runner.run(sinks)
+        time_now(logger, "Varredura de projetos concluída.")
+        if enabled_apis is not None:
+            enabled_apis.save_cache()
+            time_now(logger, f"APIs habilitadas: {enabled_apis.checked} projetos consultados, "
+                             f"{enabled_apis.cached} do mapa em disco.")
+
+        runner.print_summary()
+        calls = metrics.registry
+        if args.hedge or calls.timeouts:
+            time_now(logger, f"Chamadas com prazo estourado: {calls.timeouts}; cópias (hedge) enviadas: "
+                             f"{calls.hedges}, {calls.hedges_won} responderam primeiro.")
+        if change_set is not None:
+            print_changes(change_set.report, logger)
+        extra = {
+            'projects_listed': runner.projects_listed,
+            'collector_stats': runner.stats_report(),
+        }
+        if change_set is not None:
+            extra['changes'] = change_set.report
+        if enabled_apis is not None:
+            extra['enabled_apis'] = {'checked': enabled_apis.checked, 'cached': enabled_apis.cached}
+        json_path, prom_path = metrics.write_reports(args, logger.name, extra)
+        logger.info(f"Métricas das chamadas gravadas em {json_path} e {prom_path}")
+        for collector in collectors:
+            if collector.failed_calls:
+                time_now(logger, f"ATENÇÃO: {len(collector.failed_calls)} chamadas de '{collector.name}' "
+                                 "falharam e o inventário pode estar incompleto. Veja o log.", always=True)
+
+    except KeyboardInterrupt:
+        logger.error("\nVarredura interrompida pelo usuário.")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"\nERRO FATAL DURANTE A EXECUÇÃO DO SCRIPT: {e}")
+        sys.exit(1)
+
+    time_now(logger, 'Script finalizado')
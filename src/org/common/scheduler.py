@@ -0,0 +1,121 @@
+# Script com o agendador de tarefas concorrentes da varredura
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/scheduler.py
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 32
+
+# Marcador colocado na fila de resultados quando o produtor termina
+_CLOSED = object()
+
+class BoundedScheduler:
+    """
+    Agendador único e de longa duração para toda a varredura.
+
+    Mantém um só pool de threads com limite global de concorrência. As tarefas
+    enviadas pelo produtor (ex.: um projeto) são limitadas por 'max_pending',
+    o que segura a paginação de projetos quando os workers estão ocupados.
+    Subtarefas enviadas de dentro de um worker (ex.: uma zona de um projeto)
+    usam bounded=False para nunca bloquear um worker esperando vaga.
+
+    Args:
+        max_workers (int): Número máximo de threads executando ao mesmo tempo.
+        max_pending (int, optional): Número máximo de tarefas do produtor
+                                     aguardando ou em execução. Se None,
+                                     usa o dobro de max_workers.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_pending=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='inventory')
+        self._slots = threading.BoundedSemaphore(max_pending or max_workers * 2)
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._sequence = 0
+        self._producer = None
+        self._producer_error = None
+
+    def submit(self, fn, *args, bounded=True, **kwargs):
+        if bounded:
+            self._slots.acquire()
+        with self._lock:
+            self._submitted += 1
+            sequence = self._sequence
+            self._sequence += 1
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.sequence = sequence
+        future.add_done_callback(lambda f: self._on_done(f, bounded))
+        return future
+
+    def _on_done(self, future, bounded):
+        if bounded:
+            self._slots.release()
+        self._results.put(future)
+
+    def start_producer(self, fn, *args, **kwargs):
+        """
+        Executa 'fn' em uma thread própria, que envia tarefas com submit().
+        Ao final do produtor o agendador é fechado e as_completed() termina
+        assim que todas as tarefas enviadas forem consumidas.
+        """
+        def run():
+            try:
+                fn(*args, **kwargs)
+            except BaseException as e:
+                self._producer_error = e
+            finally:
+                self._results.put(_CLOSED)
+
+        self._producer = threading.Thread(target=run, name='inventory-producer', daemon=True)
+        self._producer.start()
+
+    def as_completed(self, ordered=False):
+        """
+        Gera as futures na ordem em que terminam, incluindo as subtarefas
+        enviadas pelas próprias tarefas. Levanta o erro do produtor, se houver.
+
+        Args:
+            ordered (bool): Se True, gera as futures na ordem de envio, segurando
+                            as que terminaram antes das anteriores. A saída fica
+                            determinística sem esperar o fim da varredura.
+        """
+        consumed = 0
+        closed = self._producer is None
+        waiting = {}
+        next_sequence = 0
+        while True:
+            with self._lock:
+                if closed and consumed == self._submitted:
+                    break
+            item = self._results.get()
+            if item is _CLOSED:
+                closed = True
+                continue
+            consumed += 1
+            if not ordered:
+                yield item
+                continue
+
+            waiting[item.sequence] = item
+            while next_sequence in waiting:
+                yield waiting.pop(next_sequence)
+                next_sequence += 1
+
+        if self._producer_error is not None:
+            raise self._producer_error
+
+    def shutdown(self, wait=True):
+        # Em caso de erro, descarta as tarefas que ainda não começaram
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=exc_type is None)
+        return False
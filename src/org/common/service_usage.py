@@ -0,0 +1,188 @@
+# Script com o mapa das APIs habilitadas em cada projeto
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/service_usage.py
+#
+# Antes de enviar um projeto aos coletores, o executor consulta na Service
+# Usage API (services.batchGet, com os projetos agrupados em lotes) se as
+# APIs usadas pelos coletores (Compute, GKE, SQL Admin) estão habilitadas.
+# Cada coletor recebe apenas os projetos com a sua API habilitada; os demais
+# são registrados como pulados no resumo e nas métricas, sem nenhuma chamada
+# que terminaria em 403.
+#
+# As consultas rodam em threads próprias (ver EnabledApis.submit): enquanto
+# um bloco de projetos é consultado, a listagem continua e os blocos já
+# consultados seguem para os coletores.
+#
+# O resultado fica salvo em disco (cache/enabled-apis.json) por um tempo
+# configurável. Se a consulta de um projeto falha (ex.: sem a permissão
+# serviceusage.services.get), o projeto é enviado aos coletores como antes.
+#
+# Documentation
+# https://cloud.google.com/service-usage/docs/reference/rest/v1/services/batchGet
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.org.common import metrics, rate_limit
+from src.org.common.batch import chunked, execute_batch
+from src.org.common.clients import get_service
+from src.org.common.metrics import write_atomic
+
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+CACHE_PATH = os.path.join(BASE_DIR, 'cache', 'enabled-apis.json')
+
+# Validade padrão do mapa em disco, em segundos
+DEFAULT_CACHE_TTL = 21600
+
+# Projetos por lote (batch HTTP) de services.batchGet
+CHECK_BATCH_SIZE = 100
+# Blocos de projetos consultados ao mesmo tempo
+CHECK_WORKERS = 4
+
+SERVICES_FIELDS = 'services(name,state)'
+
+def add_arguments(parser):
+    """
+    Adiciona as opções da consulta de APIs habilitadas ao parser.
+    """
+    group = parser.add_argument_group('APIs habilitadas')
+    group.add_argument('--apis-ttl', type=int, default=DEFAULT_CACHE_TTL, metavar='SEGUNDOS',
+                       help='Validade do mapa de APIs habilitadas por projeto em disco; 0 desativa '
+                            f'(padrão: {DEFAULT_CACHE_TTL}).')
+    group.add_argument('--no-api-check', dest='api_check', action='store_false',
+                       help='Não consulta as APIs habilitadas; todos os projetos vão para todos os coletores.')
+
+class EnabledApis:
+    """
+    APIs habilitadas por projeto, consultadas uma única vez por projeto e
+    compartilhadas por todos os coletores.
+
+    Args:
+        apis (iterable): Serviços consultados (ex.: 'compute.googleapis.com').
+        ttl (int): Validade do mapa em disco, em segundos; 0 desativa.
+        cache_path (str): Caminho do mapa em disco.
+        logger (logging.Logger, optional): Logger da varredura.
+    """
+
+    def __init__(self, apis, ttl=DEFAULT_CACHE_TTL, cache_path=CACHE_PATH, logger=None):
+        self.apis = sorted(set(apis))
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self.logger = logger
+        # {projectId: {'checked': horário, 'services': {api: habilitada}}}
+        self._projects = self.load_cache()
+        self._lock = threading.Lock()
+        # Projetos consultados na API e encontrados no mapa em disco
+        self.checked = 0
+        self.cached = 0
+        self._executor = None
+
+    def load_cache(self):
+        if self.ttl <= 0:
+            return {}
+        try:
+            with open(self.cache_path, encoding='utf-8') as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        return cached.get('projects', {})
+
+    def save_cache(self):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            projects = dict(self._projects)
+        write_atomic(self.cache_path, json.dumps({'created': time.time(), 'projects': projects}))
+
+    def _known(self, project_id, now):
+        entry = self._projects.get(project_id)
+        return (entry is not None and now - entry['checked'] <= self.ttl
+                and all(api in entry['services'] for api in self.apis))
+
+    def check(self, credentials, projects):
+        """
+        Consulta as APIs dos projetos que ainda não estão no mapa (ou que
+        venceram), em lotes de services.batchGet.
+
+        Args:
+            credentials: Credenciais da varredura.
+            projects (list): Projetos (dicts de projects.list).
+        """
+        now = time.time()
+        with self._lock:
+            missing = [project for project in projects if not self._known(project['projectId'], now)]
+            self.cached += len(projects) - len(missing)
+        if not missing:
+            return
+
+        service = get_service('serviceusage', 'v1', credentials)
+        for group in chunked(missing, CHECK_BATCH_SIZE):
+            found = {}
+
+            def on_response(project_id, response, exception):
+                if exception is not None:
+                    self._log(f"  AVISO: Não foi possível consultar as APIs habilitadas do projeto '{project_id}' "
+                              f"({rate_limit.describe_error(exception)}); o projeto segue para todos os coletores.")
+                    return
+                found[project_id] = {service_state['name'].split('/')[-1]: service_state.get('state') == 'ENABLED'
+                                     for service_state in response.get('services', [])}
+
+            requests = []
+            for project in group:
+                # A Service Usage identifica o projeto pelo número; o ID também é aceito
+                parent = f"projects/{project.get('projectNumber') or project['projectId']}"
+                # As APIs já guardadas do projeto (de outros coletores) são consultadas de novo junto
+                with self._lock:
+                    apis = set(self.apis).union(self._projects.get(project['projectId'], {}).get('services', ()))
+                requests.append((project['projectId'], service.services().batchGet(
+                    parent=parent, names=[f'{parent}/services/{api}' for api in sorted(apis)], fields=SERVICES_FIELDS)))
+            try:
+                execute_batch(service, requests, on_response)
+            except Exception as e:
+                self._log(f"  AVISO: Falha ao consultar as APIs habilitadas de {len(group)} projetos "
+                          f"({rate_limit.describe_error(e)}); eles seguem para todos os coletores.")
+            with self._lock:
+                self.checked += len(found)
+                for project_id, services in found.items():
+                    self._projects[project_id] = {'checked': now, 'services': services}
+
+    def submit(self, credentials, projects):
+        """
+        Consulta os projetos (ver check()) em uma thread própria.
+
+        Returns:
+            concurrent.futures.Future: Concluído quando o mapa tem o resultado
+                dos projetos.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=CHECK_WORKERS, thread_name_prefix='service-usage')
+        return self._executor.submit(self._check_task, credentials, projects)
+
+    def _check_task(self, credentials, projects):
+        metrics.set_collector('catalogo')
+        self.check(credentials, projects)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def is_enabled(self, project_id, api):
+        """
+        Returns:
+            bool: False apenas quando a API está comprovadamente desabilitada
+                  no projeto; sem consulta válida, True.
+        """
+        with self._lock:
+            entry = self._projects.get(project_id)
+        if entry is None:
+            return True
+        return entry['services'].get(api, True)
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.warning(message)
@@ -0,0 +1,613 @@
+# Script com os destinos das linhas do inventário (CSV, Parquet, Arrow, SQLite, console, log)
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/sinks.py
+#
+# Os coletores geram as linhas (collect() é um gerador) e não sabem para onde
+# elas vão. As tarefas entregam as linhas em blocos de CHUNK_ROWS a uma fila
+# limitada e uma única thread (SinkWriter) grava cada bloco em todos os
+# destinos. Quando a gravação fica para trás, os workers esperam vaga na fila,
+# o que mantém a memória estável qualquer que seja o tamanho da organização.
+#
+# Um novo formato de saída é uma subclasse de Sink registrada em SINKS, sem
+# alterar os coletores.
+#
+# Para os checkpoints da varredura (ver checkpoint.py) o SinkWriter guarda o
+# estado de cada destino (ex.: a posição no CSV) sempre que um grupo de
+# projetos de um coletor ordenado termina de ser gravado. Ao retomar, cada
+# destino volta a esse estado (restore) antes de abrir.
+#
+# O destino SQLite usa o sqlite3 da biblioteca padrão. Os destinos Parquet e
+# Arrow dependem do pyarrow (opcional):
+# pip install -U pyarrow
+
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from src.org.common.logger_config import ROW
+
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+DEFAULT_SQLITE_PATH = os.path.join(BASE_DIR, 'csv', 'inventory.sqlite')
+
+# Linhas por bloco entregue ao SinkWriter
+CHUNK_ROWS = 500
+# Blocos aguardando gravação antes de os workers esperarem
+MAX_PENDING_CHUNKS = 64
+# Blocos de grupos adiantados guardados por coletor ordenado antes de os
+# workers desses grupos esperarem o grupo atual ser gravado
+MAX_WAITING_CHUNKS = 64
+
+# Linhas por row group (Parquet) ou record batch (Arrow)
+ROW_GROUP_ROWS = 10000
+
+# Intervalo em segundos entre as verificações de fechamento ao esperar vaga na fila
+PUT_TIMEOUT = 1.0
+
+# Marcadores da fila do SinkWriter
+_DONE = object()
+_CLOSED = object()
+
+class _Ahead:
+    """
+    Bloco de um grupo adiantado, contado em SinkWriter._ahead até ser gravado.
+    """
+
+    __slots__ = ('rows',)
+
+    def __init__(self, rows):
+        self.rows = rows
+
+class Sink:
+    """
+    Base dos destinos das linhas. Os métodos são chamados apenas pela thread
+    do SinkWriter.
+    """
+
+    # Nome usado em --sink (apenas para os destinos em arquivo)
+    name = None
+    # Se o destino pode continuar a gravação de uma varredura interrompida
+    resumable = True
+
+    def restore(self, collector, state):
+        """
+        Volta ao estado salvo por checkpoint() antes de abrir o destino do
+        coletor em uma varredura retomada.
+        """
+
+    def checkpoint(self, collector):
+        """
+        Returns:
+            dict: O estado do destino do coletor depois das linhas já
+                  gravadas, para restore(); None se não há estado.
+        """
+        return None
+
+    def open(self, collector):
+        """
+        Prepara o destino das linhas de um coletor (ex.: abre o arquivo e
+        grava o cabeçalho).
+        """
+
+    def write(self, collector, rows):
+        """
+        Grava um bloco de linhas de um coletor.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Finaliza o destino ao fim da varredura (ex.: fecha os arquivos).
+        """
+
+class CsvSink(Sink):
+    """
+    Um CSV por coletor, no caminho Collector.filename.
+    """
+
+    name = 'csv'
+
+    def __init__(self, args=None):
+        self._files = {}
+        self._writers = {}
+        self._offsets = {}
+
+    def restore(self, collector, state):
+        self._offsets[collector] = state['offset']
+
+    def checkpoint(self, collector):
+        csvfile = self._files[collector]
+        csvfile.flush()
+        return {'offset': csvfile.tell()}
+
+    def open(self, collector):
+        offset = self._offsets.get(collector)
+        if offset is not None:
+            # Descarta as linhas gravadas depois do checkpoint e continua o arquivo
+            os.truncate(collector.filename, offset)
+        # 'newline=' é importante para evitar linhas em branco
+        csvfile = open(collector.filename, 'w' if offset is None else 'a', newline='', encoding='utf-8')
+        self._files[collector] = csvfile
+        self._writers[collector] = csv.writer(csvfile, delimiter=';')
+        if offset is None:
+            self._writers[collector].writerow(collector.record.headers)
+
+    def write(self, collector, rows):
+        self._writers[collector].writerows(map(collector.record.report_values, rows))
+
+    def close(self):
+        for csvfile in self._files.values():
+            csvfile.close()
+
+class ParquetSink(Sink):
+    """
+    Um arquivo Parquet por coletor, ao lado do CSV (ex.: csv/lista_GCP_VM.parquet),
+    com colunas tipadas conforme records.Column.kind. As linhas são gravadas
+    em row groups de ROW_GROUP_ROWS à medida que chegam.
+    """
+
+    name = 'parquet'
+    extension = '.parquet'
+    # O arquivo só fica válido quando fechado, então não há como continuá-lo
+    resumable = False
+    # Dependência opcional exigida pelo destino
+    requires = 'pyarrow'
+
+    def __init__(self, args=None):
+        import pyarrow
+        self.pyarrow = pyarrow
+        self._writers = {}
+        self._schemas = {}
+        self._buffers = {}
+
+    def file_path(self, collector):
+        return os.path.splitext(collector.filename)[0] + self.extension
+
+    def schema(self, record):
+        types = {
+            'str': self.pyarrow.string(),
+            'int': self.pyarrow.int64(),
+            'list': self.pyarrow.list_(self.pyarrow.string()),
+        }
+        return self.pyarrow.schema([(column.field, types[column.kind]) for column in record.columns])
+
+    def new_writer(self, file_path, schema):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(file_path, schema)
+
+    def open(self, collector):
+        self._schemas[collector] = self.schema(collector.record)
+        self._writers[collector] = self.new_writer(self.file_path(collector), self._schemas[collector])
+        self._buffers[collector] = []
+
+    def write(self, collector, rows):
+        buffer = self._buffers[collector]
+        buffer.extend(rows)
+        if len(buffer) >= ROW_GROUP_ROWS:
+            self.flush(collector)
+
+    def flush(self, collector):
+        rows = self._buffers[collector]
+        if not rows:
+            return
+        self._buffers[collector] = []
+        schema = self._schemas[collector]
+        arrays = [self.pyarrow.array([convert_value(value, column.kind) for value in values], type=field.type)
+                  for column, field, values in zip(collector.record.columns, schema, zip(*rows))]
+        self._writers[collector].write_batch(self.pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+
+    def close(self):
+        for collector, writer in self._writers.items():
+            try:
+                self.flush(collector)
+            finally:
+                writer.close()
+
+class ArrowSink(ParquetSink):
+    """
+    Um arquivo Arrow IPC por coletor (ex.: csv/lista_GCP_VM.arrow), gravado
+    em record batches de ROW_GROUP_ROWS.
+    """
+
+    name = 'arrow'
+    extension = '.arrow'
+
+    def new_writer(self, file_path, schema):
+        return self.pyarrow.ipc.new_file(file_path, schema)
+
+class SqliteSink(Sink):
+    """
+    Banco SQLite com uma tabela por tipo de registro (ex.: 'vm', 'node_pool'),
+    chaveada pelo self_link do recurso. Cada varredura ganha uma linha na
+    tabela 'scans' e as linhas encontradas são inseridas ou atualizadas
+    (upsert) com o scan_id e o horário da varredura; recursos que não
+    aparecem mais ficam com o scan_id de uma varredura anterior. Cada bloco
+    de linhas é gravado em uma única transação, com o banco em modo WAL
+    para que consultas possam ler durante a gravação.
+    """
+
+    name = 'sqlite'
+
+    # Tipos das colunas no SQLite conforme records.Column.kind; listas vão como JSON
+    TYPES = {'str': 'TEXT', 'int': 'INTEGER', 'list': 'TEXT'}
+
+    def __init__(self, args=None):
+        self.path = getattr(args, 'sqlite_path', None) or DEFAULT_SQLITE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # A conexão é criada aqui e usada depois apenas pela thread do SinkWriter
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.scanned_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS scans ('
+                                    'scan_id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                                    'started TEXT NOT NULL, finished TEXT, collectors TEXT, row_count INTEGER)')
+        self.scan_id = None
+        self._statements = {}
+        self._rows = {}
+
+    def restore(self, collector, state):
+        # A varredura retomada continua com o mesmo scan_id; as linhas já
+        # gravadas são apenas atualizadas de novo
+        self.scan_id = state['scan_id']
+        self._rows[collector.name] = state['rows']
+
+    def checkpoint(self, collector):
+        return {'scan_id': self.scan_id, 'rows': self._rows[collector.name]}
+
+    def open(self, collector):
+        if self.scan_id is None:
+            with self.connection:
+                self.scan_id = self.connection.execute('INSERT INTO scans (started) VALUES (?)',
+                                                       (self.scanned_at,)).lastrowid
+        record = collector.record
+        if record.table not in self._statements:
+            self.create_table(record)
+            self._statements[record.table] = self.upsert_statement(record)
+        self._rows.setdefault(collector.name, 0)
+
+    def create_table(self, record):
+        table = quote(record.table)
+        columns = [f'{quote(column.field)} {self.TYPES[column.kind]}'
+                   for column in record.columns if column.field != 'self_link']
+        with self.connection:
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS {table} ('
+                                    'self_link TEXT PRIMARY KEY, '
+                                    f'{", ".join(columns)}, '
+                                    'scan_id INTEGER NOT NULL, scanned_at TEXT NOT NULL, first_scan_id INTEGER NOT NULL)')
+            # Colunas novas de um registro em um banco de uma versão anterior
+            existing = {row[1] for row in self.connection.execute(f'PRAGMA table_info({table})')}
+            for column in record.columns:
+                if column.field not in existing:
+                    self.connection.execute(f'ALTER TABLE {table} ADD COLUMN '
+                                            f'{quote(column.field)} {self.TYPES[column.kind]}')
+            for field in [column.field for column in record.columns if column.indexed] + ['scan_id']:
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS {quote(f"{record.table}_{field}")} '
+                                        f'ON {table} ({quote(field)})')
+
+    def upsert_statement(self, record):
+        fields = [column.field for column in record.columns] + ['scan_id', 'scanned_at', 'first_scan_id']
+        updates = [field for field in fields if field not in ('self_link', 'first_scan_id')]
+        return (f'INSERT INTO {quote(record.table)} ({", ".join(map(quote, fields))}) '
+                f'VALUES ({", ".join("?" * len(fields))}) '
+                f'ON CONFLICT(self_link) DO UPDATE SET '
+                f'{", ".join(f"{quote(field)} = excluded.{quote(field)}" for field in updates)}')
+
+    def write(self, collector, rows):
+        columns = collector.record.columns
+        values = [[sqlite_value(value, column.kind) for column, value in zip(columns, row)]
+                  + [self.scan_id, self.scanned_at, self.scan_id]
+                  for row in rows]
+        with self.connection:
+            self.connection.executemany(self._statements[collector.record.table], values)
+        self._rows[collector.name] += len(rows)
+
+    def close(self):
+        try:
+            if self.scan_id is None:
+                return
+            with self.connection:
+                self.connection.execute('UPDATE scans SET finished = ?, collectors = ?, row_count = ? WHERE scan_id = ?',
+                                        (time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                                         ','.join(self._rows), sum(self._rows.values()), self.scan_id))
+        finally:
+            self.connection.close()
+
+def quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+def sqlite_value(value, kind):
+    value = convert_value(value, kind)
+    return json.dumps(value) if kind == 'list' else value
+
+def convert_value(value, kind):
+    """
+    Converte o valor de uma coluna para o tipo das saídas colunares. Valores
+    vazios de colunas inteiras viram nulos.
+    """
+    if kind == 'int':
+        return int(value) if value not in ('', None) else None
+    if kind == 'list':
+        return list(value) if value else []
+    return None if value is None else str(value)
+
+class ConsoleSink(Sink):
+    """
+    Tabela de linhas no console (apenas com --rows; ver console.Console).
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self._counts = {}
+
+    def restore(self, collector, state):
+        self._counts[collector] = state['count']
+
+    def checkpoint(self, collector):
+        return {'count': self._counts[collector]}
+
+    def open(self, collector):
+        self._counts.setdefault(collector, 1)
+        self.output.header(collector)
+
+    def write(self, collector, rows):
+        if self.output.mode != 'rows':
+            return
+        for row in rows:
+            self.output.row(collector, self._counts[collector], row)
+            self._counts[collector] += 1
+
+class LogSink(Sink):
+    """
+    Cada linha no log do coletor, no nível ROW (desligado com --log-level INFO).
+    """
+
+    def write(self, collector, rows):
+        if not collector.logger.isEnabledFor(ROW):
+            return
+        for row in rows:
+            collector.logger.log(ROW, row)
+
+# Destinos em arquivo que podem ser escolhidos com --sink
+SINKS = {sink.name: sink for sink in (CsvSink, ParquetSink, ArrowSink, SqliteSink)}
+DEFAULT_SINKS = ('csv',)
+
+def sinks_type(value):
+    """
+    Valida a lista de destinos informada em --sink (argparse).
+    """
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SINKS]
+    if not names or unknown:
+        raise argparse.ArgumentTypeError(f"destinos válidos: {', '.join(SINKS)}")
+    for name in names:
+        requires = getattr(SINKS[name], 'requires', None)
+        if requires and importlib.util.find_spec(requires) is None:
+            raise argparse.ArgumentTypeError(f"o destino '{name}' precisa do pacote {requires} "
+                                             f"(pip install -U {requires})")
+    return names
+
+def add_arguments(parser):
+    """
+    Adiciona a escolha dos destinos das linhas ao parser.
+    """
+    parser.add_argument('--sink', type=sinks_type, default=list(DEFAULT_SINKS),
+                        help=f"Destinos das linhas separados por vírgula (padrão: {','.join(DEFAULT_SINKS)}; "
+                             f"disponíveis: {','.join(SINKS)}).")
+    parser.add_argument('--sqlite-path', metavar='ARQUIVO',
+                        help='Banco do destino sqlite (padrão: csv/inventory.sqlite).')
+
+def build_sinks(args, output):
+    """
+    Cria os destinos da varredura: os escolhidos em --sink, o console e o log.
+    """
+    return [SINKS[name](args) for name in args.sink] + [ConsoleSink(output), LogSink()]
+
+def sink_key(sink):
+    # Chave do estado de um destino nos checkpoints
+    return type(sink).__name__
+
+class SinkWriter:
+    """
+    Thread única que grava os blocos de linhas das tarefas em todos os destinos.
+
+    As linhas de coletores com 'ordered' saem na ordem dos grupos de projetos:
+    blocos de um grupo que terminou antes dos anteriores esperam até que
+    esses terminem (ver done()). Esses blocos adiantados são limitados a
+    max_waiting por coletor: além disso, put() espera até o grupo atual ser
+    gravado, então um projeto lento não acumula os grupos seguintes na
+    memória. As subtarefas (sequence None) são gravadas assim que chegam.
+
+    Com checkpoints, 'boundaries' guarda para cada coletor ordenado o último
+    ponto em que todos os grupos anteriores estavam gravados: o próximo
+    grupo, as linhas gravadas e o estado de cada destino (Sink.checkpoint).
+
+    Args:
+        sinks (list): Destinos das linhas.
+        collectors (list): Coletores da varredura.
+        on_rows (callable, optional): Chamado como on_rows(coletor, n) depois
+            de cada bloco gravado.
+        max_pending (int): Blocos aguardando gravação antes de put() esperar.
+        max_waiting (int): Blocos de grupos adiantados guardados por coletor
+            ordenado antes de put() esperar.
+        resume (dict, optional): Os pontos de um checkpoint por coletor; os
+            destinos voltam a eles e a gravação continua do grupo seguinte.
+        on_checkpoint (callable, optional): Chamado pela thread do SinkWriter
+            como on_checkpoint(boundaries) a cada checkpoint_interval segundos.
+        checkpoint_interval (float): Intervalo entre as chamadas de on_checkpoint.
+    """
+
+    def __init__(self, sinks, collectors, on_rows=None, max_pending=MAX_PENDING_CHUNKS,
+                 resume=None, on_checkpoint=None, checkpoint_interval=0.0,
+                 max_waiting=MAX_WAITING_CHUNKS):
+        self.sinks = sinks
+        self.collectors = collectors
+        self.on_rows = on_rows
+        self.on_checkpoint = on_checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.max_waiting = max_waiting
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._closed = threading.Event()
+        self._error = None
+        # Blocos e grupos concluídos que chegaram antes dos grupos anteriores
+        self._waiting = {collector: {} for collector in collectors}
+        self._finished = {collector: set() for collector in collectors}
+        # Blocos entregues por grupos adiantados e ainda não gravados; protegido por _order
+        self._ahead = dict.fromkeys(collectors, 0)
+        self._order = threading.Condition()
+        resume = resume or {}
+        self.boundaries = {collector: resume.get(collector, {'sequence': 0, 'rows': 0, 'sinks': {}})
+                           for collector in collectors}
+        self._next_sequence = {collector: self.boundaries[collector]['sequence'] for collector in collectors}
+        self._rows = {collector: self.boundaries[collector]['rows'] for collector in collectors}
+        self._checkpointed = time.monotonic()
+
+    def put(self, collector, sequence, rows):
+        """
+        Entrega um bloco de linhas, esperando vaga na fila se necessário. O
+        bloco de um grupo adiantado de um coletor ordenado espera também vaga
+        entre os blocos adiantados.
+        """
+        if sequence is not None and collector.ordered:
+            with self._order:
+                while (sequence > self._next_sequence[collector] and self._ahead[collector] >= self.max_waiting
+                       and self._error is None and not self._closed.is_set()):
+                    self._order.wait(PUT_TIMEOUT)
+                if sequence > self._next_sequence[collector]:
+                    self._ahead[collector] += 1
+                    rows = _Ahead(rows)
+        self._put((collector, sequence, rows))
+
+    def done(self, collector, sequence):
+        """
+        Indica que o grupo 'sequence' do coletor não tem mais linhas.
+        """
+        self._put((collector, sequence, _DONE))
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    def start(self):
+        for sink in self.sinks:
+            for collector in self.collectors:
+                state = self.boundaries[collector]['sinks'].get(sink_key(sink))
+                if state is not None:
+                    sink.restore(collector, state)
+                sink.open(collector)
+        self._thread = threading.Thread(target=self._run, name='inventory-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """
+        Grava os blocos pendentes, fecha os destinos e levanta o erro de
+        gravação, se houver.
+        """
+        self._queue.put(_CLOSED)
+        self._thread.join()
+        self._closed.set()
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                self._error = self._error or e
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _CLOSED:
+                return
+            if self._error is not None:
+                # Depois de um erro a fila continua sendo esvaziada para não travar os workers
+                continue
+            try:
+                self._handle(*item)
+                if (self.on_checkpoint is not None and
+                        time.monotonic() - self._checkpointed >= self.checkpoint_interval):
+                    self._checkpointed = time.monotonic()
+                    self.on_checkpoint(self.boundaries)
+            except Exception as e:
+                self._error = e
+
+    def _handle(self, collector, sequence, rows):
+        if sequence is None or not collector.ordered:
+            if rows is not _DONE:
+                self._write(collector, rows)
+            return
+
+        if sequence != self._next_sequence[collector]:
+            if rows is _DONE:
+                self._finished[collector].add(sequence)
+            else:
+                self._waiting[collector].setdefault(sequence, []).append(rows)
+            return
+
+        if rows is not _DONE:
+            self._write_chunk(collector, rows)
+            return
+
+        # O grupo atual terminou: libera os seguintes que já chegaram
+        self._advance(collector)
+        while True:
+            sequence = self._next_sequence[collector]
+            finished = sequence in self._finished[collector]
+            if not finished:
+                # Todos os grupos anteriores estão gravados
+                self._mark_boundary(collector)
+            for chunk in self._waiting[collector].pop(sequence, []):
+                self._write_chunk(collector, chunk)
+            if not finished:
+                return
+            self._finished[collector].discard(sequence)
+            self._advance(collector)
+
+    def _advance(self, collector):
+        with self._order:
+            self._next_sequence[collector] += 1
+            self._order.notify_all()
+
+    def _write_chunk(self, collector, rows):
+        if isinstance(rows, _Ahead):
+            with self._order:
+                self._ahead[collector] -= 1
+                self._order.notify_all()
+            rows = rows.rows
+        self._write(collector, rows)
+
+    def _mark_boundary(self, collector):
+        if self.on_checkpoint is None:
+            return
+        self.boundaries[collector] = {
+            'sequence': self._next_sequence[collector],
+            'rows': self._rows[collector],
+            'sinks': {sink_key(sink): sink.checkpoint(collector) for sink in self.sinks},
+        }
+
+    def _write(self, collector, rows):
+        for sink in self.sinks:
+            sink.write(collector, rows)
+        self._rows[collector] += len(rows)
+        if self.on_rows is not None:
+            self.on_rows(collector, len(rows))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,204 @@
+# Script com o transporte HTTP compartilhado das APIs do Google Cloud
+#
+# autor: Marcos Cardoso
+#
+# src/org/common/transport.py
+#
+# Todos os clientes das APIs (ver clients.get_service) usam uma única sessão
+# autenticada (google.auth AuthorizedSession, sobre requests/urllib3) por
+# credencial, com um pool de conexões keep-alive por host compartilhado entre
+# os workers. Assim cada conexão TLS é aberta uma vez e reaproveitada pelas
+# chamadas de todas as threads, em vez de uma conexão httplib2 por cliente.
+#
+# Cada chamada tem um prazo total (--call-timeout), da conexão ao último byte
+# da resposta: um endpoint que não responde, ou que envia a resposta aos
+# poucos, levanta TimeoutError, que o controle de taxa repete como qualquer
+# falha de rede, em vez de prender o worker (e o projeto) indefinidamente.
+# A chamada roda em um pool de threads do transporte, com tamanho fixo, e o
+# worker espera no máximo o prazo; ao estourar, a resposta em andamento é
+# fechada (ou, se a chamada ainda estava na fila do pool, cancelada).
+
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+import requests
+from google.auth.transport.requests import AuthorizedSession
+
+# Conexões mantidas abertas por host; None usa o número de workers (--workers)
+DEFAULT_POOL_SIZE = None
+FALLBACK_POOL_SIZE = 32
+# Prazo total de cada chamada (e de cada leitura do socket), em segundos
+DEFAULT_CALL_TIMEOUT = 60.0
+# Hosts com um pool próprio (compute, container, sqladmin, cloudresourcemanager, oauth2, ...)
+POOL_HOSTS = 16
+# Threads das chamadas por conexão do pool: uma para a chamada em andamento e
+# uma para a chamada abandonada que ainda espera o socket ser fechado
+CALL_THREADS_PER_CONNECTION = 2
+
+class PooledHttp:
+    """
+    Adaptador com a interface de httplib2.Http.request usada pela
+    google-api-python-client, sobre uma AuthorizedSession com pool de
+    conexões. Pode ser usado por várias threads ao mesmo tempo.
+
+    As falhas de rede do requests viram ConnectionError/TimeoutError, que o
+    controle de taxa (rate_limit) já trata como temporárias.
+
+    Args:
+        credentials: Credenciais aplicadas a cada requisição.
+        pool_size (int): Conexões keep-alive mantidas por host.
+        timeout (float): Prazo total de cada chamada, em segundos.
+    """
+
+    def __init__(self, credentials, pool_size, timeout=DEFAULT_CALL_TIMEOUT):
+        # Lido pela google-api-python-client para autenticar os itens dos lotes
+        self.credentials = credentials
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = AuthorizedSession(credentials)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=pool_size,
+                                                max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=CALL_THREADS_PER_CONNECTION * pool_size,
+                                           thread_name_prefix='http-call')
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None):
+        call = _Call(self.executor, self.session, method, uri, body, headers, self.timeout)
+        if not call.done.wait(self.timeout):
+            call.abort()
+            raise TimeoutError(f"a chamada passou do prazo de {self.timeout:g}s")
+        error = call.error
+        if isinstance(error, requests.exceptions.Timeout):
+            raise TimeoutError(str(error)) from error
+        if isinstance(error, requests.exceptions.ConnectionError):
+            raise ConnectionError(str(error)) from error
+        if error is not None:
+            raise error
+        return http_response(call.response), call.content
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+class _Call:
+    """
+    Uma requisição executada no pool de threads do transporte (ver
+    PooledHttp.request). O socket continua com o prazo de leitura, então a
+    thread é liberada mesmo quando a chamada é abandonada e o servidor para
+    de responder.
+    """
+
+    def __init__(self, executor, session, method, uri, body, headers, timeout):
+        self.response = None
+        self.content = None
+        self.error = None
+        self.aborted = False
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self._future = executor.submit(self._run, session, method, uri, body, headers, timeout)
+
+    def _run(self, session, method, uri, body, headers, timeout):
+        try:
+            if self.aborted:
+                return
+            response = session.request(method, uri, data=body, headers=headers, timeout=timeout, stream=True)
+            with self._lock:
+                self.response = response
+                aborted = self.aborted
+            if aborted:
+                response.close()
+                return
+            self.content = response.content
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def abort(self):
+        # Interrompe a leitura em andamento fechando o socket (close() da
+        # resposta esperaria a leitura da outra thread); o pool descarta a conexão
+        with self._lock:
+            self.aborted = True
+            response = self.response
+        # Ainda na fila do pool: a chamada nem chega a ser enviada
+        self._future.cancel()
+        if response is None:
+            return
+        sock = response_socket(response)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+def response_socket(response):
+    """
+    Socket de uma resposta com stream=True. Depois dos cabeçalhos o
+    http.client guarda o socket apenas no arquivo da resposta
+    (HTTPResponse.fp -> SocketIO).
+    """
+    raw = response.raw
+    sock = getattr(getattr(raw, 'connection', None), 'sock', None)
+    if sock is None:
+        fp = getattr(getattr(raw, '_fp', None), 'fp', None)
+        sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+    return sock
+
+def http_response(response):
+    """
+    Converte a resposta do requests na resposta do httplib2 (dict de
+    cabeçalhos em minúsculas com 'status' e 'reason').
+    """
+    headers = {key.lower(): value for key, value in response.headers.items()}
+    # O conteúdo já vem descompactado, como no httplib2
+    if 'content-encoding' in headers:
+        headers['-content-encoding'] = headers.pop('content-encoding')
+        headers.pop('content-length', None)
+    headers['status'] = str(response.status_code)
+    resp = httplib2.Response(headers)
+    resp.reason = response.reason
+    return resp
+
+# Transporte de cada credencial, compartilhado por todas as threads
+_transports = {}
+_lock = threading.Lock()
+_pool_size = DEFAULT_POOL_SIZE
+_timeout = DEFAULT_CALL_TIMEOUT
+
+def add_arguments(parser):
+    """
+    Adiciona as opções do transporte HTTP ao parser.
+    """
+    group = parser.add_argument_group('conexões e prazos')
+    group.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE, metavar='N',
+                       help='Conexões keep-alive mantidas por host da API, compartilhadas entre os workers '
+                            '(padrão: o valor de --workers).')
+    group.add_argument('--call-timeout', type=float, default=DEFAULT_CALL_TIMEOUT, metavar='SEGUNDOS',
+                       help='Prazo de cada chamada; ao estourar, a chamada é repetida com backoff '
+                            f'(padrão: {DEFAULT_CALL_TIMEOUT:g}).')
+    group.add_argument('--hedge', action='store_true',
+                       help='Envia uma cópia das leituras que passam do p95 de latência do método e '
+                            'usa a primeira resposta.')
+
+def configure(pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_CALL_TIMEOUT):
+    """
+    Define o tamanho do pool e o prazo das chamadas dos transportes criados
+    a partir de agora. Deve ser chamada antes de iniciar a varredura.
+    """
+    global _pool_size, _timeout
+    _pool_size = pool_size
+    _timeout = timeout
+
+def get_http(credentials):
+    """
+    Retorna o transporte compartilhado da credencial, criando-o na primeira chamada.
+    """
+    with _lock:
+        cached = _transports.get(id(credentials))
+        if cached is not None and cached.credentials is credentials:
+            return cached
+        http = PooledHttp(credentials, _pool_size or FALLBACK_POOL_SIZE, _timeout)
+        _transports[id(credentials)] = http
+        return http
@@ -0,0 +1,58 @@
+# Testes do agrupamento de requisições em lotes
+#
+# autor: Marcos Cardoso
+#
+# tests/test_batch.py
+
+import json
+import threading
+from googleapiclient.http import HttpMockSequence, HttpRequest
+from src.org.common import rate_limit
+from src.org.common.batch import execute_batch
+
+def page_request(items):
+    http = HttpMockSequence([({'status': '200'}, json.dumps({'items': items}))])
+    return HttpRequest(http, lambda resp, content: json.loads(content),
+                       'https://compute.googleapis.com/compute/v1/projects/p/global/networks',
+                       methodId='compute.networks.list')
+
+class FakeBatch:
+    """
+    Lote que entrega a resposta de cada item ao callback, como o
+    BatchHttpRequest, sem rede.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            self.callback(request_id, request.execute(), None)
+
+class FakeService:
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(callback)
+
+def test_callbacks_can_call_the_limiter_with_a_single_slot(monkeypatch):
+    # Uma única vaga de concorrência: o callback que busca a próxima página
+    # não pode esperar pela vaga ocupada pelo próprio lote
+    monkeypatch.setattr(rate_limit, 'limiter', rate_limit.RateLimiter(max_concurrency=1))
+    pages = {}
+
+    def on_response(key, response, exception):
+        pages[key] = [response, rate_limit.execute(page_request([f'{key}-2']))]
+
+    requests = [(key, page_request([f'{key}-1'])) for key in ('a', 'b')]
+    thread = threading.Thread(target=execute_batch, args=(FakeService(), requests, on_response), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert pages == {
+        'a': [{'items': ['a-1']}, {'items': ['a-2']}],
+        'b': [{'items': ['b-1']}, {'items': ['b-2']}],
+    }
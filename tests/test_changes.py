@@ -0,0 +1,82 @@
+# Testes da detecção de mudanças entre varreduras
+#
+# autor: Marcos Cardoso
+#
+# tests/test_changes.py
+
+import csv
+import logging
+from src.org.common.changes import ChangeSetSink
+from src.org.common.records import VmRecord
+
+class FakeCollector:
+    name = 'vm'
+    record = VmRecord
+    logger = logging.getLogger('test-changes')
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.failed_calls = []
+
+class FakeStats:
+    def __init__(self, project_ids):
+        self.project_ids = set(project_ids)
+
+class FakeRunner:
+    def __init__(self, collector, project_ids):
+        self.completed = True
+        self.stats = {collector: FakeStats(project_ids)}
+
+def vm(project, name, status='RUNNING', created='2024-01-01T00:00:00Z'):
+    return VmRecord(project, name, 'us-east1-b', '10.0.0.1', 'debian', status, created,
+                    f'https://compute/projects/{project}/zones/us-east1-b/instances/{name}')
+
+def scan(tmp_path, collector, rows, project_ids=('p1',)):
+    sink = ChangeSetSink(FakeRunner(collector, project_ids), snapshot_dir=str(tmp_path))
+    sink.open(collector)
+    sink.write(collector, rows)
+    sink.close()
+    return sink
+
+def read_changes(sink, collector):
+    with open(sink.changes_path(collector), encoding='utf-8') as csvfile:
+        rows = list(csv.reader(csvfile, delimiter=';'))[1:]
+    return sorted((row[0], row[2], row[-1]) for row in rows)
+
+def test_added_removed_and_modified(tmp_path):
+    collector = FakeCollector(str(tmp_path / 'lista_GCP_VM.csv'))
+    first = scan(tmp_path, collector, [vm('p1', 'a'), vm('p1', 'b'), vm('p1', 'c'), vm('p1', 'd')])
+    assert first.report['vm']['file'] is None
+
+    second = scan(tmp_path, collector, [
+        vm('p1', 'a'),
+        vm('p1', 'b', status='TERMINATED'),
+        # Mesmo self_link com outra data de criação: recriada
+        vm('p1', 'c', created='2024-06-01T00:00:00Z'),
+        vm('p1', 'e'),
+    ])
+    assert {kind: second.report['vm'][kind] for kind in ('added', 'removed', 'modified')} == {
+        'added': 2, 'removed': 2, 'modified': 1}
+    assert read_changes(second, collector) == [
+        ('added', 'c', ''),
+        ('added', 'e', ''),
+        ('modified', 'b', 'STATUS'),
+        ('removed', 'c', ''),
+        ('removed', 'd', ''),
+    ]
+
+def test_resources_outside_the_scan_are_not_removed(tmp_path):
+    collector = FakeCollector(str(tmp_path / 'lista_GCP_VM.csv'))
+    scan(tmp_path, collector, [vm('p1', 'a'), vm('p2', 'b')], project_ids=('p1', 'p2'))
+    # Apenas p1 varrido: a VM de p2 continua no retrato e não é removida
+    second = scan(tmp_path, collector, [vm('p1', 'a')], project_ids=('p1',))
+    assert second.report['vm']['removed'] == 0
+    third = scan(tmp_path, collector, [vm('p1', 'a')], project_ids=('p1', 'p2'))
+    assert read_changes(third, collector) == [('removed', 'b', '')]
+
+def test_failed_calls_keep_unseen_resources(tmp_path):
+    collector = FakeCollector(str(tmp_path / 'lista_GCP_VM.csv'))
+    scan(tmp_path, collector, [vm('p1', 'a'), vm('p1', 'b')])
+    collector.failed_calls.append("listar VMs do projeto 'p1'")
+    second = scan(tmp_path, collector, [vm('p1', 'a')])
+    assert second.report['vm']['removed'] == 0
@@ -0,0 +1,55 @@
+# Testes da escolha das credenciais
+#
+# autor: Marcos Cardoso
+#
+# tests/test_credentials.py
+
+import io
+import json
+import pytest
+from google.auth.exceptions import DefaultCredentialsError, RefreshError
+from src.org.common import credentials
+from src.org.common.credentials import DEFAULT_SCOPES, load_credentials
+
+@pytest.fixture
+def expired_token(tmp_path, monkeypatch):
+    """
+    Token de usuário salvo, expirado e cujo refresh token foi revogado.
+    """
+    token_path = tmp_path / 'token.json'
+    token_path.write_text(json.dumps({
+        'type': 'authorized_user', 'client_id': 'cliente', 'client_secret': 'segredo',
+        'refresh_token': 'revogado', 'token': 'antigo', 'expiry': '2020-01-01T00:00:00Z',
+    }))
+    monkeypatch.setattr(credentials, 'TOKEN_FILE_PATH', str(token_path))
+    monkeypatch.setattr(credentials, 'LEGACY_TOKEN_FILE_PATH', str(tmp_path / 'token.pickle'))
+
+    def refresh(self, request):
+        raise RefreshError('invalid_grant: Token has been expired or revoked.')
+
+    monkeypatch.setattr(credentials.UserCredentials, 'refresh', refresh)
+
+def browser_flow(scopes=None):
+    raise AssertionError('o fluxo no navegador não deve ser aberto')
+
+def test_expired_saved_token_falls_back_to_adc(expired_token, monkeypatch, capsys):
+    adc = object()
+    monkeypatch.setattr(credentials.google.auth, 'default', lambda scopes: (adc, 'projeto'))
+    monkeypatch.setattr(credentials, 'get_user_credentials', browser_flow)
+
+    assert load_credentials('auto', None, DEFAULT_SCOPES) is adc
+    output = capsys.readouterr().out
+    assert 'Não foi possível renovar o token salvo' in output
+    assert 'Usando Application Default Credentials' in output
+
+def test_without_adc_and_terminal_no_browser_flow(expired_token, monkeypatch, capsys):
+    def no_adc(scopes):
+        raise DefaultCredentialsError('nenhuma credencial')
+
+    monkeypatch.setattr(credentials.google.auth, 'default', no_adc)
+    monkeypatch.setattr(credentials, 'get_user_credentials', browser_flow)
+    # Execução agendada: sem terminal interativo
+    monkeypatch.setattr(credentials.sys, 'stdin', io.StringIO())
+
+    assert load_credentials('auto', None, DEFAULT_SCOPES) is None
+    assert 'não pôde ser renovado' in capsys.readouterr().out
@@ -0,0 +1,148 @@
+# Testes de ponta a ponta das varreduras contra o servidor simulado
+#
+# autor: Marcos Cardoso
+#
+# tests/test_inventory.py
+#
+# Os coletores rodam pelo run_inventory, como nos scripts, contra o
+# FakeGcpServer (src/org/bench/fake_gcp.py) com latência, requisições lentas
+# e projetos com as APIs desabilitadas. Os CSVs, checkpoints e relatórios
+# vão para o diretório temporário de cada teste.
+
+import json
+import logging
+import signal
+import threading
+import time
+import pytest
+import list_k8s
+import list_vm
+from src.org.bench.fake_gcp import FakeConfig, FakeGcpServer
+from src.org.common import credentials, runner
+from src.org.common.checkpoint import Checkpoint
+from src.org.common.cli import build_parser
+from src.org.common.clients import API_ENDPOINT_ENV, FAKE_ENV
+from src.org.common.runner import run_inventory
+
+PROJECTS = 30
+ZONES = 2
+# A última VM de cada zona é um nó GKE e fica fora do CSV
+VMS_PER_ZONE = 3
+DELETED_EVERY = 7
+DISABLED_EVERY = 5
+
+logger = logging.getLogger('teste-inventario')
+
+def project_id(index):
+    return f'proj-{index:05d}'
+
+ACTIVE = [project_id(index) for index in range(PROJECTS) if index % DELETED_EVERY != DELETED_EVERY - 1]
+DISABLED = [project_id(index) for index in range(PROJECTS) if index % DISABLED_EVERY == DISABLED_EVERY - 1]
+
+@pytest.fixture(scope='module')
+def server():
+    config = FakeConfig(projects=PROJECTS, zones=ZONES, vms_per_zone=VMS_PER_ZONE,
+                        deleted_every=DELETED_EVERY, disabled_every=DISABLED_EVERY,
+                        latency=0.005, straggler_rate=0.05, straggler_delay=0.2, seed=7)
+    server = FakeGcpServer(config).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def fake_env(server, monkeypatch, tmp_path):
+    monkeypatch.setenv(FAKE_ENV, '1')
+    monkeypatch.setenv(API_ENDPOINT_ENV, server.url)
+    # Credencial anônima do servidor simulado, criada de novo a cada teste
+    monkeypatch.setattr(credentials, '_shared', None)
+    monkeypatch.setattr(runner, 'Checkpoint',
+                        lambda name, options: Checkpoint(name, options, str(tmp_path)))
+    server.stats.reset()
+    return server
+
+def scan(tmp_path, collector, *options):
+    args = build_parser('Teste.', [collector]).parse_args([
+        '--quiet', '--projects-ttl', '0', '--apis-ttl', '0',
+        '--metrics-json', str(tmp_path / 'metrics.json'), '--metrics-prom', str(tmp_path / 'metrics.prom'),
+        *options])
+    run_inventory([collector], args, logger)
+    with open(tmp_path / 'metrics.json', encoding='utf-8') as report:
+        return json.load(report)
+
+def read_csv(path):
+    with open(path, encoding='utf-8') as csvfile:
+        return csvfile.read().splitlines()
+
+def vm_collector(tmp_path, name='vm.csv'):
+    return list_vm.VmCollector(list_vm.logger, str(tmp_path / name))
+
+def test_disabled_projects_are_skipped_without_calls(fake_env, tmp_path):
+    collector = vm_collector(tmp_path)
+    report = scan(tmp_path, collector, '--hedge')
+
+    enabled = [project for project in ACTIVE if project not in DISABLED]
+    lines = read_csv(collector.filename)
+    assert len(lines) - 1 == len(enabled) * ZONES * (VMS_PER_ZONE - 1)
+    # Nenhuma VM repetida, mesmo com as cópias (hedge) das chamadas lentas
+    assert len(set(lines)) == len(lines)
+    assert {line.split(';')[0] for line in lines[1:]} == set(enabled)
+
+    stats = report['collector_stats']['vm']
+    assert sorted(stats['skipped_projects']) == sorted(set(DISABLED) & set(ACTIVE))
+    assert stats['failed_calls'] == 0
+    # Os projetos pulados não recebem nenhuma chamada do Compute (que voltaria 403)
+    assert not fake_env.stats.snapshot()['errors']
+    assert fake_env.stats.snapshot()['calls']['compute.instances.aggregatedList'] == len(enabled)
+
+def test_without_api_check_disabled_projects_keep_the_no_api_row(fake_env, tmp_path):
+    collector = list_k8s.K8sCollector(list_k8s.logger, str(tmp_path / 'k8s.csv'))
+    report = scan(tmp_path, collector, '--no-api-check', '--batch-size', '4')
+
+    rows = [line.split(';') for line in read_csv(collector.filename)[1:]]
+    no_api = sorted(row[0] for row in rows if row[1] == 'SEM API GKE')
+    assert no_api == sorted(set(DISABLED) & set(ACTIVE))
+    # Dois node pools por cluster, nos projetos de índice ímpar
+    with_clusters = [project for project in ACTIVE
+                     if project not in DISABLED and int(project.split('-')[1]) % 2 == 1]
+    assert len(rows) - len(no_api) == 2 * len(with_clusters)
+    # 403 indica API desabilitada, não uma falha da varredura
+    assert report['collector_stats']['k8s']['failed_calls'] == 0
+
+def test_resume_gives_the_same_output_as_an_uninterrupted_scan(fake_env, tmp_path, monkeypatch):
+    options = ('--batch-size', '2', '--workers', '4')
+    complete = vm_collector(tmp_path, 'complete.csv')
+    scan(tmp_path, complete, *options)
+
+    interrupted = vm_collector(tmp_path, 'resumed.csv')
+    collect = interrupted.collect
+
+    def collect_and_interrupt(projects, inventory):
+        # Simula o Ctrl-C no meio da varredura, depois que os primeiros grupos
+        # foram gravados: o sinal chega à thread principal
+        if ACTIVE[len(ACTIVE) // 2] in [project['projectId'] for project in projects]:
+            deadline = time.monotonic() + 10
+            while inventory._writer.boundaries[interrupted]['sequence'] < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            signal.raise_signal(signal.SIGINT)
+        return collect(projects, inventory)
+
+    monkeypatch.setattr(interrupted, 'collect', collect_and_interrupt)
+    with pytest.raises(SystemExit):
+        scan(tmp_path, interrupted, *options)
+    # As tarefas em andamento ainda gravam linhas depois do checkpoint, que a
+    # retomada descarta
+    checkpoint_path = tmp_path / f'checkpoint-{logger.name}.json'
+    with open(checkpoint_path, encoding='utf-8') as checkpoint_file:
+        assert json.load(checkpoint_file)['collectors']['vm']['sequence'] >= 3
+
+    # Espera as tarefas que ainda estavam em andamento na interrupção
+    for thread in threading.enumerate():
+        if thread.name.startswith('inventory'):
+            thread.join(timeout=10)
+    fake_env.stats.reset()
+    resumed = vm_collector(tmp_path, 'resumed.csv')
+    scan(tmp_path, resumed, *options, '--resume')
+    assert read_csv(resumed.filename) == read_csv(complete.filename)
+    assert not checkpoint_path.exists()
+    # Os grupos gravados antes do checkpoint não são coletados de novo
+    calls = fake_env.stats.snapshot()['calls']['compute.instances.aggregatedList']
+    assert calls < len([project for project in ACTIVE if project not in DISABLED])
@@ -0,0 +1,39 @@
+# Testes da coleta de instâncias Cloud SQL
+#
+# autor: Marcos Cardoso
+#
+# tests/test_list_cloud_sql.py
+
+import list_cloud_sql
+from src.org.common import rate_limit
+
+class FakeRequest:
+
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self, num_retries=0):
+        return self.response
+
+class FakeInstances:
+    """
+    Recurso 'instances' com as páginas seguintes de instances.list indexadas
+    pelo nextPageToken.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def list_next(self, previous_request, previous_response):
+        token = previous_response.get('nextPageToken')
+        return FakeRequest(self.pages[token]) if token else None
+
+def test_instances_follow_next_page_token(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'execute', lambda request: request.execute())
+    resources = FakeInstances({
+        't1': {'items': [{'name': 'sql-2'}], 'nextPageToken': 't2'},
+        't2': {'items': [{'name': 'sql-3'}]},
+    })
+    first = {'items': [{'name': 'sql-1'}], 'nextPageToken': 't1'}
+    instances = list_cloud_sql.follow_sql_pages(resources, FakeRequest(first), first)
+    assert [instance['name'] for instance in instances] == ['sql-1', 'sql-2', 'sql-3']
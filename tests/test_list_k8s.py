@@ -0,0 +1,50 @@
+# Testes da coleta de clusters GKE
+#
+# autor: Marcos Cardoso
+#
+# tests/test_list_k8s.py
+
+import httplib2
+from googleapiclient import errors
+import list_k8s
+
+class FakeClusters:
+
+    def list(self, **kwargs):
+        return kwargs['projectId']
+
+class FakeContainer:
+    """
+    Cliente do GKE em que projects().locations().clusters() é sempre o mesmo recurso.
+    """
+
+    def projects(self):
+        return self
+
+    def locations(self):
+        return self
+
+    def clusters(self):
+        return FakeClusters()
+
+def http_error(status):
+    return errors.HttpError(httplib2.Response({'status': str(status)}), b'{}')
+
+def test_only_disabled_api_gets_the_no_api_row(monkeypatch):
+    outcomes = {'p-ok': {'clusters': []}, 'p-403': http_error(403), 'p-503': http_error(503)}
+
+    def execute_batch(service, requests, callback):
+        for key, _ in requests:
+            outcome = outcomes[key]
+            if isinstance(outcome, Exception):
+                callback(key, None, outcome)
+            else:
+                callback(key, outcome, None)
+
+    monkeypatch.setattr(list_k8s, 'get_service', lambda *args: FakeContainer())
+    monkeypatch.setattr(list_k8s, 'execute_batch', execute_batch)
+    collector = list_k8s.K8sCollector(list_k8s.logger, None)
+    rows = list(collector.fetch_clusters(list(outcomes), None))
+    # O 503 que sobrou das novas tentativas vira falha, sem a linha 'SEM API GKE'
+    assert rows == [('p-ok', []), ('p-403', None)]
+    assert collector.failed_calls == ["listar clusters GKE do projeto 'p-503'"]
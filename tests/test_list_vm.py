@@ -0,0 +1,30 @@
+# Testes da coleta de instâncias VM
+#
+# autor: Marcos Cardoso
+#
+# tests/test_list_vm.py
+
+import list_vm
+
+class FakeInstances:
+    """
+    Recurso 'instances' com uma única página na listagem agregada.
+    """
+
+    def aggregatedList_next(self, previous_request, previous_response):
+        return None
+
+class FakeCompute:
+
+    def instances(self):
+        return FakeInstances()
+
+def test_unreachable_scopes_are_failed_calls():
+    collector = list_vm.VmCollector(list_vm.logger, None)
+    response = {
+        'unreachables': ['zones/us-east1-b'],
+        'items': {'zones/us-east1-c': {'instances': [{'name': 'vm-1', 'status': 'RUNNING'}]}},
+    }
+    rows = list(collector.follow_aggregated_pages(FakeCompute(), 'p1', None, response))
+    assert [(row.name, row.zone) for row in rows] == [('vm-1', 'us-east1-c')]
+    assert collector.failed_calls == ["listar VMs do projeto 'p1' no escopo 'zones/us-east1-b'"]
@@ -0,0 +1,162 @@
+# Testes do controle de taxa
+#
+# autor: Marcos Cardoso
+#
+# tests/test_rate_limit.py
+
+import json
+import threading
+import time
+import httplib2
+import pytest
+from googleapiclient.http import HttpRequest
+from src.org.common import metrics, rate_limit
+from src.org.common.rate_limit import HEDGE_MIN_SAMPLES, RateLimiter, TokenBucket
+
+class FakeClock:
+    """
+    Relógio controlado pelo teste: sleep() apenas avança o horário.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def fake_clock(monkeypatch):
+    clock = FakeClock()
+    # Troca apenas o módulo 'time' visto por rate_limit
+    monkeypatch.setattr(rate_limit, 'time', clock)
+    return clock
+
+def test_batch_is_charged_every_call(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    bucket = TokenBucket(rate=20)
+    started = clock.now
+    # 520 chamadas a 20/s com capacidade 20: as 500 além da capacidade levam 25s
+    for _ in range(5):
+        bucket.acquire(100)
+    bucket.acquire(20)
+    assert clock.now - started == 25.0
+
+def test_batch_larger_than_capacity_runs_on_a_full_bucket(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    bucket = TokenBucket(rate=8)
+    started = clock.now
+    bucket.acquire(1000)
+    assert clock.now == started
+    # A dívida de 992 chamadas é paga pelas chamadas seguintes
+    bucket.acquire(8)
+    assert clock.now - started == 125.0
+
+def test_single_calls_respect_rate(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    bucket = TokenBucket(rate=4)
+    started = clock.now
+    for _ in range(4 + 40):
+        bucket.acquire()
+    assert clock.now - started == 10.0
+
+class SlowFirstHttp:
+    """
+    Transporte em que a primeira chamada só responde quando 'release' é
+    sinalizado e as demais respondem na hora. A resposta traz o número da chamada.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if call == 1:
+            self.release.wait(10)
+        return httplib2.Response({'status': '200'}), json.dumps({'call': call}).encode()
+
+class TimeoutHttp:
+    """
+    Transporte que estoura o prazo nas primeiras 'failures' chamadas.
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise TimeoutError('a chamada passou do prazo')
+        return httplib2.Response({'status': '200'}), b'{}'
+
+def list_request(http):
+    return HttpRequest(http, lambda resp, content: json.loads(content),
+                       'https://compute.googleapis.com/compute/v1/projects/p/zones/z/instances',
+                       methodId='compute.instances.list')
+
+def hedging_limiter(max_concurrency):
+    limiter = RateLimiter(max_concurrency=max_concurrency, hedge=True)
+    # p95 de 10ms para o método: a leitura mais lenta que isso recebe uma cópia
+    for _ in range(HEDGE_MIN_SAMPLES):
+        limiter.observe(list_request(None), 0.01)
+    return limiter
+
+def wait_until(condition):
+    deadline = time.monotonic() + 10
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_hedge_wins_and_loser_keeps_its_slot(monkeypatch):
+    registry = metrics.CallMetrics()
+    monkeypatch.setattr(metrics, 'registry', registry)
+    http = SlowFirstHttp()
+    limiter = hedging_limiter(max_concurrency=4)
+
+    assert limiter.execute(list_request(http)) == {'call': 2}
+    assert (registry.hedges, registry.hedges_won) == (1, 1)
+    # A original, descartada, continua em andamento e contada na concorrência
+    assert limiter.concurrency._in_flight == 1
+    http.release.set()
+    assert wait_until(lambda: limiter.concurrency._in_flight == 0)
+
+def test_no_hedge_without_a_free_slot(monkeypatch):
+    registry = metrics.CallMetrics()
+    monkeypatch.setattr(metrics, 'registry', registry)
+    http = SlowFirstHttp()
+    limiter = hedging_limiter(max_concurrency=1)
+
+    threading.Timer(0.2, http.release.set).start()
+    assert limiter.execute(list_request(http)) == {'call': 1}
+    assert http.calls == 1
+    assert registry.hedges == 0
+    assert limiter.concurrency._in_flight == 0
+
+def test_timeouts_are_retried_and_counted(monkeypatch):
+    fake_clock(monkeypatch)
+    registry = metrics.CallMetrics()
+    monkeypatch.setattr(metrics, 'registry', registry)
+    limiter = RateLimiter(max_retries=3)
+
+    assert limiter.execute(list_request(TimeoutHttp(failures=2))) == {}
+    stats = registry.methods['compute.instances.list']
+    assert registry.timeouts == 2
+    assert (stats.calls, stats.retries, stats.statuses) == (1, 2, {200: 1})
+
+def test_timeouts_after_the_last_retry_are_raised(monkeypatch):
+    fake_clock(monkeypatch)
+    registry = metrics.CallMetrics()
+    monkeypatch.setattr(metrics, 'registry', registry)
+    limiter = RateLimiter(max_retries=2)
+
+    with pytest.raises(TimeoutError):
+        limiter.execute(list_request(TimeoutHttp(failures=5)))
+    stats = registry.methods['compute.instances.list']
+    assert registry.timeouts == 3
+    assert (stats.calls, stats.retries, stats.statuses) == (1, 2, {'TimeoutError': 1})
+    assert limiter.concurrency._in_flight == 0
@@ -0,0 +1,68 @@
+# Testes do mapa de APIs habilitadas
+#
+# autor: Marcos Cardoso
+#
+# tests/test_service_usage.py
+
+import pytest
+from google.auth.credentials import AnonymousCredentials
+from src.org.bench.fake_gcp import FakeConfig, FakeGcpServer
+from src.org.common.clients import API_ENDPOINT_ENV, FAKE_ENV
+from src.org.common.service_usage import EnabledApis
+
+COMPUTE = 'compute.googleapis.com'
+CONTAINER = 'container.googleapis.com'
+SQL = 'sqladmin.googleapis.com'
+
+PROJECTS = [{'projectId': f'proj-{index:05d}', 'projectNumber': str(100000 + index)} for index in range(12)]
+
+@pytest.fixture(scope='module')
+def server():
+    server = FakeGcpServer(FakeConfig(projects=len(PROJECTS), disabled_every=5, latency=0.005)).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def fake_env(server, monkeypatch):
+    monkeypatch.setenv(FAKE_ENV, '1')
+    monkeypatch.setenv(API_ENDPOINT_ENV, server.url)
+    server.stats.reset()
+    return server
+
+def disabled(enabled_apis, api):
+    return [project['projectId'] for project in PROJECTS if not enabled_apis.is_enabled(project['projectId'], api)]
+
+def test_disabled_apis_are_found_and_cached(fake_env, tmp_path):
+    cache_path = str(tmp_path / 'enabled-apis.json')
+    credentials = AnonymousCredentials()
+
+    enabled_apis = EnabledApis([COMPUTE, CONTAINER], ttl=3600, cache_path=cache_path)
+    enabled_apis.submit(credentials, PROJECTS).result()
+    enabled_apis.shutdown()
+    assert (enabled_apis.checked, enabled_apis.cached) == (len(PROJECTS), 0)
+    assert disabled(enabled_apis, COMPUTE) == ['proj-00004', 'proj-00009']
+    assert disabled(enabled_apis, CONTAINER) == ['proj-00004', 'proj-00009']
+    enabled_apis.save_cache()
+
+    # Segunda varredura: tudo vem do mapa em disco, sem chamadas
+    fake_env.stats.reset()
+    cached = EnabledApis([COMPUTE, CONTAINER], ttl=3600, cache_path=cache_path)
+    cached.check(credentials, PROJECTS)
+    assert (cached.checked, cached.cached) == (0, len(PROJECTS))
+    assert fake_env.stats.snapshot()['total_calls'] == 0
+    assert disabled(cached, COMPUTE) == ['proj-00004', 'proj-00009']
+
+    # Uma API que não está no mapa faz os projetos serem consultados de novo
+    more = EnabledApis([COMPUTE, SQL], ttl=3600, cache_path=cache_path)
+    more.check(credentials, PROJECTS)
+    assert (more.checked, more.cached) == (len(PROJECTS), 0)
+    assert disabled(more, SQL) == ['proj-00004', 'proj-00009']
+    # As APIs já guardadas continuam no mapa
+    assert disabled(more, CONTAINER) == ['proj-00004', 'proj-00009']
+
+def test_projects_that_fail_the_check_go_to_every_collector(fake_env, tmp_path):
+    enabled_apis = EnabledApis([COMPUTE], ttl=0, cache_path=str(tmp_path / 'enabled-apis.json'))
+    # Projeto inexistente: a consulta volta 404 e o projeto não é pulado
+    enabled_apis.check(AnonymousCredentials(), [{'projectId': 'proj-99999'}])
+    assert enabled_apis.checked == 0
+    assert enabled_apis.is_enabled('proj-99999', COMPUTE)
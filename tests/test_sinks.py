@@ -0,0 +1,121 @@
+# Testes da gravação das linhas nos destinos
+#
+# autor: Marcos Cardoso
+#
+# tests/test_sinks.py
+
+import threading
+import time
+from src.org.common.records import VmRecord
+from src.org.common.sinks import CsvSink, Sink, SinkWriter
+
+class FakeCollector:
+    name = 'fake'
+    ordered = True
+
+class MemorySink(Sink):
+    """
+    Destino que guarda as linhas gravadas em uma lista.
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def write(self, collector, rows):
+        self.rows.extend(rows)
+
+def test_ordered_groups_are_written_in_sequence():
+    collector = FakeCollector()
+    sink = MemorySink()
+    with SinkWriter([sink], [collector]) as writer:
+        # Os grupos 2 e 1 terminam antes do grupo 0
+        writer.put(collector, 2, ['c1'])
+        writer.done(collector, 2)
+        writer.put(collector, 1, ['b1'])
+        writer.put(collector, 0, ['a1'])
+        writer.put(collector, 1, ['b2'])
+        writer.done(collector, 1)
+        writer.put(collector, 0, ['a2'])
+        writer.done(collector, 0)
+    assert sink.rows == ['a1', 'a2', 'b1', 'b2', 'c1']
+
+def test_unordered_chunks_are_written_as_they_arrive():
+    collector = FakeCollector()
+    collector.ordered = False
+    sink = MemorySink()
+    with SinkWriter([sink], [collector]) as writer:
+        writer.put(collector, 1, ['b'])
+        writer.put(collector, None, ['zona'])
+        writer.put(collector, 0, ['a'])
+    assert sink.rows == ['b', 'zona', 'a']
+
+def test_groups_ahead_wait_for_the_current_group():
+    collector = FakeCollector()
+    sink = MemorySink()
+    writer = SinkWriter([sink], [collector], max_waiting=2).start()
+
+    def ahead():
+        for index in range(10):
+            writer.put(collector, 1, [f'b{index}'])
+        writer.done(collector, 1)
+
+    thread = threading.Thread(target=ahead, daemon=True)
+    thread.start()
+    # O grupo 1 fica limitado a 2 blocos guardados enquanto o grupo 0 não termina
+    time.sleep(0.3)
+    assert thread.is_alive()
+    assert writer._ahead[collector] == 2
+    assert sink.rows == []
+
+    writer.put(collector, 0, ['a'])
+    writer.done(collector, 0)
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    writer.close()
+    assert sink.rows == ['a'] + [f'b{index}' for index in range(10)]
+
+class OffsetSink(MemorySink):
+    """
+    Destino com estado de checkpoint: o número de linhas gravadas.
+    """
+
+    def checkpoint(self, collector):
+        return {'offset': len(self.rows)}
+
+def test_boundaries_only_cover_fully_written_groups():
+    collector = FakeCollector()
+    sink = OffsetSink()
+    saved = []
+    with SinkWriter([sink], [collector], on_checkpoint=saved.append) as writer:
+        writer.put(collector, 1, ['b1', 'b2'])
+        writer.done(collector, 1)
+        writer.put(collector, 0, ['a1'])
+        writer.done(collector, 0)
+        writer.put(collector, 2, ['c1'])
+    # Os grupos 0 e 1 estão gravados; o grupo 2 começou mas não terminou
+    assert writer.boundaries[collector] == {'sequence': 2, 'rows': 3, 'sinks': {'OffsetSink': {'offset': 3}}}
+    assert saved
+
+def test_csv_resumes_from_checkpoint_offset(tmp_path):
+    collector = FakeCollector()
+    collector.filename = str(tmp_path / 'lista.csv')
+    collector.record = VmRecord
+    row = VmRecord('proj', 'vm-1', 'zona-a', '10.0.0.1', 'debian', 'RUNNING', '', 'link/vm-1')
+
+    sink = CsvSink()
+    sink.open(collector)
+    sink.write(collector, [row])
+    state = sink.checkpoint(collector)
+    # Linhas gravadas depois do checkpoint, perdidas na interrupção
+    sink.write(collector, [row._replace(name='vm-2', self_link='link/vm-2')])
+    sink.close()
+
+    resumed = CsvSink()
+    resumed.restore(collector, state)
+    resumed.open(collector)
+    resumed.write(collector, [row._replace(name='vm-3', self_link='link/vm-3')])
+    resumed.close()
+    with open(collector.filename, encoding='utf-8') as csvfile:
+        lines = csvfile.read().splitlines()
+    assert len(lines) == 3
+    assert 'vm-1' in lines[1] and 'vm-3' in lines[2]
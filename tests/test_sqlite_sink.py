@@ -0,0 +1,46 @@
+# Testes do destino SQLite
+#
+# autor: Marcos Cardoso
+#
+# tests/test_sqlite_sink.py
+
+import argparse
+import sqlite3
+from src.org.common.records import SubnetRecord
+from src.org.common.sinks import SqliteSink
+
+class FakeCollector:
+    name = 'network'
+    record = SubnetRecord
+
+def subnet(name, ip_range, secondary=()):
+    return SubnetRecord('proj', 'vpc', name, 'us-east1', ip_range, list(secondary), '10.0.0.1',
+                        '2024-01-01T00:00:00Z', f'https://compute/projects/proj/subnetworks/{name}')
+
+def scan(path, rows):
+    sink = SqliteSink(argparse.Namespace(sqlite_path=str(path)))
+    collector = FakeCollector()
+    sink.open(collector)
+    sink.write(collector, rows)
+    sink.close()
+    return sink.scan_id
+
+def test_rows_are_upserted_by_self_link(tmp_path):
+    path = tmp_path / 'inventory.sqlite'
+    first = scan(path, [subnet('a', '10.0.0.0/24'), subnet('b', '10.0.1.0/24')])
+    second = scan(path, [subnet('a', '10.0.9.0/24', ['10.1.0.0/16']), subnet('c', '10.0.2.0/24')])
+
+    connection = sqlite3.connect(path)
+    rows = connection.execute(f'SELECT name, ip_range, secondary_ranges, scan_id, first_scan_id '
+                              f'FROM "{SubnetRecord.table}" ORDER BY name').fetchall()
+    scans = connection.execute('SELECT scan_id, row_count FROM scans ORDER BY scan_id').fetchall()
+    connection.close()
+
+    assert rows == [
+        # Atualizada na segunda varredura, mantendo a primeira em que apareceu
+        ('a', '10.0.9.0/24', '["10.1.0.0/16"]', second, first),
+        # Não apareceu mais: fica com o scan_id da varredura anterior
+        ('b', '10.0.1.0/24', '[]', first, first),
+        ('c', '10.0.2.0/24', '[]', second, second),
+    ]
+    assert scans == [(first, 2), (second, 2)]
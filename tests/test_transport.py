@@ -0,0 +1,84 @@
+# Testes do transporte HTTP compartilhado
+#
+# autor: Marcos Cardoso
+#
+# tests/test_transport.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from google.auth.credentials import AnonymousCredentials
+from src.org.common.transport import CALL_THREADS_PER_CONNECTION, PooledHttp
+
+BODY_SIZE = 20
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    '/rapido' responde na hora; '/lento' envia o corpo um byte a cada 0,2s,
+    de modo que nenhuma leitura do socket passa do prazo, apenas a chamada.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(BODY_SIZE))
+        self.end_headers()
+        for _ in range(BODY_SIZE):
+            self.wfile.write(b' ')
+            self.wfile.flush()
+            if self.path == '/lento':
+                time.sleep(0.2)
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+def call_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('http-call')]
+
+def test_response_is_converted_to_httplib2(server):
+    http = PooledHttp(AnonymousCredentials(), pool_size=2, timeout=5)
+    resp, content = http.request(f'{server}/rapido')
+    assert (resp.status, content) == (200, b' ' * BODY_SIZE)
+    http.close()
+
+def test_slow_body_hits_the_total_deadline(server):
+    http = PooledHttp(AnonymousCredentials(), pool_size=2, timeout=0.5)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        http.request(f'{server}/lento')
+    # O corpo levaria 4s; a chamada termina no prazo total
+    assert time.monotonic() - started < 1.5
+    http.close()
+
+def test_call_threads_are_bounded(server):
+    before = len(call_threads())
+    http = PooledHttp(AnonymousCredentials(), pool_size=1, timeout=0.5)
+
+    def call(_):
+        try:
+            http.request(f'{server}/lento')
+        except TimeoutError:
+            return 'prazo'
+        return 'ok'
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=8) as workers:
+        results = list(workers.map(call, range(8)))
+    # As chamadas na fila do pool também respeitam o prazo e são canceladas
+    assert results == ['prazo'] * 8
+    assert time.monotonic() - started < 1.5
+    assert len(call_threads()) - before <= CALL_THREADS_PER_CONNECTION
+    http.close()